@@ -1,4 +1,9 @@
 #!/bin/sh
+set -e
+
+# The Telegram bot and the server below share the cache, which the system
+# checks of migrate require to be Redis when more than one process runs
+export APP_PROCESSES="${APP_PROCESSES:-2}"
 
 python manage.py migrate --noinput
 python manage.py collectstatic --noinput
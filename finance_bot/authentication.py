@@ -1,4 +1,4 @@
-from django.contrib.auth.models import User
+from django.contrib.auth import get_user_model
 from rest_framework import authentication
 
 from finance_bot.settings import API_KEY
@@ -10,6 +10,7 @@ class ApiKeyAuthentication(authentication.BaseAuthentication):
         if not api_key or api_key != API_KEY:
             return None
 
-        user = User.objects.get_or_create(username="api_user")[0]
+        # The user model has no username, the API user is identified by email
+        user = get_user_model().objects.get_or_create(email="api_user@localhost")[0]
 
         return (user, None)
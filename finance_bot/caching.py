@@ -0,0 +1,104 @@
+import uuid
+from typing import Any, Awaitable, Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Error, Tags, register
+from django.db import transaction
+
+
+# Backends whose entries are only seen by the process that wrote them
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_process_local(alias: str = 'default') -> bool:
+    """Returns whether the cache `alias` is kept in the memory of each process."""
+
+    return settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+
+
+class VersionedCache:
+    """
+    Entries of the default cache under `prefix`, invalidated one by one or
+    all at once.
+
+    The keys include a version kept in the cache too, so changing it drops
+    every entry without knowing their keys, e.g. when a row any user may
+    depend on changes. Invalidations happen when the current transaction
+    commits, so the entries aren't loaded again from the old rows. Like
+    the cache itself, this is only shared between processes with Redis.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.version_key = f"{prefix}:version"
+
+    def _format_key(self, version: str, name: str) -> str:
+        return f"{self.prefix}:{version}:{name}"
+
+    def get_key(self, name: str) -> str:
+        return self._format_key(cache.get_or_set(self.version_key, uuid.uuid4().hex, None), name)
+
+    async def aget_key(self, name: str) -> str:
+        return self._format_key(await cache.aget_or_set(self.version_key, uuid.uuid4().hex, None), name)
+
+    def get(self, name: str, load: Callable[[], Any], timeout: int) -> Any:
+        """Returns the entry `name`, calling `load` only when it isn't cached."""
+
+        key = self.get_key(name)
+        value = cache.get(key)
+        if value is None:
+            value = load()
+            cache.set(key, value, timeout)
+        return value
+
+    async def aget(self, name: str, load: Callable[[], Awaitable[Any]], timeout: int) -> Any:
+        """Asynchronous version of `get`."""
+
+        key = await self.aget_key(name)
+        value = await cache.aget(key)
+        if value is None:
+            value = await load()
+            await cache.aset(key, value, timeout)
+        return value
+
+    def invalidate(self, names: Iterable[str]):
+        keys = [self.get_key(str(name)) for name in names]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def invalidate_all(self):
+        transaction.on_commit(lambda: cache.set(self.version_key, uuid.uuid4().hex, None))
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    """The category index and the `VersionedCache` entries are invalidated
+    in the cache, so with one cache per process a change made through one
+    process stays invisible to the others until the entries expire."""
+
+    if settings.APP_PROCESSES <= 1 or not is_process_local('default'):
+        return []
+
+    return [Error(
+        f"The default cache is kept per process, but APP_PROCESSES is {settings.APP_PROCESSES}.",
+        hint="Set REDIS_URL so every process sees the same categories, agent settings and Telegram users.",
+        id='finance_bot.E001',
+    )]
+
+
+@register(Tags.caches)
+def check_rate_limit_cache(app_configs, **kwargs):
+    """Each process counting the messages on its own would let every user
+    send the limit times the number of processes."""
+
+    if settings.APP_PROCESSES <= 1 or not is_process_local(settings.RATE_LIMIT_CACHE):
+        return []
+
+    return [Error(
+        f"The rate limit cache '{settings.RATE_LIMIT_CACHE}' is kept per process, "
+        f"but APP_PROCESSES is {settings.APP_PROCESSES}.",
+        hint="Set REDIS_URL, or point RATE_LIMIT_CACHE to a cache shared by every process.",
+        id='finance_bot.E002',
+    )]
@@ -0,0 +1,65 @@
+import contextlib
+from typing import Dict
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from finance_bot.metrics import Counter, Gauge, LabelValues, registry
+
+
+# Metric name and description of the psycopg pool statistics exposed
+POOL_STATS = {
+    'pool_size': ('db_pool_size', 'Connections open in the pool, in use or not.'),
+    'pool_available': ('db_pool_available', 'Idle connections in the pool.'),
+    'requests_waiting': ('db_pool_requests_waiting', 'Threads waiting for a pool connection.'),
+}
+
+connections_opened = registry.register(Counter(
+    'db_connections_opened_total', 'Connections opened by Django, or taken from the pool when it is enabled.', ['alias'],
+))
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    connections_opened.inc(alias=connection.alias)
+
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Returns the psycopg pool statistics of each database using a pool."""
+
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def get_pool_gauge(stat: str):
+    def function() -> Dict[LabelValues, float]:
+        return {(alias,): values.get(stat, 0) for alias, values in get_pool_stats().items()}
+    return function
+
+
+for stat, (name, documentation) in POOL_STATS.items():
+    registry.register(Gauge(name, documentation, get_pool_gauge(stat), ['alias']))
+
+
+@contextlib.contextmanager
+def scoped_connection(alias: str = DEFAULT_DB_ALIAS):
+    """Closes the connection opened inside the block, if the thread didn't have one already.
+
+    LangGraph runs nodes and tools on thread pools created for each run, so
+    their connections would only be dropped when the thread is collected,
+    and never returned to the psycopg pool. Connections of long-lived
+    threads, like the Telegram workers, are left to `close_old_connections`.
+    """
+
+    connection = connections[alias]
+    opened = connection.connection is None
+    try:
+        yield
+    finally:
+        if opened and not connection.in_atomic_block:
+            connection.close()
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from finance_bot.finance.models import Category, Transaction
+from finance_bot.finance.models import Category, MonthlyCategoryTotal, Transaction
 
 
 class CustomCategoryAdmin(admin.ModelAdmin):
@@ -13,5 +13,11 @@ class CustomTransactionAdmin(admin.ModelAdmin):
     search_fields = ('category__name', 'user__username',)
 
 
+class CustomMonthlyCategoryTotalAdmin(admin.ModelAdmin):
+    list_display = ('month', 'category', 'user', 'total', 'count',)
+    search_fields = ('category__name', 'user',)
+
+
 admin.site.register(Category, CustomCategoryAdmin)
 admin.site.register(Transaction, CustomTransactionAdmin)
+admin.site.register(MonthlyCategoryTotal, CustomMonthlyCategoryTotalAdmin)
@@ -1,66 +1,292 @@
+import functools
+import hashlib
+import logging
 import os
-from datetime import datetime
-from typing import Any, Dict
-from typing_extensions import TypedDict
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Sequence
+from typing_extensions import NotRequired, TypedDict
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.messages.utils import trim_messages, count_tokens_approximately
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 
+from finance_bot.caching import VersionedCache
 from finance_bot.finance import tools
-from finance_bot.langchain_bot.models import AgentSettings
+from finance_bot.finance.intents import handle_intent
+from finance_bot.finance.tracing import TurnTraceHandler, trace_span, trace_turn
+from finance_bot.langchain_bot.checkpoint import get_checkpointer
+from finance_bot.langchain_bot.models import AgentSettings, AgentSettingsToUser
+from finance_bot.metrics import Gauge, registry
 from finance_bot.users.models import User
 
 
+logger = logging.getLogger('FinanceAgent')
+
+
 class AgentInvokeArgs(TypedDict):
     user_id: str
     message: str
+    # Skips the configuration lookup when the caller already resolved it
+    agent_configuration: NotRequired[Dict[str, Any]]
 
 
 def pre_model_hook(state):
-    trimmed_messages = trim_messages(
-        state["messages"],
-        strategy="last",
-        token_counter=count_tokens_approximately,
-        max_tokens=1000,
-        start_on="human",
-        end_on=("human", "tool"),
-    )
+    with trace_span('trim', 'pre_model_hook'):
+        trimmed_messages = trim_messages(
+            state["messages"],
+            strategy="last",
+            token_counter=count_tokens_approximately,
+            max_tokens=1000,
+            start_on="human",
+            end_on=("human", "tool"),
+        )
     return {"llm_input_messages": trimmed_messages}
 
 
+class AgentCache:
+    """
+    Process-wide LRU cache of compiled agents.
+
+    Agents are keyed by (agent settings id, model, prompt version), so a
+    settings row changed by another process simply stops matching the old key.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+            return agent
+
+    def set(self, key: tuple, agent):
+        with self._lock:
+            self._agents[key] = agent
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_size:
+                self._agents.popitem(last=False)
+
+    def invalidate(self, agent_settings_id: int):
+        with self._lock:
+            for key in [key for key in self._agents if key[0] == agent_settings_id]:
+                del self._agents[key]
+
+    def clear(self):
+        with self._lock:
+            self._agents.clear()
+
+    def __len__(self):
+        return len(self._agents)
+
+
+agent_cache = AgentCache(max_size=settings.AGENT_CACHE_MAX_SIZE)
+
+# Chat models built from the agent configuration instead of OpenAI, keyed
+# by model name. Used by the benchmarks to run without network access.
+chat_model_factories: Dict[str, Callable[[Dict[str, Any]], BaseChatModel]] = {}
+
+
+@receiver(post_save, sender=AgentSettings)
+@receiver(post_delete, sender=AgentSettings)
+def invalidate_agent_cache(sender, instance, **kwargs):
+    agent_cache.invalidate(instance.pk)
+
+
+def get_prompt_version(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+
+# Stands for the current date while the rest of the prompt is rendered
+NOW_PLACEHOLDER = "\x00now\x00"
+
+# Sent after the conversation, so the system prompt and the history before
+# it stay the same for every user and turn.
+USER_CONTEXT_TEMPLATE = "Contexto: o nome do usuário é {user_name}, o seu ID é {user_id} e a data atual é {today}."
+
+
+def render_prompt(prompt_template: str, user_name: str, user_id: int) -> tuple[str, ...]:
+    """Formats everything but the current date in the prompt.
+
+    The default prompt has no placeholders, they are only kept for settings
+    with older prompts.
+
+    Returns:
+        tuple[str, ...]: The prompt split where the current date goes.
+    """
+
+    prompt = prompt_template.format(user_name=user_name, user_id=user_id, now=NOW_PLACEHOLDER)
+    return tuple(prompt.split(NOW_PLACEHOLDER))
+
+
+def build_agent_configuration(user: User, agent_config: AgentSettings | None) -> Dict[str, Any]:
+    if agent_config is None:
+        raise ValueError("No agent configuration found for user.")
+
+    return {
+        'agent_settings_id': agent_config.pk,
+        'model': agent_config.model,
+        'prompt': agent_config.prompt,
+        'user_name': user.first_name,
+        'user_id': user.pk,
+    }
+
+
+class PromptCacheStats:
+    """
+    Process-wide count of the prompt tokens the provider served from its cache.
+    """
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, messages: Sequence[BaseMessage]) -> tuple[int, int]:
+        """Adds the usage of the model calls made since the last human message.
+
+        Returns:
+            tuple[int, int]: The input and cached tokens of those calls.
+        """
+
+        input_tokens = cached_tokens = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.usage_metadata:
+                input_tokens += message.usage_metadata.get('input_tokens', 0)
+                cached_tokens += message.usage_metadata.get('input_token_details', {}).get('cache_read', 0)
+
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached_tokens
+
+        return input_tokens, cached_tokens
+
+    @property
+    def ratio(self) -> float:
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+
+prompt_cache_stats = PromptCacheStats()
+
+registry.register(Gauge(
+    'agent_prompt_cache_ratio',
+    'Share of the prompt tokens served from the provider cache since start.',
+    lambda: prompt_cache_stats.ratio,
+))
+
+
+# Keyed by user, all dropped whenever an agent settings row changes,
+# since the default settings may be used by any user.
+agent_configurations = VersionedCache("agent:configuration")
+
+
+def get_agent_configuration(user_id: str) -> Dict[str, Any]:
+    """Returns the user agent configuration, resolving it only when it isn't cached."""
+
+    def load():
+        user = User.objects.filter(pk=user_id).first()
+        return build_agent_configuration(user, AgentSettings.objects.find_by_user(user))
+
+    return agent_configurations.get(str(user_id), load, settings.AGENT_CONFIGURATION_CACHE_TIMEOUT)
+
+
+async def aget_agent_configuration(user_id: str) -> Dict[str, Any]:
+    """Asynchronous version of `get_agent_configuration`."""
+
+    async def load():
+        user = await User.objects.filter(pk=user_id).afirst()
+        return build_agent_configuration(user, await AgentSettings.objects.afind_by_user(user))
+
+    return await agent_configurations.aget(str(user_id), load, settings.AGENT_CONFIGURATION_CACHE_TIMEOUT)
+
+
+@receiver(post_save, sender=AgentSettings)
+@receiver(post_delete, sender=AgentSettings)
+def invalidate_agent_configurations(sender, instance, **kwargs):
+    agent_configurations.invalidate_all()
+
+
+@receiver(post_save, sender=AgentSettingsToUser)
+@receiver(post_delete, sender=AgentSettingsToUser)
+def invalidate_agent_settings_to_user(sender, instance, **kwargs):
+    agent_configurations.invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_agent_configuration(sender, instance, **kwargs):
+    agent_configurations.invalidate([instance.pk])
+
+
 class FinanceAgent:
-    memory = MemorySaver()
+    memory = get_checkpointer()
     agent_tools = [
         tools.CreateCategoryTool(),
         tools.CreateTransactionTool(),
+        tools.RecordExpenseTool(),
+        tools.RecordExpensesTool(),
         tools.SearchCategoryByNameTool(),
         tools.SearchUserCategoriesTool(),
         tools.SearchTransactionsTool(),
+        tools.SummarizeTransactionsTool(),
         tools.UpdateTransactionTool(),
         tools.DeleteTransactionTool(),
+        tools.CreateTransactionsTool(),
+        tools.UpdateTransactionsTool(),
+        tools.DeleteTransactionsTool(),
         tools.DeleteCategoryTool(),
         tools.UpdateCategoryTool(),
     ]
 
     def _get_agent_configuration(self, user_id: str) -> Dict[str, Any]:
-        user = User.objects.filter(pk=user_id).first()
-        agent_config = AgentSettings.objects.find_by_user(user)
+        return get_agent_configuration(user_id)
 
-        if agent_config is None:
-            raise ValueError("No agent configuration found for user.")
+    async def _aget_agent_configuration(self, user_id: str) -> Dict[str, Any]:
+        return await aget_agent_configuration(user_id)
 
-        prompt = agent_config.prompt.format(
-            user_name=user.first_name,
-            user_id=user.pk,
-            now=datetime.now().isoformat(),
+    def _get_prompt(self, prompt_template: str):
+        """Builds the prompt callable, filling in the user from the invoke config.
+
+        The system prompt is rendered once and stays the same between turns.
+        The user and the current date go in a message after the conversation.
+        """
+
+        render = functools.lru_cache(maxsize=settings.AGENT_PROMPT_CACHE_MAX_SIZE)(
+            functools.partial(render_prompt, prompt_template)
         )
 
-        return {
-            'model': agent_config.model,
-            'prompt': prompt,
-        }
+        def prompt(state, config):
+            configurable = config.get('configurable', {})
+            user_name = configurable.get('user_name')
+            user_id = configurable.get('user_id')
+            today = timezone.localdate().isoformat()
+
+            system_prompt = today.join(render(user_name, user_id))
+            user_context = USER_CONTEXT_TEMPLATE.format(user_name=user_name, user_id=user_id, today=today)
+
+            return [SystemMessage(content=system_prompt)] + state["messages"] + [SystemMessage(content=user_context)]
+
+        return prompt
+
+    def _record_usage(self, messages: Sequence[BaseMessage]):
+        input_tokens, cached_tokens = prompt_cache_stats.record(messages)
+        if input_tokens:
+            logger.info(
+                f"Prompt cache hit {cached_tokens}/{input_tokens} tokens, "
+                f"{prompt_cache_stats.ratio:.0%} since start"
+            )
 
     def _get_agent(self, agent_configuration: Dict[str, Any]):
         model_kwargs = {}
@@ -69,38 +295,44 @@ class FinanceAgent:
         if model is None:
             raise ValueError("Model not specified in agent configuration.")
 
-        if agent_configuration['model'].startswith('gpt-5'):
-            model_kwargs.update({
-                'reasoning_effort': 'minimal',
-                'temperature': 1,
-            })
-
-        model = ChatOpenAI(
-            model=agent_configuration['model'],
-            api_key=os.getenv("OPENAI_API_KEY"),
-            **model_kwargs,
+        cache_key = (
+            agent_configuration.get('agent_settings_id'),
+            model,
+            get_prompt_version(agent_configuration['prompt']),
         )
+        agent = agent_cache.get(cache_key)
+        if agent is not None:
+            return agent
+
+        if model in chat_model_factories:
+            model = chat_model_factories[model](agent_configuration)
+        else:
+            if agent_configuration['model'].startswith('gpt-5'):
+                model_kwargs.update({
+                    'reasoning_effort': 'minimal',
+                    'temperature': 1,
+                })
+
+            model = ChatOpenAI(
+                model=agent_configuration['model'],
+                api_key=os.getenv("OPENAI_API_KEY"),
+                stream_usage=True,
+                **model_kwargs,
+            )
 
         agent = create_react_agent(
             model,
             self.agent_tools,
-            prompt=agent_configuration['prompt'],
+            prompt=self._get_prompt(agent_configuration['prompt']),
             checkpointer=self.memory,
             pre_model_hook=pre_model_hook
         )
 
-        return agent
-
-    def invoke(self, args: AgentInvokeArgs) -> str:
-        """Invoke the agent with the given input value.
-
-        Parameters:
-            args (AgentInvokeArgs): A dictionary containing 'user_id' and 'message' keys.
+        agent_cache.set(cache_key, agent)
 
-        Returns:
-            str: The agent response. 
-        """
+        return agent
 
+    def _get_invoke_args(self, args: AgentInvokeArgs) -> tuple[str, str]:
         user_id = args.get('user_id')
         message = args.get('message')
 
@@ -110,14 +342,119 @@ class FinanceAgent:
         if message is None or message.strip() == '':
             raise ValueError("Message can't be empty.")
 
-        agent_config = self._get_agent_configuration(user_id)
-        agent = self._get_agent(agent_config)
-        invoke_config = {
+        return user_id, message
+
+    def _get_invoke_config(self, user_id: str, agent_config: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             'configurable': {
                 'thread_id': user_id,
-            }
+                'user_name': agent_config['user_name'],
+                'user_id': agent_config['user_id'],
+            },
+            'callbacks': [TurnTraceHandler()],
+            'max_concurrency': settings.AGENT_TOOL_CONCURRENCY,
         }
 
-        response = agent.invoke({'messages': ('human', message)}, config=invoke_config)
+    def _handle_intent(self, user_id: str, message: str) -> str | None:
+        if not settings.AGENT_INTENT_PARSER:
+            return None
+        return handle_intent(user_id, message)
+
+    def _save_exchange(self, agent, invoke_config: Dict[str, Any], message: str, response: str):
+        """Adds a message answered without the model to the conversation,
+        so the agent knows about it in the next turns."""
+
+        agent.update_state(invoke_config, {'messages': [HumanMessage(message), AIMessage(response)]}, as_node='agent')
+
+    async def _asave_exchange(self, agent, invoke_config: Dict[str, Any], message: str, response: str):
+        await agent.aupdate_state(invoke_config, {'messages': [HumanMessage(message), AIMessage(response)]}, as_node='agent')
+
+    def invoke(self, args: AgentInvokeArgs) -> str:
+        """Invoke the agent with the given input value.
+
+        Parameters:
+            args (AgentInvokeArgs): A dictionary containing 'user_id' and 'message' keys.
+
+        Returns:
+            str: The agent response.
+        """
+
+        user_id, message = self._get_invoke_args(args)
+
+        with trace_turn('invoke', user_id):
+            agent_config = args.get('agent_configuration') or self._get_agent_configuration(user_id)
+            agent = self._get_agent(agent_config)
+            invoke_config = self._get_invoke_config(user_id, agent_config)
+
+            if (response := self._handle_intent(user_id, message)) is not None:
+                self._save_exchange(agent, invoke_config, message, response)
+                return response
+
+            response = agent.invoke({'messages': ('human', message)}, config=invoke_config)
+            self._record_usage(response['messages'])
 
         return response['messages'][-1].content
+
+    async def ainvoke(self, args: AgentInvokeArgs) -> str:
+        """Asynchronous version of `invoke`.
+
+        Parameters:
+            args (AgentInvokeArgs): A dictionary containing 'user_id' and 'message' keys.
+
+        Returns:
+            str: The agent response.
+        """
+
+        user_id, message = self._get_invoke_args(args)
+
+        with trace_turn('ainvoke', user_id):
+            agent_config = args.get('agent_configuration') or await self._aget_agent_configuration(user_id)
+            agent = self._get_agent(agent_config)
+            invoke_config = self._get_invoke_config(user_id, agent_config)
+
+            if (response := await sync_to_async(self._handle_intent)(user_id, message)) is not None:
+                await self._asave_exchange(agent, invoke_config, message, response)
+                return response
+
+            response = await agent.ainvoke({'messages': ('human', message)}, config=invoke_config)
+            self._record_usage(response['messages'])
+
+        return response['messages'][-1].content
+
+    async def astream(self, args: AgentInvokeArgs) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the agent run for the given input value.
+
+        Parameters:
+            args (AgentInvokeArgs): A dictionary containing 'user_id' and 'message' keys.
+
+        Yields:
+            Dict[str, Any]: `token` events with partial content, `tool` events
+                when a tool starts or ends and a final `message` event with
+                the agent response.
+        """
+
+        user_id, message = self._get_invoke_args(args)
+
+        with trace_turn('astream', user_id):
+            agent_config = args.get('agent_configuration') or await self._aget_agent_configuration(user_id)
+            agent = self._get_agent(agent_config)
+            invoke_config = self._get_invoke_config(user_id, agent_config)
+
+            response = await sync_to_async(self._handle_intent)(user_id, message)
+            if response is not None:
+                await self._asave_exchange(agent, invoke_config, message, response)
+            else:
+                events = agent.astream_events({'messages': ('human', message)}, config=invoke_config, version='v2')
+                async for event in events:
+                    if event['event'] == 'on_chat_model_stream' and event['data']['chunk'].content:
+                        yield {'type': 'token', 'content': event['data']['chunk'].content}
+                    elif event['event'] == 'on_tool_start':
+                        yield {'type': 'tool', 'name': event['name'], 'status': 'start'}
+                    elif event['event'] == 'on_tool_end':
+                        yield {'type': 'tool', 'name': event['name'], 'status': 'end'}
+
+                state = await agent.aget_state(invoke_config)
+                self._record_usage(state.values['messages'])
+                response = state.values['messages'][-1].content
+
+        yield {'type': 'message', 'message': response}
@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance_bot.finance'
+
+    def ready(self):
+        # Connects the category index invalidation signals
+        from finance_bot.finance import categories  # noqa: F401
+        # Connects the signals keeping the monthly totals up to date
+        from finance_bot.finance import rollups  # noqa: F401
+        # Connects the query tracing of new database connections
+        from finance_bot.finance import tracing  # noqa: F401
+        # Registers the connection and pool metrics
+        from finance_bot import database  # noqa: F401
+        # Registers the checks for caches shared between processes
+        from finance_bot import caching  # noqa: F401
@@ -0,0 +1,78 @@
+import difflib
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from finance_bot.finance.models import Category
+
+
+CATEGORY_INDEX_FIELDS = ('id', 'name', 'normalized_name', 'limit', 'is_income')
+
+CategoryIndex = dict[str, dict[str, Any]]
+
+
+def get_category_index_key(user: str) -> str:
+    return f"finance:categories:{user}"
+
+
+def _build_category_index(categories) -> CategoryIndex:
+    index = {}
+    for category in categories:
+        if category['normalized_name']:
+            index.setdefault(category['normalized_name'], category)
+    return index
+
+
+def get_category_index(user: str) -> CategoryIndex:
+    """Returns the user categories keyed by normalized name."""
+
+    key = get_category_index_key(user)
+    index = cache.get(key)
+    if index is None:
+        categories = Category.objects.filter(user=user).order_by('id').values(*CATEGORY_INDEX_FIELDS)
+        index = _build_category_index(categories)
+        cache.set(key, index, settings.CATEGORY_CACHE_TIMEOUT)
+    return index
+
+
+def match_categories(index: CategoryIndex, name: str, fuzzy: bool = True) -> list[dict[str, Any]]:
+    """Returns the categories matching `name`, trying exact, prefix,
+    substring and, if enabled, fuzzy matches in that order."""
+
+    normalized = name.strip().upper()
+
+    if normalized in index:
+        return [index[normalized]]
+
+    if matches := [category for key, category in index.items() if key.startswith(normalized)]:
+        return matches
+
+    if matches := [category for key, category in index.items() if normalized in key]:
+        return matches
+
+    if fuzzy:
+        return [index[key] for key in difflib.get_close_matches(normalized, index.keys(), n=3, cutoff=0.75)]
+
+    return []
+
+
+def get_categories_containing(index: CategoryIndex, name: str) -> list[dict[str, Any]]:
+    normalized = name.strip().upper()
+    return [category for key, category in index.items() if normalized in key]
+
+
+def get_category_ids(user: str, name: str) -> list[int]:
+    """Returns the ids of the user categories whose name contains `name`."""
+
+    return [category['id'] for category in get_categories_containing(get_category_index(user), name)]
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_index(sender, instance, **kwargs):
+    key = get_category_index_key(instance.user)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Any, Sequence
+
+from django.conf import settings
+from langchain_core.messages.utils import count_tokens_approximately
+
+
+def format_value(value: Any, max_length: int = 80) -> str:
+    """Formats a single cell of a tool result table."""
+
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    value = str(value).replace("|", "/").replace("\n", " ")
+    if len(value) > max_length:
+        value = value[:max_length - 3] + "..."
+    return value
+
+
+def format_table(
+    columns: Sequence[str],
+    rows: Sequence[Sequence[Any]],
+    max_tokens: int | None = None,
+) -> tuple[str, int]:
+    """Formats tool results as a compact pipe separated table.
+
+    Rows are added until the table would go over `max_tokens`, counted the
+    same way `pre_model_hook` trims the conversation.
+
+    Returns:
+        tuple[str, int]: The table and the number of rows that fit in it.
+    """
+
+    if max_tokens is None:
+        max_tokens = settings.TOOL_RESULT_MAX_TOKENS
+
+    header = "|".join(columns)
+    lines = [header]
+    tokens = count_tokens_approximately([header])
+
+    for row in rows:
+        line = "|".join(format_value(value) for value in row)
+        line_tokens = count_tokens_approximately([line], extra_tokens_per_message=0)
+        if tokens + line_tokens > max_tokens:
+            break
+        lines.append(line)
+        tokens += line_tokens
+
+    return "\n".join(lines), len(lines) - 1
+
+
+def format_hidden_rows(hidden_rows: int) -> str:
+    return f"{hidden_rows} more rows not shown."
+
+
+def format_brl(value: float) -> str:
+    """Formats an amount in reais, like `R$ 1.234,56`."""
+
+    return "R$ " + f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
@@ -0,0 +1,430 @@
+import csv
+import functools
+import hashlib
+import io
+import logging
+import re
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, BinaryIO, Dict, Iterator, List, TextIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from finance_bot.finance.categories import get_category_index, get_category_index_key
+from finance_bot.finance.models import Category, Transaction
+from finance_bot.finance.seed import chunked, insert_transactions
+
+
+logger = logging.getLogger('TransactionImporter')
+
+IMPORT_FORMATS = ('csv', 'ofx')
+
+# Normalized header names of each column in the CSV exports of the usual banks
+CSV_COLUMNS = {
+    'date': ('DATA', 'DATE', 'DATA LANCAMENTO', 'DATA DA TRANSACAO', 'DATA DE LANCAMENTO', 'DT'),
+    'amount': ('VALOR', 'AMOUNT', 'VALUE', 'QUANTIA', 'VALOR (R$)', 'VALOR R$'),
+    'description': ('DESCRICAO', 'HISTORICO', 'DESCRIPTION', 'MEMO', 'LANCAMENTO', 'ESTABELECIMENTO', 'TITLE', 'TITULO'),
+    'category': ('CATEGORIA', 'CATEGORY'),
+}
+
+DATE_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y')
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+# Categories for rows whose description matches no category
+FALLBACK_CATEGORY = 'Outros'
+FALLBACK_INCOME_CATEGORY = 'Receitas'
+
+
+@dataclass(frozen=True)
+class CategoryRule:
+    """Rows whose normalized description matches `pattern` go to `category`."""
+
+    pattern: re.Pattern
+    category: str
+    is_income: bool = False
+
+
+def rule(pattern: str, category: str, is_income: bool = False) -> CategoryRule:
+    return CategoryRule(re.compile(rf'\b(?:{pattern})\b'), category, is_income)
+
+
+# Checked in order, so the more specific merchants come first
+CATEGORY_RULES = [
+    rule(r'SALARIO|FOLHA DE PAGAMENTO|PROVENTOS', 'Salário', is_income=True),
+    rule(r'ALUGUEL|CONDOMINIO|IPTU', 'Moradia'),
+    rule(r'NETFLIX|SPOTIFY|AMAZON PRIME|PRIME VIDEO|DISNEY|HBO|MAX\.COM|YOUTUBE|DEEZER|ACADEMIA|SMART ?FIT|GYMPASS|WELLHUB', 'Assinaturas'),
+    rule(r'ENEL|LIGHT|CEMIG|COPEL|CELESC|SABESP|CEDAE|COMGAS|CONTA DE (?:LUZ|AGUA|GAS)|VIVO|CLARO|TIM|OI FIBRA|NET SERVICOS|INTERNET', 'Contas'),
+    rule(r'UBER|99 ?(?:APP|POP|TAXI)|CABIFY|POSTO|SHELL|IPIRANGA|PETROBRAS|ESTACIONAMENTO|ESTAPAR|SEM PARAR|METRO|ONIBUS|BILHETE UNICO', 'Transporte'),
+    rule(r'IFOOD|RAPPI|RESTAURANTE|LANCHONETE|CHURRASCARIA|PIZZARIA|MC ?DONALDS|BURGER KING|STARBUCKS|CAFETERIA', 'Restaurante'),
+    rule(r'AMAZON|MERCADO ?LIVRE|MERCADOLIVRE|MAGAZINE ?LUIZA|MAGALU|SHOPEE|SHEIN|ALIEXPRESS|AMERICANAS|RENNER|RIACHUELO|C ?& ?A|ZARA|CENTAURO|KABUM', 'Compras'),
+    rule(r'SUPERMERCADO|MERCADO|CARREFOUR|PAO DE ACUCAR|ASSAI|ATACADAO|HORTIFRUTI|SACOLAO|ACOUGUE|PADARIA|FEIRA', 'Mercado'),
+    rule(r'FARMACIA|DROGARIA|DROGASIL|DROGA ?RAIA|PAGUE MENOS|HOSPITAL|CLINICA|LABORATORIO|CONSULTA|UNIMED|AMIL', 'Saúde'),
+    rule(r'CINEMA|CINEMARK|INGRESSO|SYMPLA|SHOW|TEATRO|STEAM|PLAYSTATION|XBOX|NINTENDO', 'Lazer'),
+    rule(r'ESCOLA|COLEGIO|FACULDADE|UNIVERSIDADE|CURSO|LIVRARIA|UDEMY|ALURA|COURSERA', 'Educação'),
+]
+
+
+class StatementError(ValueError):
+    """The statement file can't be read."""
+
+
+@dataclass
+class StatementRow:
+    date: date
+    amount: float
+    description: str | None
+    category: str | None = None
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    uncategorized: int = 0
+    categories_created: int = 0
+    seconds: float = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Statements repeat the same descriptions and dates over and over
+@functools.lru_cache(maxsize=4096)
+def normalize_text(value: str | None) -> str:
+    """Uppercases `value`, dropping accents and repeated spaces."""
+
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(value.upper().split())
+
+
+def parse_amount(value: str) -> float:
+    """Parses amounts like `-1.234,56`, `1234.56` or `R$ 10,00`."""
+
+    value = value.strip().replace('R$', '').replace(' ', '').replace('\xa0', '')
+    if value.startswith('(') and value.endswith(')'):
+        value = '-' + value[1:-1]
+
+    if ',' in value and '.' in value:
+        if value.rfind(',') > value.rfind('.'):
+            value = value.replace('.', '').replace(',', '.')
+        else:
+            value = value.replace(',', '')
+    elif ',' in value:
+        value = value.replace(',', '.')
+
+    return float(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(value: str) -> date:
+    """Parses the usual statement date formats, and the OFX `YYYYMMDD...` one."""
+
+    value = value.strip()
+    if re.match(r'\d{8}', value):
+        return datetime.strptime(value[:8], '%Y%m%d').date()
+
+    value = re.split(r'[ T]', value, maxsplit=1)[0]
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unknown date format: {value}")
+
+
+def get_transaction_hash(day: date, amount: float, description: str | None) -> str:
+    """Identifies a transaction by its day, amount and description, so the
+    rows of a statement imported twice match the saved ones."""
+
+    key = f"{day.isoformat()}|{abs(amount):.2f}|{normalize_text(description)}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def detect_format(name: str, sample: bytes) -> str:
+    if name.lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    upper = sample[:4096].upper()
+    if b'OFXHEADER' in upper or b'<OFX>' in upper:
+        return 'ofx'
+    return 'csv'
+
+
+def detect_encoding(sample: bytes) -> str:
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multibyte character cut at the end of the sample is still UTF-8
+        if e.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def read_csv(stream: TextIO) -> Iterator[Dict[str, str]]:
+    """Yields the date, amount, description and category of each CSV row."""
+
+    sample = stream.read(8192)
+    stream.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.reader(stream, dialect)
+    header = [normalize_text(column) for column in next(reader, [])]
+
+    columns = {}
+    for field, names in CSV_COLUMNS.items():
+        for index, column in enumerate(header):
+            if column in names:
+                columns[field] = index
+                break
+
+    if 'date' not in columns or 'amount' not in columns:
+        raise StatementError("The CSV file needs a date and an amount column.")
+
+    for values in reader:
+        if not any(values):
+            continue
+        yield {
+            field: values[index] if index < len(values) else ''
+            for field, index in columns.items()
+        }
+
+
+def read_ofx(stream: TextIO) -> Iterator[Dict[str, str]]:
+    """Yields the date, amount and description of each OFX transaction.
+
+    OFX 1.x is SGML without closing tags for the values, so the file is
+    tokenized instead of parsed as XML.
+    """
+
+    current = None
+    buffer = ''
+
+    for chunk in iter(lambda: stream.read(65536), ''):
+        buffer += chunk
+        # Keeps the last tag in the buffer, it may continue in the next chunk
+        end = buffer.rfind('<')
+        text, buffer = buffer[:end], buffer[end:]
+
+        for closing, tag, value in OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield {
+                        'date': current.get('DTPOSTED', ''),
+                        'amount': current.get('TRNAMT', ''),
+                        'description': current.get('MEMO') or current.get('NAME', ''),
+                    }
+                current = None if closing else {}
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+    # The closing tag of the last transaction is in the buffer
+    if current is not None and buffer.upper().startswith('</STMTTRN>'):
+        yield {
+            'date': current.get('DTPOSTED', ''),
+            'amount': current.get('TRNAMT', ''),
+            'description': current.get('MEMO') or current.get('NAME', ''),
+        }
+
+
+READERS = {
+    'csv': read_csv,
+    'ofx': read_ofx,
+}
+
+
+class TransactionImporter:
+    """
+    Imports the transactions of a bank statement for a user.
+
+    The file is read and written in chunks of `chunk_size` rows. Each row
+    goes to the category named in the file, a user category mentioned in
+    its description, the category of the first matching rule in
+    `CATEGORY_RULES` or, failing those, to a fallback category. Rows that
+    match a saved transaction of the same day, amount and description are
+    skipped, so importing a statement twice doesn't duplicate it.
+    """
+
+    def __init__(self, user: str, chunk_size: int | None = None):
+        self.user = str(user)
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.timezone = timezone.get_current_timezone()
+
+        self.categories = {
+            normalize_text(category['name']): category['id']
+            for category in get_category_index(self.user).values()
+        }
+        self.user_category_pattern = self._get_user_category_pattern()
+        self._description_categories: Dict[tuple[str, bool], str] = {}
+
+        self.existing = Counter()
+        self.loaded_days = set()
+
+    def _get_user_category_pattern(self) -> re.Pattern | None:
+        names = sorted(self.categories, key=len, reverse=True)
+        if not names:
+            return None
+        return re.compile(r'\b(' + '|'.join(re.escape(name) for name in names) + r')\b')
+
+    def import_file(self, file: BinaryIO, name: str = '', format: str | None = None) -> ImportResult:
+        """Imports a CSV or OFX statement, guessing the format from the
+        file name and content when not given."""
+
+        started = time.perf_counter()
+        result = ImportResult()
+
+        sample = file.read(65536)
+        file.seek(0)
+
+        format = format or detect_format(name, sample)
+        if format not in READERS:
+            raise StatementError(f"Unknown statement format: {format}")
+
+        stream = io.TextIOWrapper(file, encoding=detect_encoding(sample), errors='replace', newline='')
+        try:
+            for chunk in chunked(self._parse(READERS[format](stream), result), self.chunk_size):
+                self._import_chunk(chunk, result)
+                logger.debug(f"Imported {result.imported} of {result.rows} rows for user {self.user}")
+        finally:
+            # The caller owns the file
+            stream.detach()
+
+        result.seconds = time.perf_counter() - started
+        logger.info(
+            f"Imported {result.imported} transactions for user {self.user}, "
+            f"{result.duplicates} duplicates and {result.skipped} invalid rows, in {result.seconds:.1f}s"
+        )
+        return result
+
+    def _parse(self, rows: Iterator[Dict[str, str]], result: ImportResult) -> Iterator[StatementRow]:
+        for row in rows:
+            result.rows += 1
+            try:
+                amount = parse_amount(row['amount'])
+                day = parse_date(row['date'])
+            except (ValueError, KeyError):
+                result.skipped += 1
+                continue
+
+            if not amount:
+                result.skipped += 1
+                continue
+
+            yield StatementRow(
+                date=day,
+                amount=amount,
+                description=(row.get('description') or '').strip() or None,
+                category=(row.get('category') or '').strip() or None,
+            )
+
+    def _load_existing(self, days: set[date]):
+        """Counts the saved transactions of the days not loaded yet.
+
+        Each day is only loaded once, before any row of it is written, so
+        rows repeated in the file are imported as many times as they appear.
+        """
+
+        days = days - self.loaded_days
+        if not days:
+            return
+
+        start = datetime.combine(min(days), datetime.min.time(), tzinfo=self.timezone)
+        end = datetime.combine(max(days) + timedelta(days=1), datetime.min.time(), tzinfo=self.timezone)
+        saved = Transaction.objects.filter(user=self.user, date__gte=start, date__lt=end).values_list(
+            'date', 'amount', 'description',
+        )
+
+        for saved_date, amount, description in saved.iterator(chunk_size=self.chunk_size):
+            day = timezone.localtime(saved_date, self.timezone).date()
+            if day in days and amount is not None:
+                self.existing[get_transaction_hash(day, amount, description)] += 1
+
+        self.loaded_days |= days
+
+    def _get_category_name(self, row: StatementRow) -> tuple[str, bool]:
+        """Returns the category name for a row and whether it's an income."""
+
+        is_income = row.amount > 0
+        if row.category:
+            return row.category, is_income
+
+        key = (normalize_text(row.description), is_income)
+        if key not in self._description_categories:
+            self._description_categories[key] = self._match_description(*key)
+        return self._description_categories[key]
+
+    def _match_description(self, description: str, is_income: bool) -> tuple[str, bool]:
+        if self.user_category_pattern and (match := self.user_category_pattern.search(description)):
+            return match.group(1), is_income
+
+        for category_rule in CATEGORY_RULES:
+            if category_rule.pattern.search(description):
+                return category_rule.category, category_rule.is_income
+
+        return (FALLBACK_INCOME_CATEGORY if is_income else FALLBACK_CATEGORY), is_income
+
+    def _create_categories(self, names: Dict[str, tuple[str, bool]]) -> int:
+        created = Category.objects.bulk_create([
+            Category(user=self.user, name=name, normalized_name=name.upper(), is_income=is_income)
+            for name, is_income in names.values()
+        ])
+        for category in created:
+            self.categories[normalize_text(category.name)] = category.pk
+
+        # bulk_create doesn't send post_save, which invalidates the index
+        key = get_category_index_key(self.user)
+        transaction.on_commit(lambda: cache.delete(key))
+        return len(created)
+
+    def _import_chunk(self, chunk: List[StatementRow], result: ImportResult):
+        self._load_existing({row.date for row in chunk})
+
+        rows = []
+        for row in chunk:
+            row_hash = get_transaction_hash(row.date, row.amount, row.description)
+            if self.existing[row_hash] > 0:
+                self.existing[row_hash] -= 1
+                result.duplicates += 1
+                continue
+
+            name, is_income = self._get_category_name(row)
+            if name in (FALLBACK_CATEGORY, FALLBACK_INCOME_CATEGORY) and not row.category:
+                result.uncategorized += 1
+            rows.append((row, name, is_income))
+
+        with transaction.atomic():
+            missing = {}
+            for _, name, is_income in rows:
+                if normalize_text(name) not in self.categories:
+                    missing.setdefault(normalize_text(name), (name, is_income))
+            if missing:
+                result.categories_created += self._create_categories(missing)
+
+            if rows:
+                insert_transactions([
+                    (
+                        self.user,
+                        self.categories[normalize_text(name)],
+                        abs(row.amount),
+                        # Statements only have reliable days, noon keeps the
+                        # day when shown in a nearby timezone
+                        datetime.combine(row.date, datetime.min.time().replace(hour=12), tzinfo=self.timezone),
+                        row.description,
+                    )
+                    for row, name, _ in rows
+                ])
+
+        result.imported += len(rows)
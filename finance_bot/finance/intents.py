@@ -0,0 +1,281 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict
+
+from django.utils import timezone
+
+from finance_bot.finance import tools
+from finance_bot.finance.categories import CategoryIndex, get_category_index, match_categories
+from finance_bot.finance.formatting import format_brl
+from finance_bot.finance.imports import normalize_text
+from finance_bot.finance.rollups import get_next_month
+from finance_bot.metrics import Counter, registry
+
+
+logger = logging.getLogger('IntentParser')
+
+intent_results = registry.register(Counter(
+    'agent_intents_total', 'Messages recognized by the intent parser, answered or left to the agent.',
+    ['intent', 'result'],
+))
+
+AMOUNT = r'(?:r\$\s*)?(?P<amount>\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?:\s*(?:reais|real|pila|conto))?'
+PREPOSITION = r'(?:no|na|nos|nas|em|com|de|do|da|dos|das|pro|pra|para o|para a)'
+DAY = r'(?P<day>hoje|ontem|anteontem|dia \d{1,2})'
+PERIOD = (
+    r'(?P<period>hoje|ontem|(?:n?es[st]a) semana|semana passada|(?:n?es[st]e) mes|mes passado|'
+    r'(?:n?es[st]e) ano|ano passado)'
+)
+
+# Matched against the message in lowercase and without accents
+TRANSACTION_PATTERN = re.compile(
+    rf'^(?:(?P<day_before>hoje|ontem|anteontem) )?(?:eu )?(?P<verb>gastei|paguei|comprei|recebi|ganhei) {AMOUNT}'
+    rf' {PREPOSITION} (?P<category>[a-z][a-z ]*?)(?: {DAY})?[.!]?$'
+)
+SUMMARY_PATTERN = re.compile(
+    rf'^quanto (?:eu )?(?P<verb>gastei|paguei|recebi|ganhei)(?: {PREPOSITION} (?P<category>[a-z][a-z ]*?))?'
+    rf' (?:(?:no|na|em) )?{PERIOD}\s*\??$'
+)
+
+INCOME_VERBS = ('recebi', 'ganhei')
+
+# Words that mean the message carries more than one transaction or a
+# description the parser would lose, e.g. "gastei 50 no mercado e 20 na feira"
+AMBIGUOUS_WORDS = re.compile(r'\b(?:e|mais|menos|cada|por|pelo|pela|porque|que)\b')
+
+PERIOD_NAMES = {
+    'hoje': 'hoje',
+    'ontem': 'ontem',
+    'week': 'nesta semana',
+    'last_week': 'na semana passada',
+    'month': 'neste mês',
+    'last_month': 'no mês passado',
+    'year': 'neste ano',
+    'last_year': 'no ano passado',
+}
+
+
+@dataclass
+class Intent:
+    """
+    A formulaic message the agent isn't needed for.
+
+    `kind` is `transaction`, with the amount and day of a new transaction,
+    or `summary`, with the `start` and `end` days to sum.
+    """
+
+    kind: str
+    is_income: bool
+    category: str | None = None
+    amount: float | None = None
+    day: date | None = None
+    start: date | None = None
+    end: date | None = None
+    period: str | None = None
+
+
+def parse_amount(value: str) -> float:
+    if ',' in value:
+        return float(value.replace('.', '').replace(',', '.'))
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+', value):
+        return float(value.replace('.', ''))
+    return float(value)
+
+
+def parse_day(value: str | None, today: date) -> date | None:
+    if value is None or value == 'hoje':
+        return today
+    if value == 'ontem':
+        return today - timedelta(days=1)
+    if value == 'anteontem':
+        return today - timedelta(days=2)
+
+    # "dia 5" is the last 5th, this month or the one before
+    day = int(value.split()[1])
+    month = today.replace(day=1)
+    if day > today.day:
+        month = (month - timedelta(days=1)).replace(day=1)
+    try:
+        return month.replace(day=day)
+    except ValueError:
+        return None
+
+
+def parse_period(value: str, today: date) -> tuple[str, date, date]:
+    if value in ('hoje', 'ontem'):
+        day = parse_day(value, today)
+        return value, day, day
+
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+
+    if value.endswith('semana'):
+        return 'week', week_start, today
+    if value == 'semana passada':
+        return 'last_week', week_start - timedelta(days=7), week_start - timedelta(days=1)
+    if value.endswith(' mes'):
+        return 'month', month_start, today
+    if value == 'mes passado':
+        last_month_end = month_start - timedelta(days=1)
+        return 'last_month', last_month_end.replace(day=1), last_month_end
+    if value.endswith(' ano'):
+        return 'year', year_start, today
+    return 'last_year', year_start.replace(year=today.year - 1), year_start - timedelta(days=1)
+
+
+def parse_intent(message: str, today: date) -> Intent | None:
+    """Recognizes messages like "gastei 50 no mercado ontem" or "quanto
+    gastei esse mês?". Anything else, or anything that could mean more than
+    one thing, returns None."""
+
+    text = normalize_text(message).lower()
+
+    if match := TRANSACTION_PATTERN.match(text):
+        category = match['category'].strip()
+        if AMBIGUOUS_WORDS.search(category) or (match['day_before'] and match['day']):
+            return None
+
+        day = parse_day(match['day'] or match['day_before'], today)
+        if day is None:
+            return None
+
+        return Intent(
+            kind='transaction',
+            is_income=match['verb'] in INCOME_VERBS,
+            category=category,
+            amount=parse_amount(match['amount']),
+            day=day,
+        )
+
+    if match := SUMMARY_PATTERN.match(text):
+        category = match['category'].strip() if match['category'] else None
+        if category and AMBIGUOUS_WORDS.search(category):
+            return None
+
+        period, start, end = parse_period(match['period'], today)
+        return Intent(
+            kind='summary',
+            is_income=match['verb'] in INCOME_VERBS,
+            category=category,
+            start=start,
+            end=end,
+            period=period,
+        )
+
+    return None
+
+
+def resolve_category(index: CategoryIndex, name: str, exact: bool = False) -> Dict[str, Any] | None:
+    """Returns the only user category matching `name`, ignoring accents.
+
+    With `exact`, only a category with the same name matches, since a
+    prefix or a close name, like "bar" for "Barbearia", may be another
+    category the user hasn't created yet.
+    """
+
+    normalized = normalize_text(name)
+    if exact:
+        matches = [category for key, category in index.items() if normalize_text(key) == normalized]
+    else:
+        normalized_index = {normalize_text(key): category for key, category in index.items()}
+        matches = match_categories(normalized_index, normalized)
+    return matches[0] if len(matches) == 1 else None
+
+
+def record_transaction(user_id: str, intent: Intent) -> str | None:
+    # Money is written without confirmation, so anything but the exact
+    # category name goes to the agent
+    category = resolve_category(get_category_index(user_id), intent.category, exact=True)
+    if category is None or category['is_income'] != intent.is_income:
+        return None
+
+    # Keeps the time of the message, on the day it refers to
+    now = timezone.localtime()
+    tools.CreateTransactionTool().invoke({
+        'user': user_id,
+        'category': category['id'],
+        'amount': intent.amount,
+        'date': datetime.combine(intent.day, now.time().replace(microsecond=0)),
+    })
+
+    when = {0: "hoje", 1: "ontem", 2: "anteontem"}.get((now.date() - intent.day).days, intent.day.strftime("%d/%m"))
+    response = f"Anotado: {format_brl(intent.amount)} em {category['name']} {when}."
+
+    if category['limit'] and not intent.is_income:
+        # The whole month is read from its monthly total
+        month_start = intent.day.replace(day=1)
+        spent = tools.SummarizeTransactionsTool()._get_summary(
+            user_id,
+            [category['id']],
+            datetime.combine(month_start, time.min),
+            datetime.combine(get_next_month(month_start), time.min) - timedelta(microseconds=1),
+            None,
+        )
+        total = sum(row['total'] or 0 for row in spent)
+        response += f" Você já usou {total / category['limit']:.0%} do limite de {category['name']} no mês."
+
+    return response
+
+
+def summarize(user_id: str, intent: Intent) -> str | None:
+    category_ids = None
+    category = None
+    if intent.category:
+        category = resolve_category(get_category_index(user_id), intent.category)
+        if category is None or category['is_income'] != intent.is_income:
+            return None
+        category_ids = [category['id']]
+
+    rows = [
+        row for row in tools.SummarizeTransactionsTool()._get_summary(
+            user_id,
+            category_ids,
+            datetime.combine(intent.start, time.min),
+            datetime.combine(intent.end, time.max),
+            None,
+        )
+        if row['category__is_income'] == intent.is_income
+    ]
+
+    verb = "recebeu" if intent.is_income else "gastou"
+    period = PERIOD_NAMES[intent.period]
+    total = sum(row['total'] or 0 for row in rows)
+
+    if category is not None:
+        response = f"Você {verb} {format_brl(total)} em {category['name']} {period}."
+        if category['limit'] and intent.period == 'month':
+            response += f" Isso é {total / category['limit']:.0%} do limite de {format_brl(category['limit'])}."
+        return response
+
+    if not rows:
+        return f"Você não {verb} nada {period}."
+
+    lines = [f"Você {verb} {format_brl(total)} {period}:"]
+    lines += [f"- {row['category__name']}: {format_brl(row['total'] or 0)}" for row in rows]
+    return "\n".join(lines)
+
+
+def handle_intent(user_id: str, message: str) -> str | None:
+    """Answers formulaic messages without the agent.
+
+    Returns:
+        str | None: The reply, or None when the message should go to the agent.
+    """
+
+    intent = parse_intent(message, timezone.localdate())
+    if intent is None:
+        return None
+
+    if intent.kind == 'transaction':
+        response = record_transaction(user_id, intent)
+    else:
+        response = summarize(user_id, intent)
+
+    intent_results.inc(intent=intent.kind, result='answered' if response is not None else 'agent')
+    if response is None:
+        logger.debug(f"Message '{message}' from user {user_id} left to the agent")
+
+    return response
@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand, CommandError
+
+from finance_bot.finance.rollups import check_monthly_totals, rebuild_monthly_totals
+
+
+class Command(BaseCommand):
+    help = "Checks the monthly category totals against the transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='ID of the user to check, everyone when not given')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the totals of the users with mismatches')
+
+    def handle(self, *args, **options):
+        mismatches = check_monthly_totals(options['user'])
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Monthly totals match the transactions."))
+            return
+
+        for mismatch in mismatches:
+            self.stdout.write(
+                f"User {mismatch.user}, category {mismatch.category_id}, {mismatch.month:%Y-%m}: "
+                f"stored {mismatch.stored[0]:.2f} in {mismatch.stored[1]} transactions, "
+                f"expected {mismatch.expected[0]:.2f} in {mismatch.expected[1]}"
+            )
+
+        if not options['fix']:
+            raise CommandError(f"{len(mismatches)} monthly totals don't match the transactions.")
+
+        users = sorted({mismatch.user for mismatch in mismatches})
+        for user in users:
+            rebuild_monthly_totals(user)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the monthly totals of {len(users)} users."))
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand, CommandError
+
+from finance_bot.finance.imports import IMPORT_FORMATS, StatementError, TransactionImporter
+from finance_bot.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Imports the transactions of a CSV or OFX bank statement"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file')
+        parser.add_argument('--user', required=True, help='ID or email of the user that owns the transactions')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Statement format, guessed from the file when not given')
+        parser.add_argument('--chunk-size', type=int, help='Rows read and written at a time')
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'email': options['user']}
+        user = User.objects.filter(**lookup).first()
+        if user is None:
+            raise CommandError(f"User {options['user']} not found.")
+
+        importer = TransactionImporter(user.pk, chunk_size=options['chunk_size'])
+        try:
+            with open(options['path'], 'rb') as file:
+                result = importer.import_file(file, options['path'], options['format'])
+        except StatementError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.imported} of {result.rows} rows in {result.seconds:.1f}s: "
+            f"{result.duplicates} duplicates, {result.skipped} invalid, {result.uncategorized} uncategorized "
+            f"and {result.categories_created} new categories."
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management import BaseCommand
+
+from finance_bot.finance.rollups import rebuild_monthly_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the monthly category totals from the transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='ID of the user to rebuild, everyone when not given')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        totals = rebuild_monthly_totals(options['user'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {totals} monthly totals in {elapsed:.1f}s."))
@@ -0,0 +1,56 @@
+import itertools
+import logging
+import time
+
+from django.core.management import BaseCommand
+
+from finance_bot.finance.seed import FinanceDataGenerator, chunked, insert_transactions
+from finance_bot.users.models import User
+
+
+class Command(BaseCommand):
+    help = "Generates users, categories and transactions for load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Number of users to create')
+        parser.add_argument('--transactions', type=int, default=1000, help='Average number of transactions per user')
+        parser.add_argument('--months', type=int, default=12, help='Months of history, ending this month')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Transactions written per statement')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same data')
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('SeedFinance')
+        started = time.perf_counter()
+
+        generator = FinanceDataGenerator(months=options['months'], seed=options['seed'])
+
+        start = User.objects.filter(email__startswith='seed', email__endswith='@example.com').count()
+        users = generator.create_users(options['users'], start)
+        categories = generator.create_categories(users)
+        logger.info(f"Created {len(users)} users and {len(categories)} categories")
+
+        categories_by_user = {
+            user: list(user_categories)
+            for user, user_categories in itertools.groupby(categories, key=lambda category: category.user)
+        }
+
+        # Users get between half and one and a half times the average
+        rows = itertools.chain.from_iterable(
+            generator.generate_transactions(
+                user,
+                categories_by_user[str(user.pk)],
+                int(options['transactions'] * generator.rng.uniform(0.5, 1.5)),
+            )
+            for user in users
+        )
+
+        transactions = 0
+        for chunk in chunked(rows, options['chunk_size']):
+            insert_transactions(chunk)
+            transactions += len(chunk)
+            logger.info(f"Inserted {transactions} transactions")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(categories)} categories and {transactions} transactions in {elapsed:.1f}s."
+        ))
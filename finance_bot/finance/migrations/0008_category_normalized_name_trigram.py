@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:45
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# Substring searches on category names can only use an index on
+# PostgreSQL, through pg_trgm. The index is left out of the model state
+# so other databases never try to create it.
+TRIGRAM_INDEX = GinIndex(fields=['normalized_name'], name='category_name_trgm_idx', opclasses=['gin_trgm_ops'])
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.add_index(apps.get_model('finance', 'Category'), TRIGRAM_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('finance', 'Category'), TRIGRAM_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_category_transaction_indexes'),
+    ]
+
+    operations = [
+        # Only runs on PostgreSQL
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
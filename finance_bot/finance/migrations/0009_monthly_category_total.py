@@ -0,0 +1,56 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def backfill_monthly_totals(apps, schema_editor):
+    Transaction = apps.get_model('finance', 'Transaction')
+    MonthlyCategoryTotal = apps.get_model('finance', 'MonthlyCategoryTotal')
+
+    default_timezone = timezone.get_default_timezone()
+    rows = (Transaction.objects.filter(date__isnull=False)
+            .annotate(month=TruncMonth('date', tzinfo=default_timezone))
+            .values('user', 'category_id', 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+
+    MonthlyCategoryTotal.objects.bulk_create([
+        MonthlyCategoryTotal(
+            user=row['user'],
+            category_id=row['category_id'],
+            month=timezone.localtime(row['month'], default_timezone).date(),
+            total=row['total'] or 0,
+            count=row['count'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_category_normalized_name_trigram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user', models.CharField(max_length=14)),
+                ('month', models.DateField()),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finance.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'month'], name='monthly_total_user_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'month'), name='monthly_total_category_month_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_monthly_totals, migrations.RunPython.noop),
+    ]
@@ -11,6 +11,9 @@ class Category(models.Model):
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            models.Index(fields=['user', 'normalized_name'], name='category_user_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,5 +30,38 @@ class Transaction(models.Model):
     date = models.DateTimeField(default=datetime.now, blank=True, null=True)
     description = models.TextField(null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date'], name='transaction_user_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='transaction_user_cat_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user} - {self.category} - {self.date}"
+
+
+class MonthlyCategoryTotal(models.Model):
+    """
+    Sum and count of the transactions of a category in a month, kept up to
+    date by `finance_bot.finance.rollups` as transactions are written.
+
+    Months start on the first day in the default timezone. Transactions
+    without a date aren't counted.
+    """
+
+    user = models.CharField(max_length=14)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    month = models.DateField()
+    total = models.FloatField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'month'], name='monthly_total_category_month_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'month'], name='monthly_total_user_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.category} - {self.month:%Y-%m}"
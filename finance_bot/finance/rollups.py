@@ -0,0 +1,318 @@
+import contextlib
+import contextvars
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from finance_bot.finance.models import MonthlyCategoryTotal, Transaction
+
+
+# User, category id and first day of the month of a monthly total
+RollupKey = tuple[str, int, date]
+
+# Amount and number of transactions to add to each monthly total
+RollupChanges = Dict[RollupKey, List[float]]
+
+# Fields of a transaction the monthly totals depend on
+ROLLUP_FIELDS = {'user', 'category', 'amount', 'date'}
+
+# Difference between the stored and the computed total still considered
+# consistent, since the stored one adds up floats one change at a time
+TOTAL_TOLERANCE = 0.005
+
+
+def get_month(value: datetime | None) -> date | None:
+    """Returns the first day of the month of `value` in the default timezone."""
+
+    if value is None:
+        return None
+    default_timezone = timezone.get_default_timezone()
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, default_timezone)
+    return timezone.localtime(value, default_timezone).date().replace(day=1)
+
+
+def get_month_start(month: date) -> datetime:
+    return timezone.make_aware(datetime.combine(month, time.min), timezone.get_default_timezone())
+
+
+def get_next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def new_changes() -> RollupChanges:
+    return defaultdict(lambda: [0.0, 0])
+
+
+def add_change(changes: RollupChanges, user: str, category_id: int, amount: float | None, day: datetime | None, sign: int = 1):
+    month = get_month(day)
+    if month is None:
+        return
+    change = changes[(str(user), category_id, month)]
+    change[0] += sign * (amount or 0)
+    change[1] += sign
+
+
+def _update_total(category_id: int, month: date, total: float, count: int) -> bool:
+    return MonthlyCategoryTotal.objects.filter(category_id=category_id, month=month).update(
+        total=F('total') + total,
+        count=F('count') + count,
+    ) > 0
+
+
+def _apply_change(key: RollupKey, total: float, count: int):
+    user, category_id, month = key
+    if _update_total(category_id, month, total, count) or count <= 0:
+        # Nothing to take away from a total that doesn't exist, like the
+        # totals of a category being deleted
+        return
+    try:
+        with transaction.atomic():
+            MonthlyCategoryTotal.objects.create(user=user, category_id=category_id, month=month, total=total, count=count)
+    except IntegrityError:
+        # Created by another transaction in the meantime
+        _update_total(category_id, month, total, count)
+
+
+def _apply_changes(changes: RollupChanges):
+    totals = {
+        (row.category_id, row.month): row
+        for row in MonthlyCategoryTotal.objects.select_for_update().filter(
+            category_id__in={category_id for _, category_id, _ in changes},
+            month__in={month for _, _, month in changes},
+        )
+    }
+
+    updated, created = [], []
+    for (user, category_id, month), (total, count) in changes.items():
+        if (row := totals.get((category_id, month))) is not None:
+            row.total += total
+            row.count += count
+            updated.append(row)
+        elif count > 0:
+            created.append(MonthlyCategoryTotal(user=user, category_id=category_id, month=month, total=total, count=count))
+
+    MonthlyCategoryTotal.objects.bulk_update(updated, ['total', 'count'])
+    try:
+        with transaction.atomic():
+            MonthlyCategoryTotal.objects.bulk_create(created)
+    except IntegrityError:
+        for row in created:
+            _apply_change((row.user, row.category_id, row.month), row.total, row.count)
+
+
+def apply_changes(changes: RollupChanges):
+    """Adds the changes to the monthly totals, creating the missing ones.
+
+    A single total is changed in place with one query, more than one are
+    read, changed and written back with a query each.
+    """
+
+    changes = {key: change for key, change in changes.items() if change[0] or change[1]}
+    if not changes:
+        return
+
+    # Only makes sure the totals are written in a transaction, the callers
+    # already open one around the transactions they write
+    with transaction.atomic(savepoint=False):
+        if len(changes) == 1:
+            key, (total, count) = next(iter(changes.items()))
+            _apply_change(key, total, count)
+        else:
+            _apply_changes(changes)
+
+
+pending_changes: contextvars.ContextVar[RollupChanges | None] = contextvars.ContextVar('pending_rollup_changes', default=None)
+
+
+@contextlib.contextmanager
+def batched_changes():
+    """Applies the changes of the transactions saved or deleted inside the
+    block at once, when it ends without errors.
+
+    Deleting many transactions, or a category and its transactions, sends a
+    signal per row, which would otherwise change the totals once per row.
+    """
+
+    if pending_changes.get() is not None:
+        yield
+        return
+
+    changes = new_changes()
+    token = pending_changes.set(changes)
+    try:
+        yield
+    finally:
+        pending_changes.reset(token)
+    apply_changes(changes)
+
+
+def record_changes(changes: RollupChanges):
+    if (pending := pending_changes.get()) is None:
+        apply_changes(changes)
+        return
+    for key, (total, count) in changes.items():
+        pending[key][0] += total
+        pending[key][1] += count
+
+
+def record_transactions(transactions: Iterable[Transaction], sign: int = 1):
+    """Counts transactions written without signals, like with `bulk_create`,
+    in the monthly totals. `sign` is -1 for removed ones."""
+
+    changes = new_changes()
+    for record in transactions:
+        add_change(changes, record.user, record.category_id, record.amount, record.date, sign)
+    record_changes(changes)
+
+
+def record_rows(rows: Iterable[tuple]):
+    """Same as `record_transactions`, for the (user, category id, amount,
+    date, description) rows of `insert_transactions`."""
+
+    changes = new_changes()
+    for user, category_id, amount, day, _ in rows:
+        add_change(changes, user, category_id, amount, day)
+    record_changes(changes)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_total(sender, instance, update_fields=None, **kwargs):
+    instance._rollup_previous = None
+    instance._rollup_skip = update_fields is not None and not ROLLUP_FIELDS & set(update_fields)
+    if instance._state.adding or instance._rollup_skip:
+        return
+
+    instance._rollup_previous = (
+        Transaction.objects.filter(pk=instance.pk).values_list('user', 'category_id', 'amount', 'date').first()
+    )
+
+
+@receiver(post_save, sender=Transaction)
+def update_monthly_total(sender, instance, **kwargs):
+    if getattr(instance, '_rollup_skip', False):
+        return
+
+    changes = new_changes()
+    if previous := getattr(instance, '_rollup_previous', None):
+        add_change(changes, *previous, sign=-1)
+    add_change(changes, instance.user, instance.category_id, instance.amount, instance.date)
+    record_changes(changes)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_monthly_total(sender, instance, **kwargs):
+    changes = new_changes()
+    add_change(changes, instance.user, instance.category_id, instance.amount, instance.date, sign=-1)
+    record_changes(changes)
+
+
+def get_whole_months(start: datetime | None, end: datetime | None) -> tuple[date | None, date | None] | None:
+    """Returns the first month and the month after the last one that are
+    entirely between `start` and `end`, None for an open side.
+
+    Returns None when there is no whole month between them.
+    """
+
+    first = stop = None
+    if start is not None:
+        first = get_month(start)
+        if start > get_month_start(first):
+            first = get_next_month(first)
+
+    if end is not None:
+        stop = get_month(end)
+        if end >= get_month_start(get_next_month(stop)) - timedelta(microseconds=1):
+            stop = get_next_month(stop)
+
+    if first is not None and stop is not None and first >= stop:
+        return None
+    return first, stop
+
+
+def compute_monthly_totals(user: str | None = None) -> Dict[RollupKey, tuple[float, int]]:
+    """Sums the transactions of each category and month from scratch."""
+
+    transactions = Transaction.objects.filter(date__isnull=False)
+    if user is not None:
+        transactions = transactions.filter(user=user)
+
+    rows = (transactions
+            .annotate(month=TruncMonth('date', tzinfo=timezone.get_default_timezone()))
+            .values('user', 'category_id', 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+
+    totals = defaultdict(lambda: [0.0, 0])
+    for row in rows:
+        total = totals[(row['user'], row['category_id'], get_month(row['month']))]
+        total[0] += row['total'] or 0
+        total[1] += row['count']
+    return {key: (total, count) for key, (total, count) in totals.items()}
+
+
+def rebuild_monthly_totals(user: str | None = None) -> int:
+    """Replaces the monthly totals, of a user or everyone, with ones summed
+    from the transactions.
+
+    Returns:
+        int: The number of monthly totals written.
+    """
+
+    totals = compute_monthly_totals(user)
+    with transaction.atomic():
+        stored = MonthlyCategoryTotal.objects.all()
+        if user is not None:
+            stored = stored.filter(user=user)
+        stored.delete()
+
+        MonthlyCategoryTotal.objects.bulk_create([
+            MonthlyCategoryTotal(user=key_user, category_id=category_id, month=month, total=total, count=count)
+            for (key_user, category_id, month), (total, count) in totals.items()
+        ], batch_size=1000)
+
+    return len(totals)
+
+
+@dataclass
+class RollupMismatch:
+    """
+    A monthly total that doesn't match the sum of its transactions.
+    """
+
+    user: str
+    category_id: int
+    month: date
+    stored: tuple[float, int]
+    expected: tuple[float, int]
+
+
+def check_monthly_totals(user: str | None = None) -> List[RollupMismatch]:
+    """Compares the monthly totals with the sums of their transactions."""
+
+    expected = compute_monthly_totals(user)
+
+    stored_totals = MonthlyCategoryTotal.objects.all()
+    if user is not None:
+        stored_totals = stored_totals.filter(user=user)
+    stored = {
+        (row['user'], row['category_id'], row['month']): (row['total'], row['count'])
+        for row in stored_totals.values('user', 'category_id', 'month', 'total', 'count')
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | stored.keys(), key=lambda key: (key[0], key[2], key[1])):
+        stored_total, stored_count = stored.get(key, (0.0, 0))
+        expected_total, expected_count = expected.get(key, (0.0, 0))
+        if stored_count != expected_count or abs(stored_total - expected_total) > TOTAL_TOLERANCE:
+            mismatches.append(RollupMismatch(*key, (stored_total, stored_count), (expected_total, expected_count)))
+
+    return mismatches
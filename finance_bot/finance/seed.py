@@ -0,0 +1,231 @@
+import calendar
+import csv
+import io
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, List
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from finance_bot.finance.models import Category, Transaction
+from finance_bot.finance.rollups import record_rows
+from finance_bot.users.models import User
+
+
+@dataclass(frozen=True)
+class CategoryProfile:
+    """
+    How the transactions of a seeded category look.
+
+    Amounts follow a log-normal distribution around `median_amount`.
+    Recurring categories get one transaction per month close to
+    `recurring_day`; the other ones share the remaining transactions by
+    `weight`, with `weekend_factor` times more of them on weekends.
+    """
+
+    name: str
+    median_amount: float
+    sigma: float
+    descriptions: tuple[str, ...]
+    weight: float = 0
+    weekend_factor: float = 1
+    recurring_day: int | None = None
+    is_income: bool = False
+    limit: float | None = None
+
+
+CATEGORY_PROFILES = [
+    CategoryProfile("Mercado", 120, 0.6, ("Supermercado", "Feira", "Padaria", "Açougue"), weight=30, limit=1500),
+    CategoryProfile("Restaurante", 45, 0.5, ("Almoço", "Jantar", "Lanche", "Delivery"), weight=20, weekend_factor=1.8),
+    CategoryProfile("Transporte", 25, 0.5, ("Uber", "Ônibus", "Gasolina", "Estacionamento"), weight=18),
+    CategoryProfile("Compras", 150, 0.9, ("Roupas", "Eletrônicos", "Casa", "Presente"), weight=10),
+    CategoryProfile("Lazer", 80, 0.7, ("Cinema", "Show", "Bar", "Viagem"), weight=8, weekend_factor=2.5, limit=600),
+    CategoryProfile("Saúde", 90, 0.8, ("Farmácia", "Consulta", "Exame"), weight=5),
+    CategoryProfile("Educação", 200, 0.6, ("Livros", "Curso"), weight=3),
+    CategoryProfile("Moradia", 1800, 0.02, ("Aluguel",), recurring_day=10),
+    CategoryProfile("Contas", 250, 0.2, ("Luz", "Água", "Internet"), recurring_day=15),
+    CategoryProfile("Assinaturas", 45, 0.01, ("Streaming", "Academia"), recurring_day=5),
+    CategoryProfile("Salário", 6000, 0.02, ("Salário",), recurring_day=5, is_income=True),
+]
+
+# Spending per month of the year, relative to an average month
+SEASONALITY = {1: 0.9, 2: 0.85, 3: 0.95, 4: 0.95, 5: 1.0, 6: 1.0, 7: 1.05, 8: 0.95, 9: 0.95, 10: 1.0, 11: 1.15, 12: 1.35}
+
+TRANSACTION_COLUMNS = ('user', 'category_id', 'amount', 'date', 'description')
+
+
+def month_starts(months: int, today: date) -> List[date]:
+    starts = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def random_datetime(rng: random.Random, day: date) -> datetime:
+    return datetime.combine(day, time(rng.randint(7, 22), rng.randint(0, 59)), tzinfo=timezone.utc)
+
+
+class FinanceDataGenerator:
+    """
+    Generates users, categories and transactions for load tests.
+
+    Transactions are produced as tuples in `TRANSACTION_COLUMNS` order, so
+    they can be written without building a model instance for each row.
+    """
+
+    def __init__(self, months: int, seed: int = 0, today: date | None = None):
+        self.rng = random.Random(seed)
+        today = today or date.today()
+        self.months = month_starts(months, today)
+        self.days = [
+            month + timedelta(days=offset)
+            for month in self.months
+            for offset in range(calendar.monthrange(month.year, month.month)[1])
+            if month + timedelta(days=offset) <= today
+        ]
+        self.day_weights = {
+            profile.name: self._get_day_weights(profile)
+            for profile in CATEGORY_PROFILES
+            if not profile.recurring_day
+        }
+
+    def _get_day_weights(self, profile: CategoryProfile) -> List[float]:
+        cumulative, total = [], 0.0
+        for day in self.days:
+            total += SEASONALITY[day.month] * (profile.weekend_factor if day.weekday() >= 5 else 1)
+            cumulative.append(total)
+        return cumulative
+
+    def create_users(self, count: int, start: int) -> List[User]:
+        password = make_password(None)
+        return User.objects.bulk_create([
+            User(email=f"seed{start + index}@example.com", first_name=f"Usuário {start + index}", password=password)
+            for index in range(count)
+        ])
+
+    def create_categories(self, users: Iterable[User]) -> List[Category]:
+        return Category.objects.bulk_create([
+            Category(
+                user=str(user.pk),
+                name=profile.name,
+                normalized_name=profile.name.upper(),
+                is_income=profile.is_income,
+                limit=profile.limit,
+            )
+            for user in users
+            for profile in CATEGORY_PROFILES
+        ])
+
+    def _amount(self, profile: CategoryProfile, median: float | None = None) -> float:
+        return round(self.rng.lognormvariate(math.log(median or profile.median_amount), profile.sigma), 2)
+
+    def generate_transactions(self, user: User, categories: List[Category], count: int) -> Iterator[tuple]:
+        """Yields about `count` transactions of a user: one per month for
+        each recurring category and the rest spread by category weight."""
+
+        rng = self.rng
+        profiles = {profile.name: profile for profile in CATEGORY_PROFILES}
+        categories = {category.name: category for category in categories}
+
+        recurring = [profile for profile in CATEGORY_PROFILES if profile.recurring_day]
+        for profile in recurring:
+            # Bills change little from month to month, but differ between users
+            median = self._amount(profile)
+            for month in self.months:
+                day = month.replace(day=min(profile.recurring_day + rng.randint(-2, 2), 28))
+                if day <= self.days[-1]:
+                    yield (
+                        str(user.pk),
+                        categories[profile.name].pk,
+                        self._amount(profile, median),
+                        random_datetime(rng, day),
+                        rng.choice(profile.descriptions),
+                    )
+
+        # Every user spends a bit differently
+        variable = [profile for profile in CATEGORY_PROFILES if not profile.recurring_day]
+        weights = [profile.weight * rng.lognormvariate(0, 0.5) for profile in variable]
+        remaining = max(count - len(recurring) * len(self.months), 0)
+
+        for name, category_count in Counter(p.name for p in rng.choices(variable, weights, k=remaining)).items():
+            profile = profiles[name]
+            days = rng.choices(self.days, cum_weights=self.day_weights[name], k=category_count)
+            for day in days:
+                yield (
+                    str(user.pk),
+                    categories[name].pk,
+                    self._amount(profile),
+                    random_datetime(rng, day),
+                    rng.choice(profile.descriptions) if rng.random() < 0.8 else None,
+                )
+
+
+def chunked(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def get_transaction_columns() -> str:
+    return ", ".join(
+        connection.ops.quote_name(Transaction._meta.get_field(name).column)
+        for name in TRANSACTION_COLUMNS
+    )
+
+
+def copy_transactions(rows: List[tuple]):
+    """Writes transactions with Postgres COPY, through `Cursor.copy` on
+    psycopg 3 and `copy_expert` on psycopg2, which is all it has."""
+
+    table = f"{connection.ops.quote_name(Transaction._meta.db_table)} ({get_transaction_columns()})"
+
+    with connection.cursor() as cursor:
+        if is_psycopg3:
+            with cursor.copy(f"COPY {table} FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def insert_transactions(rows: List[tuple]):
+    """Writes a chunk of transactions, with COPY on Postgres and a single
+    `executemany` everywhere else.
+
+    Both skip building a model instance per row, which `bulk_create` needs
+    and which takes longer than the insert itself at this volume. Neither
+    sends signals, so the rows are added to the monthly totals here.
+    """
+
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            copy_transactions(rows)
+        else:
+            adapt_datetime = connection.ops.adapt_datetimefield_value
+            placeholders = ", ".join(["%s"] * len(TRANSACTION_COLUMNS))
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {connection.ops.quote_name(Transaction._meta.db_table)} ({get_transaction_columns()}) "
+                    f"VALUES ({placeholders})",
+                    [(user, category, amount, adapt_datetime(date), description) for user, category, amount, date, description in rows],
+                )
+
+        record_rows(rows)
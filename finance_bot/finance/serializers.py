@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
 from finance_bot.finance import models
+from finance_bot.finance.imports import IMPORT_FORMATS
+from finance_bot.users.models import User
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -13,3 +15,19 @@ class TransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = models.Transaction
         fields = '__all__'
+
+
+class TransactionImportSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False)
+
+
+class ImportResultSerializer(serializers.Serializer):
+    rows = serializers.IntegerField()
+    imported = serializers.IntegerField()
+    duplicates = serializers.IntegerField()
+    skipped = serializers.IntegerField()
+    uncategorized = serializers.IntegerField()
+    categories_created = serializers.IntegerField()
+    seconds = serializers.FloatField()
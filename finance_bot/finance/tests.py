@@ -0,0 +1,675 @@
+import io
+import threading
+import uuid
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from langchain_core.messages.utils import count_tokens_approximately
+
+from finance_bot.caching import check_rate_limit_cache, check_shared_caches
+from finance_bot.database import scoped_connection
+from finance_bot.finance.formatting import format_hidden_rows, format_table
+from finance_bot.finance.imports import TransactionImporter
+from finance_bot.finance.intents import handle_intent, parse_intent
+from finance_bot.finance.models import Category, MonthlyCategoryTotal, Transaction
+from finance_bot.finance.rollups import check_monthly_totals, get_month, get_month_start
+from finance_bot.finance.seed import FinanceDataGenerator, chunked, copy_transactions, insert_transactions
+from finance_bot.finance.tools import (
+    CreateTransactionTool,
+    CreateTransactionsTool,
+    DeleteTransactionsTool,
+    RecordExpenseTool,
+    RecordExpensesTool,
+    SearchTransactionsTool,
+    SearchUserCategoriesTool,
+    SummarizeTransactionsTool,
+    UpdateTransactionsTool,
+)
+from finance_bot.users.models import User
+from finance_bot.finance.tracing import TurnTraceHandler, install_query_tracing, trace_turn
+from finance_bot.ratelimit import SlidingWindowRateLimiter
+
+
+class QueryPlanTestCase(TestCase):
+    """Checks that the tool query patterns are served by the composite indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(user='1', name='Mercado')
+        Transaction.objects.bulk_create([
+            Transaction(user='1', category=cls.category, amount=10, date=datetime(2025, 1, day, tzinfo=timezone.utc))
+            for day in range(1, 29)
+        ])
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables are cheaper to scan, make the planner consider the indexes.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_category_lookup_by_name_uses_index(self):
+        queryset = Category.objects.filter(user='1', normalized_name='MERCADO')
+        self.assertUsesIndex(queryset, 'category_user_name_idx')
+
+    def test_latest_transactions_use_index(self):
+        queryset = Transaction.objects.filter(user='1').order_by('-date')[:10]
+        self.assertUsesIndex(queryset, 'transaction_user_date_idx')
+
+    def test_transactions_by_category_and_date_use_index(self):
+        queryset = Transaction.objects.filter(
+            user='1',
+            category=self.category,
+            date__gte=datetime(2025, 1, 10, tzinfo=timezone.utc),
+        )
+        self.assertUsesIndex(queryset, 'transaction_user_cat_date_idx')
+
+
+class FinanceDataGeneratorTestCase(TestCase):
+
+    def setUp(self):
+        self.generator = FinanceDataGenerator(months=3, seed=1, today=date(2025, 3, 31))
+        self.users = self.generator.create_users(2, start=0)
+        self.categories = self.generator.create_categories(self.users)
+
+    def test_inserts_the_generated_transactions(self):
+        user = self.users[0]
+        categories = [category for category in self.categories if category.user == str(user.pk)]
+        rows = list(self.generator.generate_transactions(user, categories, 200))
+
+        for chunk in chunked(rows, 50):
+            insert_transactions(chunk)
+
+        self.assertEqual(len(rows), 200)
+        self.assertEqual(Transaction.objects.filter(user=str(user.pk)).count(), 200)
+
+    def test_recurring_categories_get_one_transaction_per_month(self):
+        user = self.users[0]
+        categories = [category for category in self.categories if category.user == str(user.pk)]
+        insert_transactions(list(self.generator.generate_transactions(user, categories, 200)))
+
+        rent = Transaction.objects.filter(user=str(user.pk), category__name="Moradia")
+        self.assertEqual(sorted(transaction.date.month for transaction in rent), [1, 2, 3])
+
+    def test_copies_with_the_installed_psycopg(self):
+        user = self.users[0]
+        categories = [category for category in self.categories if category.user == str(user.pk)]
+        rows = list(self.generator.generate_transactions(user, categories, 3))
+
+        for psycopg3 in (True, False):
+            with self.subTest(psycopg3=psycopg3), \
+                    mock.patch('finance_bot.finance.seed.is_psycopg3', psycopg3), \
+                    mock.patch.object(connection, 'cursor') as get_cursor:
+                copy_transactions(rows)
+
+            cursor = get_cursor.return_value.__enter__.return_value
+            if psycopg3:
+                copy = cursor.copy.return_value.__enter__.return_value
+                self.assertEqual(copy.write_row.call_args_list, [mock.call(row) for row in rows])
+                cursor.copy_expert.assert_not_called()
+            else:
+                cursor.copy.assert_not_called()
+                self.assertEqual(len(cursor.copy_expert.call_args.args[1].getvalue().splitlines()), len(rows))
+
+
+class TurnTraceTestCase(TestCase):
+
+    def setUp(self):
+        install_query_tracing(connection)
+
+    def test_records_queries_and_tool_runs_of_the_turn(self):
+        handler = TurnTraceHandler()
+        run_id = uuid.uuid4()
+
+        with trace_turn('invoke', '1') as trace:
+            handler.on_tool_start({'name': 'search_transactions'}, '', run_id=run_id)
+            list(Category.objects.all())
+            list(Transaction.objects.all())
+            handler.on_tool_end('', run_id=run_id)
+
+        self.assertEqual(trace.queries, 2)
+        self.assertEqual(trace.counts['tool'], 1)
+        self.assertGreater(trace.durations['tool'], 0)
+
+    def test_ignores_queries_outside_a_turn(self):
+        with trace_turn('invoke', '1') as trace:
+            pass
+        list(Category.objects.all())
+
+        self.assertEqual(trace.queries, 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_the_token(self):
+        with trace_turn('invoke', '1'):
+            pass
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('agent_turn_seconds_count{entrypoint="invoke"}', response.content.decode())
+        self.assertEqual(self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_are_disabled_without_a_token(self):
+        for headers in ({}, {'Authorization': 'Bearer '}, {'Authorization': 'Bearer'}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.client.get('/metrics', headers=headers).status_code, 403)
+
+
+class ScopedConnectionTestCase(TestCase):
+
+    def test_closes_the_connection_opened_by_a_worker_thread(self):
+        closed = []
+
+        def work():
+            # The in-memory test database ignores close(), so only the call is checked
+            with mock.patch.object(connections['default'], 'close') as close:
+                with scoped_connection():
+                    list(Category.objects.all())
+            closed.append(close.called)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(closed, [True])
+
+    def test_keeps_the_connection_the_thread_already_had(self):
+        list(Category.objects.all())
+
+        with mock.patch.object(connection, 'close') as close:
+            with scoped_connection():
+                list(Category.objects.all())
+
+        close.assert_not_called()
+
+
+STATEMENT_CSV = """Data;Descrição;Valor
+05/01/2025;UBER *TRIP;-23,90
+05/01/2025;UBER *TRIP;-23,90
+06/01/2025;Supermercado Dia;-1.234,56
+07/01/2025;Pet shop do bairro;-80,00
+10/01/2025;SALARIO ACME;5.000,00
+data inválida;Loja;-1,00
+"""
+
+STATEMENT_OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250105120000[-3:BRT]<TRNAMT>-23.90<FITID>1<MEMO>UBER *TRIP</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250108<TRNAMT>-45.00<FITID>2<MEMO>NETFLIX.COM</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+REDIS_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0'}}
+
+
+class SharedCacheCheckTestCase(TestCase):
+
+    def test_requires_a_shared_cache_with_several_processes(self):
+        with override_settings(APP_PROCESSES=2):
+            self.assertEqual([error.id for error in check_shared_caches(None)], ['finance_bot.E001'])
+
+        with override_settings(APP_PROCESSES=2, CACHES=REDIS_CACHES):
+            self.assertEqual(check_shared_caches(None), [])
+
+        with override_settings(APP_PROCESSES=1):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+class SlidingWindowRateLimiterTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.limiter = SlidingWindowRateLimiter('default', window=60)
+
+    def hits(self, now: float, count: int, key: str = 'user') -> list[bool]:
+        with mock.patch('finance_bot.ratelimit.time.time', return_value=now):
+            return [self.limiter.exceeded(key, 2) for _ in range(count)]
+
+    def test_previous_window_counts_while_it_overlaps(self):
+        window_start = 60 * 1000
+        self.assertEqual(self.hits(window_start + 10, 3), [False, False, True])
+
+        # The two hits of the previous window still count in full, then by
+        # half, then not at all
+        self.assertEqual(self.hits(window_start + 60, 1), [True])
+        self.assertEqual(self.hits(window_start + 90, 2), [False, True])
+        self.assertEqual(self.hits(window_start + 180, 2), [False, False])
+
+    def test_concurrent_hits_never_go_over_the_limit(self):
+        results = []
+        barrier = threading.Barrier(10)
+
+        def hit():
+            barrier.wait()
+            results.append(self.limiter.exceeded('concurrent', 3))
+
+        threads = [threading.Thread(target=hit) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(False), 3)
+        self.assertTrue(self.limiter.exceeded('concurrent', 3))
+        self.assertFalse(async_to_sync(self.limiter.aexceeded)('other', 3))
+
+    def test_requires_a_shared_cache_with_several_processes(self):
+        with override_settings(APP_PROCESSES=2):
+            self.assertEqual([error.id for error in check_rate_limit_cache(None)], ['finance_bot.E002'])
+
+        with override_settings(APP_PROCESSES=2, CACHES=REDIS_CACHES):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+
+class TransactionImporterTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.pets = Category.objects.create(user='1', name='Pet')
+
+    def import_statement(self, content: str, name: str, encoding: str = 'utf-8'):
+        return TransactionImporter('1', chunk_size=2).import_file(io.BytesIO(content.encode(encoding)), name)
+
+    def test_imports_and_categorizes_csv_rows(self):
+        result = self.import_statement(STATEMENT_CSV, 'extrato.csv', encoding='cp1252')
+
+        self.assertEqual((result.rows, result.imported, result.skipped), (6, 5, 1))
+        categories = dict(Transaction.objects.filter(user='1').values_list('description', 'category__name'))
+        self.assertEqual(categories, {
+            'UBER *TRIP': 'Transporte',
+            'Supermercado Dia': 'Mercado',
+            'Pet shop do bairro': 'Pet',
+            'SALARIO ACME': 'Salário',
+        })
+        self.assertEqual(Transaction.objects.get(description='Supermercado Dia').amount, 1234.56)
+        self.assertTrue(Category.objects.get(user='1', name='Salário').is_income)
+
+    def test_skips_rows_already_imported(self):
+        self.import_statement(STATEMENT_CSV, 'extrato.csv')
+        result = self.import_statement(STATEMENT_CSV, 'extrato.csv')
+        ofx_result = self.import_statement(STATEMENT_OFX, 'extrato.ofx')
+
+        self.assertEqual((result.imported, result.duplicates), (0, 5))
+        self.assertEqual((ofx_result.imported, ofx_result.duplicates), (1, 1))
+        self.assertEqual(Transaction.objects.filter(user='1', description='NETFLIX.COM').get().category.name, 'Assinaturas')
+
+    # The finance API isn't routed by the project, like the other finance views
+    @override_settings(ROOT_URLCONF='finance_bot.finance.urls')
+    def test_imports_through_the_api(self):
+        user = User.objects.create(email='import@example.com')
+        response = self.client.post(
+            '/transactions/import',
+            {'user': user.pk, 'file': SimpleUploadedFile('extrato.csv', STATEMENT_CSV.encode())},
+            headers={'X-Api-Key': settings.API_KEY},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['imported'], 5)
+        self.assertEqual(Transaction.objects.filter(user=str(user.pk)).count(), 5)
+
+
+class IntentParserTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.market = Category.objects.create(user='1', name='Mercado', limit=1000)
+        Category.objects.create(user='1', name='Farmácia')
+        Category.objects.create(user='1', name='Farmácia popular')
+
+    def test_parses_amounts_categories_and_days(self):
+        intent = parse_intent("Ontem gastei R$ 1.234,56 no Mercado", date(2025, 3, 10))
+        self.assertEqual((intent.kind, intent.amount, intent.category, intent.day), ('transaction', 1234.56, 'mercado', date(2025, 3, 9)))
+
+        intent = parse_intent("gastei 20 na feira dia 15", date(2025, 3, 10))
+        self.assertEqual(intent.day, date(2025, 2, 15))
+
+        intent = parse_intent("quanto gastei com mercado no mês passado?", date(2025, 3, 10))
+        self.assertEqual((intent.kind, intent.start, intent.end), ('summary', date(2025, 2, 1), date(2025, 2, 28)))
+
+    def test_leaves_ambiguous_messages_to_the_agent(self):
+        for message in (
+            "gastei 50 no mercado e 20 na farmácia",
+            "gastei 50 na farm",
+            "gastei 50 no cinema",
+            "quanto gastei por mês?",
+        ):
+            with self.subTest(message=message):
+                self.assertIsNone(handle_intent('1', message))
+
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_records_only_exact_category_names(self):
+        Category.objects.create(user='1', name='Barbearia')
+
+        for message in ("gastei 50 no bar", "gastei 50 no mercadinho", "gastei 50 na farmacia pop"):
+            with self.subTest(message=message):
+                self.assertIsNone(handle_intent('1', message))
+
+        self.assertFalse(Transaction.objects.exists())
+        self.assertTrue(handle_intent('1', "gastei 50 na farmacia").startswith("Anotado: R$ 50,00 em Farmácia"))
+
+    def test_records_transactions_and_summarizes(self):
+        response = handle_intent('1', "gastei 250 no mercado")
+        self.assertEqual(response, "Anotado: R$ 250,00 em Mercado hoje. Você já usou 25% do limite de Mercado no mês.")
+
+        transaction = Transaction.objects.get()
+        self.assertEqual((transaction.category, transaction.amount), (self.market, 250))
+
+        self.assertEqual(handle_intent('1', "quanto gastei este mês?"), "Você gastou R$ 250,00 neste mês:\n- Mercado: R$ 250,00")
+
+
+class RecordExpenseToolTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.market = Category.objects.create(user='1', name='Mercado')
+        Category.objects.create(user='1', name='Farmácia')
+        Category.objects.create(user='1', name='Farmácia popular')
+
+    def test_records_by_category_name(self):
+        output = RecordExpenseTool().invoke({'user': '1', 'category_name': 'merc', 'amount': 50, 'date': '2025-03-08'})
+
+        transaction = Transaction.objects.get()
+        self.assertEqual(output, f"Transaction created with ID {transaction.id} in category Mercado")
+        self.assertEqual((transaction.category, transaction.date.date()), (self.market, date(2025, 3, 8)))
+
+    def test_creates_categories_only_when_asked(self):
+        output = RecordExpenseTool().invoke({'user': '1', 'category_name': 'Gasolina', 'amount': 200})
+        self.assertTrue(output.startswith("Category 'Gasolina' was not found."))
+        self.assertIn("matches Farmácia, Farmácia popular", RecordExpenseTool().invoke({'user': '1', 'category_name': 'farm', 'amount': 20}))
+        self.assertFalse(Transaction.objects.exists())
+
+        RecordExpenseTool().invoke({'user': '1', 'category_name': 'Gasolina', 'amount': 200, 'create_category': True})
+        self.assertEqual(Transaction.objects.get().category.name, 'Gasolina')
+
+        # Dates default to now, which is already aware
+        CreateTransactionTool().invoke({'user': '1', 'category': self.market.id, 'amount': 10})
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_records_batches_in_one_call(self):
+        entries = [
+            {'category_name': 'mercado', 'amount': 50},
+            {'category_name': 'farm', 'amount': 30},
+            {'category_name': 'Salário', 'amount': 5000, 'is_income': True},
+            {'category_name': 'Salário', 'amount': 100, 'description': 'Bônus'},
+        ]
+
+        output = RecordExpensesTool().invoke({'user': '1', 'entries': entries})
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(output.count("|not recorded|"), 3)
+
+        with self.assertNumQueries(8):
+            output = RecordExpensesTool().invoke({'user': '1', 'entries': entries[2:], 'create_categories': True})
+
+        self.assertIn("Categories created: Salário.", output)
+        self.assertTrue(Category.objects.get(user='1', name='Salário').is_income)
+        self.assertEqual(Transaction.objects.filter(category__name='Salário').count(), 2)
+
+
+class BatchTransactionToolsTestCase(TestCase):
+
+    def setUp(self):
+        self.market = Category.objects.create(user='1', name='Mercado')
+        self.other_user = Category.objects.create(user='2', name='Mercado')
+
+    def test_creates_transactions(self):
+        with self.assertNumQueries(8):
+            output = CreateTransactionsTool().invoke({'user': '1', 'transactions': [
+                {'category': self.market.id, 'amount': 10},
+                {'category': self.other_user.id, 'amount': 20},
+                {'category': self.market.id, 'amount': 30, 'date': '2025-03-08'},
+            ]})
+
+        ids = list(Transaction.objects.filter(user='1').order_by('id').values_list('id', flat=True))
+        self.assertEqual(output, (
+            "2 created, 1 category not found.\n"
+            f"entry|status|id\n1|created|{ids[0]}\n2|category not found|\n3|created|{ids[1]}"
+        ))
+
+    def test_updates_and_deletes_transactions(self):
+        first, second = Transaction.objects.bulk_create([
+            Transaction(user='1', category=self.market, amount=10, date=datetime.now(timezone.utc)),
+            Transaction(user='1', category=self.market, amount=20, date=datetime.now(timezone.utc)),
+        ])
+        theirs = Transaction.objects.create(user='2', category=self.other_user, amount=30, date=datetime.now(timezone.utc))
+
+        with self.assertNumQueries(5):
+            output = UpdateTransactionsTool().invoke({'user_id': '1', 'transactions': [
+                {'transaction': first.id, 'amount': 15},
+                {'transaction': theirs.id, 'amount': 1},
+            ]})
+        self.assertTrue(output.startswith("1 updated, 1 not found."))
+        self.assertEqual(Transaction.objects.get(id=first.id).amount, 15)
+        self.assertEqual(Transaction.objects.get(id=theirs.id).amount, 30)
+
+        output = DeleteTransactionsTool().invoke({'user_id': '1', 'transaction_ids': [first.id, second.id, theirs.id]})
+        self.assertTrue(output.startswith("2 deleted, 1 not found."))
+        self.assertEqual(list(Transaction.objects.values_list('id', flat=True)), [theirs.id])
+
+
+class FormatTableTestCase(TestCase):
+
+    def test_formats_the_cells(self):
+        output, shown = format_table(
+            ["id", "date", "paid", "amount", "description"],
+            [(1, datetime(2025, 3, 10, 12, tzinfo=timezone.utc), True, 12.5, "feira | mercado\nsábado"), (2, None, False, None, "x" * 100)],
+        )
+
+        self.assertEqual(output.splitlines(), [
+            "id|date|paid|amount|description",
+            "1|2025-03-10|yes|12.50|feira / mercado sábado",
+            "2||no||" + "x" * 77 + "...",
+        ])
+        self.assertEqual(shown, 2)
+
+    def test_stops_at_the_token_budget(self):
+        rows = [(index, "x" * 40) for index in range(10)]
+        output, shown = format_table(["id", "name"], rows, max_tokens=30)
+
+        self.assertEqual(shown, 2)
+        self.assertEqual(len(output.splitlines()), 3)
+        self.assertLessEqual(count_tokens_approximately([output]), 30)
+
+    @override_settings(TOOL_RESULT_MAX_TOKENS=40)
+    def test_tools_report_the_rows_left_out(self):
+        for index in range(10):
+            Category.objects.create(user='1', name=f"Categoria {index:02} " + "x" * 40)
+        cache.clear()
+
+        lines = SearchUserCategoriesTool().invoke({'user': '1'}).splitlines()
+
+        self.assertEqual(lines[-1], format_hidden_rows(10 - (len(lines) - 2)))
+        self.assertLess(len(lines) - 2, 10)
+
+
+class SearchTransactionsToolTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.market = Category.objects.create(user='1', name='Mercado')
+        day = datetime(2025, 3, 10, 12, tzinfo=timezone.utc)
+        # Two transactions share each date and one has none, so the cursor
+        # has to break ties by id
+        self.transactions = Transaction.objects.bulk_create(
+            [Transaction(user='1', category=self.market, amount=index, date=day - timedelta(days=index // 2)) for index in range(6)]
+            + [Transaction(user='1', category=self.market, amount=6, date=None)]
+        )
+
+    def search(self, **kwargs) -> tuple[list[int], str | None]:
+        output = SearchTransactionsTool().invoke({'user_id': '1', **kwargs})
+        lines = output.splitlines()
+        cursor = None
+        if lines[-1].startswith("More transactions available"):
+            cursor = lines.pop().split("'")[1]
+        return [int(line.split("|")[0]) for line in lines[1:]], cursor
+
+    def test_pages_through_every_transaction(self):
+        ids, cursor, pages = [], None, 0
+        while True:
+            page, cursor = self.search(limit=3, **({'cursor': cursor} if cursor else {}))
+            ids += page
+            pages += 1
+            if cursor is None:
+                break
+
+        expected = sorted(self.transactions[:6], key=lambda transaction: (transaction.date, transaction.id), reverse=True)
+        self.assertEqual(ids, [transaction.id for transaction in expected] + [self.transactions[6].id])
+        self.assertEqual(pages, 3)
+
+    def test_rejects_tampered_cursors(self):
+        for cursor in ("abc", "2025-03-10T12:00:00+00:00,abc", "yesterday,1"):
+            with self.subTest(cursor=cursor):
+                output = SearchTransactionsTool().invoke({'user_id': '1', 'cursor': cursor})
+                self.assertEqual(output, "Invalid cursor.")
+
+    def test_accepts_aware_and_naive_date_bounds(self):
+        expected = [transaction.id for transaction in self.transactions[:2]]
+        for start_date in (datetime(2025, 3, 10), datetime(2025, 3, 10, tzinfo=timezone.utc), "2025-03-10T00:00:00-03:00"):
+            with self.subTest(start_date=start_date):
+                ids, _ = self.search(start_date=start_date)
+                self.assertCountEqual(ids, expected)
+
+
+class SummarizeTransactionsToolTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.market = Category.objects.create(user='1', name='Mercado', limit=100)
+        self.salary = Category.objects.create(user='1', name='Salário', is_income=True)
+        now = datetime.now(timezone.utc)
+        self.last_month = get_month_start(get_month(now)) - timedelta(days=1)
+        for category, amount, day in (
+            (self.market, 30, now),
+            (self.market, 10, now),
+            (self.market, 200, self.last_month),
+            (self.salary, 1000, self.last_month),
+        ):
+            Transaction.objects.create(user='1', category=category, amount=amount, date=day)
+
+    def summarize(self, **kwargs) -> dict[str, list[str]]:
+        output = SummarizeTransactionsTool().invoke({'user_id': '1', **kwargs})
+        rows = [line.split("|") for line in output.splitlines()]
+        self.assertEqual(rows[0], ["category", "type", "period", "total", "count", "average", "month_limit_usage"])
+        return {row[0]: row[1:] for row in rows[1:]}
+
+    def test_sums_each_category(self):
+        self.assertEqual(self.summarize(), {
+            'Salário': ["income", "", "1000.00", "1", "1000.00", ""],
+            'Mercado': ["expense", "", "240.00", "3", "80.00", "40%"],
+        })
+
+    def test_limit_usage_only_counts_the_current_month(self):
+        summary = self.summarize(category="mercado", end_date=self.last_month)
+
+        self.assertEqual(summary['Mercado'][2], "200.00")
+        self.assertEqual(summary['Mercado'][5], "40%")
+
+
+class MonthlyCategoryTotalTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.market = Category.objects.create(user='1', name='Mercado')
+        self.pharmacy = Category.objects.create(user='1', name='Farmácia')
+
+    def get_totals(self):
+        return {
+            (row.category.name, row.month): (row.total, row.count)
+            for row in MonthlyCategoryTotal.objects.filter(count__gt=0).select_related('category')
+        }
+
+    def test_follows_saved_and_deleted_transactions(self):
+        march = datetime(2025, 3, 10, tzinfo=timezone.utc)
+        first = Transaction.objects.create(user='1', category=self.market, amount=10, date=march)
+        second = Transaction.objects.create(user='1', category=self.market, amount=20, date=march)
+        self.assertEqual(self.get_totals(), {('Mercado', date(2025, 3, 1)): (30, 2)})
+
+        second.amount, second.category, second.date = 25, self.pharmacy, datetime(2025, 4, 1, tzinfo=timezone.utc)
+        second.save()
+        first.description = "feira"
+        first.save(update_fields=['description'])
+        self.assertEqual(self.get_totals(), {
+            ('Mercado', date(2025, 3, 1)): (10, 1),
+            ('Farmácia', date(2025, 4, 1)): (25, 1),
+        })
+
+        first.delete()
+        self.pharmacy.delete()
+        self.assertEqual(self.get_totals(), {})
+        self.assertEqual(check_monthly_totals(), [])
+
+    def test_follows_bulk_writes(self):
+        generator = FinanceDataGenerator(months=3, seed=1, today=date(2025, 3, 31))
+        user = generator.create_users(1, start=0)[0]
+        categories = generator.create_categories([user])
+        insert_transactions(list(generator.generate_transactions(user, categories, 100)))
+        TransactionImporter('1', chunk_size=2).import_file(io.BytesIO(STATEMENT_CSV.encode()), 'extrato.csv')
+
+        created = CreateTransactionsTool().invoke({'user': '1', 'transactions': [
+            {'category': self.market.id, 'amount': 10, 'date': datetime(2025, 1, 31, 23, 59, tzinfo=timezone.utc)},
+            {'category': self.market.id, 'amount': 20},
+        ]})
+        self.assertTrue(created.startswith("2 created."))
+        ids = list(Transaction.objects.filter(category=self.market).values_list('id', flat=True))
+
+        UpdateTransactionsTool().invoke({'user_id': '1', 'transactions': [{'transaction': ids[0], 'amount': 15}]})
+        DeleteTransactionsTool().invoke({'user_id': '1', 'transaction_ids': ids[1:]})
+
+        self.assertTrue(MonthlyCategoryTotal.objects.filter(user=str(user.pk)).exists())
+        self.assertEqual(self.get_totals()[('Mercado', date(2025, 1, 1))], (15, 1))
+        self.assertEqual(check_monthly_totals(), [])
+
+    def test_summaries_match_the_transactions(self):
+        for day, amount in ((date(2025, 1, 5), 10), (date(2025, 1, 31), 20), (date(2025, 2, 15), 30), (date(2025, 3, 1), 40)):
+            Transaction.objects.create(user='1', category=self.market, amount=amount, date=datetime.combine(day, datetime.min.time(), timezone.utc))
+        Transaction.objects.create(user='1', category=self.pharmacy, amount=5, date=None)
+
+        tool = SummarizeTransactionsTool()
+        for start, end, period in (
+            (None, None, None),
+            (None, None, 'month'),
+            (datetime(2025, 1, 20), datetime(2025, 3, 1), None),
+            (datetime(2025, 1, 1), datetime(2025, 2, 28, 23, 59, 59, 999999), 'year'),
+            (datetime(2025, 1, 10), None, 'week'),
+        ):
+            with self.subTest(start=start, end=end, period=period):
+                expected = list(tool._get_summary_queryset('1', None, start, end, period))
+                summary = tool._get_summary('1', None, start, end, period)
+                # Undated rows come first or last depending on the database
+                self.assertCountEqual(
+                    [(row['category__name'], row.get('period'), row['total'], row['count']) for row in summary],
+                    [(row['category__name'], row.get('period'), row['total'], row['count']) for row in expected],
+                )
+
+        with self.assertNumQueries(1):
+            tool._get_summary('1', None, datetime(2025, 1, 1), datetime(2025, 2, 28, 23, 59, 59, 999999), None)
+
+    def test_checks_and_rebuilds_the_totals(self):
+        Transaction.objects.create(user='1', category=self.market, amount=10, date=datetime(2025, 3, 10, tzinfo=timezone.utc))
+        MonthlyCategoryTotal.objects.update(total=99)
+
+        mismatch, = check_monthly_totals('1')
+        self.assertEqual((mismatch.stored, mismatch.expected), ((99, 1), (10, 1)))
+        with self.assertRaises(CommandError):
+            call_command('check_monthly_totals', stdout=io.StringIO())
+
+        call_command('check_monthly_totals', fix=True, stdout=io.StringIO())
+        self.assertEqual(check_monthly_totals(), [])
+
+        MonthlyCategoryTotal.objects.all().delete()
+        call_command('rebuild_monthly_totals', user='1', stdout=io.StringIO())
+        self.assertEqual(self.get_totals(), {('Mercado', date(2025, 3, 1)): (10, 1)})
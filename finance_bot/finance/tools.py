@@ -1,10 +1,80 @@
 import logging
-from datetime import datetime
-from typing import Any, Type
+from collections import Counter
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Any, Literal, Type
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Avg, Count, DateField, F, Q, Sum, Value
+from django.db.models.functions import Trunc
 from django.utils import timezone
 from pydantic import BaseModel, Field, field_validator
 from langchain.tools import BaseTool
-from finance_bot.finance.models import Category, Transaction
+from langchain_core.runnables.config import run_in_executor
+from finance_bot.database import scoped_connection
+from finance_bot.finance.categories import (
+    CategoryIndex,
+    get_category_ids,
+    get_category_index,
+    get_category_index_key,
+    match_categories,
+)
+from finance_bot.finance.formatting import format_hidden_rows, format_table
+from finance_bot.finance.models import Category, MonthlyCategoryTotal, Transaction
+from finance_bot.finance.rollups import (
+    batched_changes,
+    get_month,
+    get_month_start,
+    get_next_month,
+    get_whole_months,
+    record_transactions,
+)
+
+
+def format_batch_result(columns: list[str], rows: list[tuple], counts: dict[str, int]) -> str:
+    """Formats the status of each item of a batch tool, with the totals
+    per status first."""
+
+    totals = ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+    output, shown = format_table(columns, rows)
+    if shown < len(rows):
+        output += "\n" + format_hidden_rows(len(rows) - shown)
+    return f"{totals or 'Nothing done'}.\n{output}"
+
+
+def get_aware_date(date: datetime) -> datetime:
+    """Returns `date` with a timezone, naive dates are in the current one."""
+
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+def get_transaction_date(date: datetime | None) -> datetime:
+    """Returns the date to store, now when there is none."""
+
+    if date is None:
+        return timezone.now()
+    return get_aware_date(date)
+
+
+class FinanceTool(BaseTool):
+    """Base of the agent tools.
+
+    Tools only implement the sync `_run`. Async runs call it on an executor
+    thread, since async ORM queries all wait on the one thread of
+    `sync_to_async` and would run the tools of a step one after another.
+    The connections the tools open are closed when they return.
+    """
+
+    def run(self, *args, **kwargs) -> Any:
+        with scoped_connection():
+            return super().run(*args, **kwargs)
+
+    def _run_scoped(self, *args, **kwargs) -> Any:
+        with scoped_connection():
+            return self._run(*args, **kwargs)
+
+    async def _arun(self, *args, **kwargs) -> Any:
+        return await run_in_executor(None, self._run_scoped, *args, **kwargs)
 
 
 class CreateCategoryToolInput(BaseModel):
@@ -13,7 +83,7 @@ class CreateCategoryToolInput(BaseModel):
     category_name: str = Field(description="Name of the category to create")
 
 
-class CreateCategoryTool(BaseTool):
+class CreateCategoryTool(FinanceTool):
     name: str = "CreateCategoryTool"
     description: str = "Creates a new category in the database."
     args_schema: Type[BaseModel] = CreateCategoryToolInput
@@ -26,24 +96,21 @@ class CreateCategoryTool(BaseTool):
         normalized = category_name.strip().upper()
         logger.debug(f"Creating category '{normalized}' for user '{user}'")
         
-        query = Category.objects.filter(normalized_name__icontains=normalized, user=user)
-        category = None
-        if query.exists():
-            category = query.first()
+        matches = match_categories(get_category_index(user), normalized, fuzzy=False)
+        if matches:
+            category_id, name = matches[0]['id'], matches[0]['name']
         else:
             category = Category.objects.create(user=user, name=category_name)
+            category_id, name = category.id, category.name
 
-        logger.debug(f"Category created: id={category.id}, name={category.name}")
+        logger.debug(f"Category created: id={category_id}, name={name}")
 
-        return (f"Category ID: {category.id}"
-                f"Category Name: {category.name}")
+        return (f"Category ID: {category_id}\n"
+                f"Category Name: {name}")
 
 
-class CreateTransactionToolInput(BaseModel):
-    """
-    Input model for the CreateTransactionTool.
-    """
-    user: str = Field(description="User that owns the transaction.")
+class CreateTransactionEntry(BaseModel):
+    """A transaction to create."""
     category: int = Field(description="ID of the category")
     amount: float = Field(description="Amount of the transaction.")
     date: datetime | None = Field(default=None, description="Date of the transaction in YYYY-MM-DD format. If none, then use today as date")
@@ -56,7 +123,14 @@ class CreateTransactionToolInput(BaseModel):
         return v
 
 
-class CreateTransactionTool(BaseTool):
+class CreateTransactionToolInput(CreateTransactionEntry):
+    """
+    Input model for the CreateTransactionTool.
+    """
+    user: str = Field(description="User that owns the transaction.")
+
+
+class CreateTransactionTool(FinanceTool):
     """
     Tool to create a transaction.
     """
@@ -76,8 +150,7 @@ class CreateTransactionTool(BaseTool):
 
         logger = logging.getLogger('CreateTransactionTool')
 
-        if date is None:
-            date = timezone.now()
+        date = get_transaction_date(date)
 
         logger.debug(f"Creating transaction"
                      f"User: {user}\n"
@@ -90,24 +163,237 @@ class CreateTransactionTool(BaseTool):
             user=user,
             category_id=category,
             amount=amount,
-            date=timezone.make_aware(date),
+            date=date,
             description=description
         )
 
         return f"Transaction created with ID {transaction.id}"
 
 
+class CategoryNotResolved(Exception):
+    """The category name of an expense matches none or several categories."""
+
+
+def find_expense_category(index: CategoryIndex, category_name: str, create: bool) -> dict[str, Any] | None:
+    """Returns the category an expense goes in, or None when it should be
+    created.
+
+    Without an exact match, a single partial match is used unless the
+    category is to be created.
+
+    Raises:
+        CategoryNotResolved: No category or more than one matches the name.
+    """
+
+    normalized = category_name.strip().upper()
+    if normalized in index:
+        return index[normalized]
+    if create:
+        return None
+
+    matches = match_categories(index, normalized, fuzzy=False)
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        names = ", ".join(match['name'] for match in matches)
+        raise CategoryNotResolved(f"Category '{category_name}' matches {names}. Ask the user which one.")
+
+    message = f"Category '{category_name}' was not found."
+    if suggestions := match_categories(index, normalized):
+        message += f" Similar categories: {', '.join(match['name'] for match in suggestions)}."
+    raise CategoryNotResolved(message + " Ask the user whether to create it.")
+
+
+class RecordExpenseEntry(BaseModel):
+    """A transaction to record by category name."""
+    category_name: str = Field(description="Name of the category of the transaction.")
+    amount: float = Field(description="Amount of the transaction.")
+    date: datetime | None = Field(default=None, description="Date of the transaction in YYYY-MM-DD format. If none, then use today as date")
+    description: str | None = Field(default=None, description="Optional description")
+    is_income: bool = Field(default=False, description="Whether a created category is of income.")
+
+    @field_validator("amount")
+    def amount_positive(cls, v):
+        if v <= 0:
+            raise ValueError("Amount must be positive.")
+        return v
+
+
+class RecordExpenseToolInput(RecordExpenseEntry):
+    """Input schema for RecordExpenseTool."""
+    user: str = Field(description="User that owns the transaction.")
+    create_category: bool = Field(default=False, description="Create the category if it doesn't exist, only after the user agrees.")
+
+
+class RecordExpenseTool(FinanceTool):
+    """
+    Tool to record a transaction by category name.
+    """
+    name: str = "RecordExpenseTool"
+    description: str = ("Records an expense or income in the category with the given name, "
+                        "creating the category if asked to.")
+    args_schema: Type[BaseModel] = RecordExpenseToolInput
+
+    def _run(
+        self,
+        user: str,
+        category_name: str,
+        amount: float,
+        date: datetime | None = None,
+        description: str | None = None,
+        is_income: bool = False,
+        create_category: bool = False,
+    ) -> str:
+        """Record a new transaction, creating its category if needed."""
+
+        try:
+            category = find_expense_category(get_category_index(user), category_name, create_category)
+        except CategoryNotResolved as error:
+            return str(error)
+
+        output = ""
+        with db_transaction.atomic():
+            if category is None:
+                created = Category.objects.create(user=user, name=category_name.strip(), is_income=is_income)
+                category = {'id': created.id, 'name': created.name}
+                output = f"Category {created.name} created with ID {created.id}\n"
+
+            record = Transaction.objects.create(
+                user=user,
+                category_id=category['id'],
+                amount=amount,
+                date=get_transaction_date(date),
+                description=description,
+            )
+
+        logging.getLogger('RecordExpenseTool').debug(
+            f"Recorded transaction {record.id} of user '{user}' in category {category['id']}")
+
+        return output + f"Transaction created with ID {record.id} in category {category['name']}"
+
+
+class RecordExpensesToolInput(BaseModel):
+    """Input schema for RecordExpensesTool."""
+    user: str = Field(description="User that owns the transactions.")
+    entries: list[RecordExpenseEntry] = Field(min_length=1, description="Transactions to record.")
+    create_categories: bool = Field(default=False, description="Create the categories that don't exist, only after the user agrees.")
+
+
+class RecordExpensesTool(FinanceTool):
+    """
+    Tool to record several transactions by category name at once.
+    """
+    name: str = "RecordExpensesTool"
+    description: str = ("Records several expenses or incomes at once by category name, "
+                        "creating the categories if asked to.")
+    args_schema: Type[BaseModel] = RecordExpensesToolInput
+
+    def _resolve_categories(
+        self,
+        index: CategoryIndex,
+        entries: list[RecordExpenseEntry],
+        create: bool,
+    ) -> tuple[dict[str, dict[str, Any]], dict[str, tuple[str, bool]], dict[str, str]]:
+        """Returns the found categories, the ones to create and the errors,
+        keyed by normalized category name."""
+
+        categories, missing, errors = {}, {}, {}
+        for entry in entries:
+            key = entry.category_name.strip().upper()
+            if key in categories or key in missing or key in errors:
+                continue
+            try:
+                category = find_expense_category(index, entry.category_name, create)
+            except CategoryNotResolved as error:
+                errors[key] = str(error)
+                continue
+            if category is None:
+                missing[key] = (entry.category_name.strip(), entry.is_income)
+            else:
+                categories[key] = category
+
+        return categories, missing, errors
+
+    def _run(self, user: str, entries: list[RecordExpenseEntry], create_categories: bool = False) -> str:
+        """Record new transactions, creating their categories if needed."""
+
+        categories, missing, errors = self._resolve_categories(get_category_index(user), entries, create_categories)
+
+        with db_transaction.atomic():
+            if missing:
+                created = Category.objects.bulk_create([
+                    Category(user=user, name=name, normalized_name=key, is_income=is_income)
+                    for key, (name, is_income) in missing.items()
+                ])
+                categories.update({category.normalized_name: {'id': category.id, 'name': category.name}
+                                   for category in created})
+
+                # bulk_create doesn't send post_save, which invalidates the index
+                index_key = get_category_index_key(user)
+                db_transaction.on_commit(lambda: cache.delete(index_key))
+
+            recorded = [entry for entry in entries if entry.category_name.strip().upper() in categories]
+            created_records = Transaction.objects.bulk_create([
+                Transaction(
+                    user=user,
+                    category_id=categories[entry.category_name.strip().upper()]['id'],
+                    amount=entry.amount,
+                    date=get_transaction_date(entry.date),
+                    description=entry.description,
+                )
+                for entry in recorded
+            ])
+            record_transactions(created_records)
+            records = iter(created_records)
+
+        logging.getLogger('RecordExpensesTool').debug(
+            f"Recorded {len(recorded)} of {len(entries)} transactions of user '{user}', "
+            f"{len(missing)} categories created")
+
+        rows = []
+        for position, entry in enumerate(entries, 1):
+            key = entry.category_name.strip().upper()
+            if key in categories:
+                record = next(records)
+                rows.append((position, "created", record.id, categories[key]['name'], record.amount, record.date))
+            else:
+                rows.append((position, "not recorded", None, entry.category_name, entry.amount, entry.date))
+
+        output = format_batch_result(
+            ["entry", "status", "id", "category", "amount", "date"],
+            rows,
+            Counter(row[1] for row in rows),
+        )
+        if missing:
+            output += f"\nCategories created: {', '.join(name for name, _ in missing.values())}."
+        for error in errors.values():
+            output += "\n" + error
+
+        return output
+
+
 class SearchCategoryToolByNameInput(BaseModel):
     """Input schema for SearchCategoryByTool."""
     category_name: str = Field(description="Name of the category to search")
     user: str = Field(description="User who owns the category")
 
 
-class SearchCategoryByNameTool(BaseTool):
+class SearchCategoryByNameTool(FinanceTool):
     name: str = "SearchCategoryByNameTool"
     description: str = "Searches for categories in the database."
     args_schema: Type[BaseModel] = SearchCategoryToolByNameInput
 
+    def _format_matches(self, category_name: str, matches: list[dict[str, Any]]) -> str:
+        if not matches:
+            return f"No categories found with the name '{category_name}'."
+
+        category = matches[0]
+        output = f"Category ID: {category['id']}\nCategory Name: {category['name']}\n"
+        if len(matches) > 1:
+            output += f"Other matches: {', '.join(match['name'] for match in matches[1:])}\n"
+
+        return output
+
     def _run(self, category_name: str, user: str) -> str:
         """Search for a category by name."""
 
@@ -115,12 +401,7 @@ class SearchCategoryByNameTool(BaseTool):
 
         logger.debug(f"Searching for category '{category_name}' for user '{user}'")
 
-        categories = Category.objects.filter(normalized_name__icontains=category_name.upper(), user=user)
-        if categories.exists():
-            category = categories.first()
-            return f"Category ID: {category.id}\nCategory Name: {category.name}\n"
-        else:
-            return f"No categories found with the name '{category_name}'."
+        return self._format_matches(category_name, match_categories(get_category_index(user), category_name))
 
 
 class SearchUserCategoriesToolInput(BaseModel):
@@ -128,24 +409,29 @@ class SearchUserCategoriesToolInput(BaseModel):
     user: str = Field(description="Name of the user that owns the categories.")
 
 
-class SearchUserCategoriesTool(BaseTool):
+class SearchUserCategoriesTool(FinanceTool):
     """Searches the categories from a user."""
     name: str = "SearchUserCategoriesTool"
     description: str = "Searches the categories from a user."
     args_schema: Type[BaseModel] = SearchUserCategoriesToolInput
 
-    def _run(self, user: str) -> str:
-        categories = Category.objects.filter(user=user)
-        output = ""
+    def _format_categories(self, index: CategoryIndex) -> str:
+        if not index:
+            return "No categories were found."
 
-        for category in categories:
-            output += f"Category ID: {category.id}\n"
-            output += f"Category Name: {category.name}\n"
-            output += f"Category Is Income: {category.is_income}\n"
-            output += f"Category Amount Limit: {category.limit}\n"
+        categories = sorted(index.values(), key=lambda category: category['id'])
+        output, shown = format_table(
+            ["id", "name", "is_income", "limit"],
+            [(category['id'], category['name'], category['is_income'], category['limit']) for category in categories],
+        )
+        if shown < len(categories):
+            output += "\n" + format_hidden_rows(len(categories) - shown)
 
         return output
 
+    def _run(self, user: str) -> str:
+        return self._format_categories(get_category_index(user))
+
 
 class SearchTransactionsToolInput(BaseModel):
     """Search for all users transactions."""
@@ -154,15 +440,78 @@ class SearchTransactionsToolInput(BaseModel):
     start_date: datetime | None = Field(default=None, description="Start date to search for transactions (optional).")
     end_date: datetime | None = Field(default=None, description="End date to search for transactions (optional).")
     limit: int | None = Field(default=None, description="Max number of transactions to return, newest first (optional)",)
+    cursor: str | None = Field(default=None, description="Cursor returned by a previous search to get the next page (optional).")
 
 
-class SearchTransactionsTool(BaseTool):
+class SearchTransactionsTool(FinanceTool):
     """Searches the transactions from a user."""
     name: str = "SearchTransactionsTool"
     description: str = "Searches the transactions from a user."
     args_schema: Type[BaseModel] = SearchTransactionsToolInput
 
-    def _run(self, user_id: str, category: str | None = None, start_date: datetime | None = None, end_date: datetime | None = None, limit: int | None = None) -> str:
+    default_limit: int = 50
+
+    def _encode_cursor(self, transaction: Transaction) -> str:
+        date = transaction.date.isoformat() if transaction.date else "none"
+        return f"{date},{transaction.id}"
+
+    def _decode_cursor(self, cursor: str) -> Q:
+        """Returns the filter for the rows that come after the cursor."""
+
+        date, transaction_id = cursor.rsplit(",", 1)
+        transaction_id = int(transaction_id)
+
+        if date == "none":
+            return Q(date__isnull=True, id__lt=transaction_id)
+
+        date = get_aware_date(datetime.fromisoformat(date))
+        return Q(date__lt=date) | Q(date=date, id__lt=transaction_id) | Q(date__isnull=True)
+
+    def _get_queryset(self, user_id: str, category_ids: list[int] | None, start_date: datetime | None, end_date: datetime | None, limit: int | None, after: Q | None):
+        filters: dict[str, Any] = {"user": user_id}
+        if start_date:
+            filters['date__gte'] = get_aware_date(start_date)
+
+        if end_date:
+            filters['date__lte'] = get_aware_date(end_date)
+
+        if category_ids is not None:
+            filters['category_id__in'] = category_ids
+
+        logging.getLogger('SearchTransactionsTool').debug(
+            f"Searching transactions for user '{user_id}' with filters: {filters}")
+
+        qs = Transaction.objects.filter(**filters)
+        if after is not None:
+            qs = qs.filter(after)
+
+        # One extra row tells whether there is a next page
+        return (qs.select_related('category')
+                .only('id', 'amount', 'date', 'description', 'category__name')
+                .order_by(F('date').desc(nulls_last=True), '-id')[:(limit or self.default_limit) + 1])
+
+    def _format_transactions(self, transactions: list[Transaction], limit: int | None) -> str:
+        if not transactions:
+            return "Nenhuma transação encontrada."
+
+        page_size = limit or self.default_limit
+        page = transactions[:page_size]
+
+        output, shown = format_table(
+            ["id", "amount", "category", "date", "description"],
+            [(transaction.id, transaction.amount, transaction.category.name, transaction.date, transaction.description)
+             for transaction in page],
+        )
+
+        if shown < len(page):
+            output += "\n" + format_hidden_rows(len(page) - shown)
+
+        if shown and (shown < len(page) or len(transactions) > page_size):
+            output += f"\nMore transactions available, search again with cursor '{self._encode_cursor(page[shown - 1])}'."
+
+        return output
+
+    def _run(self, user_id: str, category: str | None = None, start_date: datetime | None = None, end_date: datetime | None = None, limit: int | None = None, cursor: str | None = None) -> str:
         """Search for transactions by user and date range."""
 
         logger = logging.getLogger('SearchTransactionsTool')
@@ -171,33 +520,209 @@ class SearchTransactionsTool(BaseTool):
             logger.error("User can't be empty or null")
             return "No transactions were found."
 
+        category_ids = get_category_ids(user_id, category) if category else None
+        if category_ids == []:
+            return "Nenhuma transação encontrada."
+
+        after = None
+        if cursor:
+            try:
+                after = self._decode_cursor(cursor)
+            except ValueError:
+                return "Invalid cursor."
+
+        qs = self._get_queryset(user_id, category_ids, start_date, end_date, limit, after)
+
+        return self._format_transactions(list(qs), limit)
+
+
+SUMMARY_PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-%m-%d",
+    "month": "%Y-%m",
+    "year": "%Y",
+}
+
+
+class SummarizeTransactionsToolInput(BaseModel):
+    """Parameters to summarize the user transactions."""
+    user_id: str = Field(description="ID of the user that owns the transactions.")
+    category: str | None = Field(default=None, description="Name of the category to summarize (optional).")
+    start_date: datetime | None = Field(default=None, description="Start date of the summary (optional).")
+    end_date: datetime | None = Field(default=None, description="End date of the summary (optional).")
+    period: Literal["day", "week", "month", "year"] | None = Field(default=None, description="Also group the totals by this period (optional).")
+
+
+class SummarizeTransactionsTool(FinanceTool):
+    """Summarizes the transactions from a user."""
+    name: str = "SummarizeTransactionsTool"
+    description: str = ("Sums the transactions from a user per category and, optionally, per period. "
+                        "Returns the total, count and average of each group, and how much of the monthly limit its category used this month. "
+                        "Use it to answer how much was spent or received instead of adding up transactions.")
+    args_schema: Type[BaseModel] = SummarizeTransactionsToolInput
+
+    def _get_summary_queryset(self, user_id: str, category_ids: list[int] | None, start_date: datetime | None, end_date: datetime | None, period: str | None):
         filters: dict[str, Any] = {"user": user_id}
         if start_date:
-            filters['date__gte'] = timezone.make_aware(start_date)
-        
+            filters['date__gte'] = get_aware_date(start_date)
+
         if end_date:
-            filters['date__lte'] = timezone.make_aware(end_date)
+            filters['date__lte'] = get_aware_date(end_date)
+
+        if category_ids is not None:
+            filters['category_id__in'] = category_ids
+
+        qs = Transaction.objects.filter(**filters)
+        group_by = ['category__name', 'category__is_income', 'category__limit']
+        order_by = ['-total']
+
+        if period:
+            qs = qs.annotate(period=Trunc('date', period))
+            group_by.append('period')
+            order_by.insert(0, 'period')
+
+        return (qs.values(*group_by)
+                .annotate(total=Sum('amount'), count=Count('id'), average=Avg('amount'))
+                .order_by(*order_by))
+
+    def _get_rollup_rows(self, user_id: str, category_ids: list[int] | None, first: date | None, stop: date | None, period: str | None):
+        filters: dict[str, Any] = {"user": user_id, "count__gt": 0}
+        if first:
+            filters['month__gte'] = first
+
+        if stop:
+            filters['month__lt'] = stop
+
+        if category_ids is not None:
+            filters['category_id__in'] = category_ids
+
+        group_by = ['category__name', 'category__is_income', 'category__limit']
+        if period:
+            group_by.append('month')
+
+        rows = (MonthlyCategoryTotal.objects.filter(**filters)
+                .values(*group_by)
+                .annotate(total=Sum('total'), count=Sum('count'))
+                .order_by())
+
+        if not first and not stop:
+            # The monthly totals leave out transactions without a date, which
+            # are summed in the same query
+            filters = {"user": user_id, "date__isnull": True}
+            if category_ids is not None:
+                filters['category_id__in'] = category_ids
+
+            undated = Transaction.objects.filter(**filters)
+            if period:
+                undated = undated.annotate(month=Value(None, output_field=DateField()))
+
+            rows = rows.union(
+                undated.values(*group_by).annotate(total=Sum('amount'), count=Count('id')).order_by(),
+                all=True,
+            )
+
+        for row in rows:
+            if period:
+                month = row.pop('month')
+                row['period'] = month and get_month_start(month if period == 'month' else month.replace(month=1))
+            yield row
+
+    def _get_summary(self, user_id: str, category_ids: list[int] | None, start_date: datetime | None, end_date: datetime | None, period: str | None) -> list[dict[str, Any]]:
+        """Sums the same rows as `_get_summary_queryset`, reading the whole
+        months between the dates from the monthly totals and only the days
+        around them from the transactions."""
+
+        start_date = get_aware_date(start_date) if start_date else None
+        end_date = get_aware_date(end_date) if end_date else None
+
+        months = get_whole_months(start_date, end_date) if period not in ('day', 'week') else None
+        if months is None:
+            return list(self._get_summary_queryset(user_id, category_ids, start_date, end_date, period))
+
+        first, stop = months
+        parts = [self._get_rollup_rows(user_id, category_ids, first, stop, period)]
+        if first and start_date < get_month_start(first):
+            parts.append(self._get_summary_queryset(user_id, category_ids, start_date, get_month_start(first) - timedelta(microseconds=1), period))
+        if stop and end_date >= get_month_start(stop):
+            parts.append(self._get_summary_queryset(user_id, category_ids, get_month_start(stop), end_date, period))
+
+        summary: dict[tuple, dict[str, Any]] = {}
+        for row in chain.from_iterable(parts):
+            key = (row['category__name'], row['category__is_income'], row['category__limit'], row.get('period'))
+            group = summary.setdefault(key, {
+                'category__name': key[0],
+                'category__is_income': key[1],
+                'category__limit': key[2],
+                'period': key[3],
+                'total': 0.0,
+                'count': 0,
+            })
+            group['total'] += row['total'] or 0
+            group['count'] += row['count']
+
+        rows = list(summary.values())
+        for row in rows:
+            row['average'] = row['total'] / row['count'] if row['count'] else None
+
+        return sorted(rows, key=lambda row: (row['period'] is None, row['period'] or 0, -row['total']))
+
+    def _get_month_totals(self, user_id: str, category_ids: list[int] | None) -> dict[str, float]:
+        """Sums the current month by category, since the limits are monthly
+        whatever dates the summary covers."""
+
+        month = get_month(timezone.now())
+        rows = self._get_summary(
+            user_id,
+            category_ids,
+            get_month_start(month),
+            get_month_start(get_next_month(month)) - timedelta(microseconds=1),
+            None,
+        )
+        return {row['category__name']: row['total'] for row in rows if row['category__limit']}
 
-        if category:
-            filters['category__normalized_name__icontains'] = category.upper()
+    def _format_summary(self, rows: list[dict[str, Any]], period: str | None, month_totals: dict[str, float]) -> str:
+        if not rows:
+            return "Nenhuma transação encontrada."
 
-        logger.debug(f"Searching transactions for user '{user_id}' with filters: {filters}")
+        summary = []
+        for row in rows:
+            row_period = row['period'].strftime(SUMMARY_PERIOD_FORMATS[period]) if period and row['period'] else None
+            limit_usage = None
+            if row['category__limit']:
+                limit_usage = f"{month_totals.get(row['category__name'], 0.0) / row['category__limit']:.0%}"
+            summary.append((
+                row['category__name'],
+                "income" if row['category__is_income'] else "expense",
+                row_period,
+                row['total'] or 0.0,
+                row['count'],
+                row['average'] or 0.0,
+                limit_usage,
+            ))
+
+        output, shown = format_table(
+            ["category", "type", "period", "total", "count", "average", "month_limit_usage"],
+            summary,
+        )
+        if shown < len(summary):
+            output += "\n" + format_hidden_rows(len(summary) - shown)
 
-        qs = Transaction.objects.filter(**filters).order_by("-date")
-        if limit:
-            qs = qs[:limit]
+        return output
 
-        if not qs:
+    def _run(self, user_id: str, category: str | None = None, start_date: datetime | None = None, end_date: datetime | None = None, period: str | None = None) -> str:
+        """Summarize transactions by category and period."""
+
+        logger = logging.getLogger('SummarizeTransactionsTool')
+        logger.debug(f"Summarizing transactions for user '{user_id}' by period '{period}'")
+
+        category_ids = get_category_ids(user_id, category) if category else None
+        if category_ids == []:
             return "Nenhuma transação encontrada."
 
-        transactions = Transaction.objects.filter(**filters) 
+        rows = self._get_summary(user_id, category_ids, start_date, end_date, period)
+        month_totals = self._get_month_totals(user_id, category_ids) if any(row['category__limit'] for row in rows) else {}
 
-        return "\n---\n".join([f"Transaction ID: {transaction.id}\n"
-                              f"Transaction Amount: {transaction.amount}\n"
-                              f"Category: {transaction.category.name}\n"
-                              f"Transaction Date: {transaction.date}\n"
-                              f"Transaction Description: {transaction.description}\n"
-                              for transaction in transactions])
+        return self._format_summary(rows, period, month_totals)
 
 
 class UpdateTransactionToolInput(BaseModel):
@@ -207,7 +732,7 @@ class UpdateTransactionToolInput(BaseModel):
     amount: int = Field(description="New amount of the transaction.")
 
 
-class UpdateTransactionTool(BaseTool):
+class UpdateTransactionTool(FinanceTool):
     """Updates a transaction."""
     name: str = "UpdateTransactionTool"
     description: str = "Updates a transaction."
@@ -231,7 +756,7 @@ class DeleteTransactionToolInput(BaseModel):
     transaction_id: str = Field(description="ID of the transaction to delete.")
 
 
-class DeleteTransactionTool(BaseTool):
+class DeleteTransactionTool(FinanceTool):
     """Deletes a transaction. """
     name: str = "DeleteTransactionTool"
     description: str = "Deletes a transaction"
@@ -245,28 +770,140 @@ class DeleteTransactionTool(BaseTool):
         
         transaction.delete()
 
-        return f"Transaction {transaction.id} was deleted successfuly."
+        return f"Transaction {transaction_id} was deleted successfuly."
     
 
+class CreateTransactionsToolInput(BaseModel):
+    """Parameters to create several transactions."""
+    user: str = Field(description="User that owns the transactions.")
+    transactions: list[CreateTransactionEntry] = Field(min_length=1, description="Transactions to create.")
+
+
+class CreateTransactionsTool(FinanceTool):
+    """Creates several transactions at once."""
+    name: str = "CreateTransactionsTool"
+    description: str = "Creates several transactions at once."
+    args_schema: Type[BaseModel] = CreateTransactionsToolInput
+
+    def _run(self, user: str, transactions: list[CreateTransactionEntry]) -> str:
+        with db_transaction.atomic():
+            category_ids = set(Category.objects.filter(
+                user=user, id__in={entry.category for entry in transactions},
+            ).values_list('id', flat=True))
+
+            records = Transaction.objects.bulk_create([
+                Transaction(
+                    user=user,
+                    category_id=entry.category,
+                    amount=entry.amount,
+                    date=get_transaction_date(entry.date),
+                    description=entry.description,
+                )
+                for entry in transactions
+                if entry.category in category_ids
+            ])
+            record_transactions(records)
+
+        created = iter(records)
+
+        rows = [
+            (position, "created", next(created).id) if entry.category in category_ids
+            else (position, "category not found", None)
+            for position, entry in enumerate(transactions, 1)
+        ]
+        counts = Counter(status for _, status, _ in rows)
+        logging.getLogger('CreateTransactionsTool').debug(
+            f"Created {counts['created']} of {len(transactions)} transactions for user '{user}'")
+
+        return format_batch_result(["entry", "status", "id"], rows, counts)
+
+
+class TransactionAmountUpdate(BaseModel):
+    """New amount of a transaction."""
+    transaction: int = Field(description="ID of the transaction to update.")
+    amount: float = Field(description="New amount of the transaction.")
+
+
+class UpdateTransactionsToolInput(BaseModel):
+    """Parameters to update several transactions."""
+    user_id: str = Field(description="ID of the user that owns the transactions.")
+    transactions: list[TransactionAmountUpdate] = Field(min_length=1, description="Transactions to update.")
+
+
+class UpdateTransactionsTool(FinanceTool):
+    """Updates the amount of several transactions at once."""
+    name: str = "UpdateTransactionsTool"
+    description: str = "Updates the amount of several transactions at once."
+    args_schema: Type[BaseModel] = UpdateTransactionsToolInput
+
+    def _run(self, user_id: str, transactions: list[TransactionAmountUpdate]) -> str:
+        amounts = {update.transaction: update.amount for update in transactions}
+
+        with db_transaction.atomic(), batched_changes():
+            found = list(Transaction.objects.filter(user=user_id, id__in=amounts).only('id', 'user', 'category', 'amount', 'date'))
+            record_transactions(found, sign=-1)
+            for record in found:
+                record.amount = amounts[record.id]
+            Transaction.objects.bulk_update(found, ['amount'])
+            record_transactions(found)
+
+        found_ids = {record.id for record in found}
+        rows = [
+            (update.transaction, "updated" if update.transaction in found_ids else "not found")
+            for update in transactions
+        ]
+        return format_batch_result(["id", "status"], rows, Counter(status for _, status in rows))
+
+
+class DeleteTransactionsToolInput(BaseModel):
+    """Parameters to delete several transactions."""
+    user_id: str = Field(description="ID of the user deleting the transactions.")
+    transaction_ids: list[int] = Field(min_length=1, description="IDs of the transactions to delete.")
+
+
+class DeleteTransactionsTool(FinanceTool):
+    """Deletes several transactions at once."""
+    name: str = "DeleteTransactionsTool"
+    description: str = "Deletes several transactions at once."
+    args_schema: Type[BaseModel] = DeleteTransactionsToolInput
+
+    def _run(self, user_id: str, transaction_ids: list[int]) -> str:
+        transactions = Transaction.objects.filter(user=user_id, id__in=transaction_ids)
+
+        with db_transaction.atomic(), batched_changes():
+            found_ids = set(transactions.select_for_update().values_list('id', flat=True))
+            transactions.delete()
+
+        rows = [
+            (transaction_id, "deleted" if transaction_id in found_ids else "not found")
+            for transaction_id in dict.fromkeys(transaction_ids)
+        ]
+        return format_batch_result(["id", "status"], rows, Counter(status for _, status in rows))
+
+
 class DeleteCategoryToolInput(BaseModel):
     """Parameters to delete a category. """
     user_id: str = Field(description="ID of the user deleting the category.")
     category_name: str = Field(description="Name of the category to delete.")
 
 
-class DeleteCategoryTool(BaseTool):
+class DeleteCategoryTool(FinanceTool):
     """Deletes a category. """
     name: str = "DeleteCategoryTool"
     description: str = "Deletes a category. "
     args_schema: Type[BaseModel] = DeleteCategoryToolInput
 
     def _run(self, user_id: str, category_name: str) -> str:
-        category = Category.objects.filter(normalized_name=category_name.upper(), user=user_id).first()
+        category = None
+        if entry := get_category_index(user_id).get(category_name.strip().upper()):
+            category = Category.objects.filter(pk=entry['id'], user=user_id).first()
 
         if category is None:
             return "Category was not found."
-        
-        category.delete()
+
+        # Its transactions are deleted with it, each sending a signal
+        with db_transaction.atomic(), batched_changes():
+            category.delete()
 
         return f"Category {category.name} was deleted successfuly."
     
@@ -278,14 +915,16 @@ class UpdateCategoryToolInput(BaseModel):
     new_name: str = Field(description="New category name.")
 
 
-class UpdateCategoryTool(BaseTool):
+class UpdateCategoryTool(FinanceTool):
     """Updates a category. """
     name: str = "UpdateCategoryTool"
     description: str = "Updates a category."
     args_schema: Type[BaseModel] = UpdateCategoryToolInput
 
     def _run(self, user_id: str, category_name: str, new_name: str) -> str:
-        category = Category.objects.filter(normalized_name=category_name.upper(), user=user_id).first()
+        category = None
+        if entry := get_category_index(user_id).get(category_name.strip().upper()):
+            category = Category.objects.filter(pk=entry['id'], user=user_id).first()
 
         if category is None:
             return "Category was not found."
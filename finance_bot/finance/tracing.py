@@ -0,0 +1,241 @@
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict
+from uuid import UUID
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from langchain_core.callbacks import BaseCallbackHandler
+
+from finance_bot.logging import log_fields
+from finance_bot.metrics import Counter, Histogram, registry
+
+
+logger = logging.getLogger('AgentTrace')
+
+SPAN_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+turn_seconds = registry.register(Histogram(
+    'agent_turn_seconds', 'Duration of an agent turn.', ['entrypoint'], buckets=SPAN_BUCKETS,
+))
+span_seconds = registry.register(Histogram(
+    'agent_span_seconds', 'Duration of the model calls, tool runs and history trims of a turn.',
+    ['kind', 'name'], buckets=SPAN_BUCKETS,
+))
+turn_queries = registry.register(Histogram(
+    'agent_turn_queries', 'Database queries made during an agent turn.', ['entrypoint'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200),
+))
+query_seconds = registry.register(Counter(
+    'agent_query_seconds_total', 'Time spent on database queries during agent turns.',
+))
+tokens = registry.register(Counter(
+    'agent_tokens_total', 'Tokens used by the model calls.', ['type'],
+))
+retries = registry.register(Counter(
+    'agent_retries_total', 'Retried calls during agent turns.', ['name'],
+))
+errors = registry.register(Counter(
+    'agent_errors_total', 'Failed model calls and tool runs.', ['kind', 'name'],
+))
+
+
+@dataclass
+class TurnTrace:
+    """
+    What happened during a single agent turn.
+    """
+
+    entrypoint: str
+    user_id: str
+    started: float = field(default_factory=time.perf_counter)
+    durations: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+    counts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    queries: int = 0
+    query_seconds: float = 0
+    retries: int = 0
+
+    def add_span(self, kind: str, name: str, duration: float):
+        self.durations[kind] += duration
+        self.counts[kind] += 1
+        span_seconds.observe(duration, kind=kind, name=name)
+
+    def finish(self):
+        duration = time.perf_counter() - self.started
+
+        turn_seconds.observe(duration, entrypoint=self.entrypoint)
+        turn_queries.observe(self.queries, entrypoint=self.entrypoint)
+        query_seconds.inc(self.query_seconds)
+        tokens.inc(self.input_tokens, type='input')
+        tokens.inc(self.output_tokens, type='output')
+        tokens.inc(self.cached_tokens, type='cached')
+
+        logger.info(log_fields(
+            "agent_turn",
+            entrypoint=self.entrypoint,
+            user_id=self.user_id,
+            duration_ms=duration * 1000,
+            llm_ms=self.durations['llm'] * 1000,
+            llm_calls=self.counts['llm'],
+            tool_ms=self.durations['tool'] * 1000,
+            tool_calls=self.counts['tool'],
+            trim_ms=self.durations['trim'] * 1000,
+            queries=self.queries,
+            query_ms=self.query_seconds * 1000,
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            cached_tokens=self.cached_tokens,
+            retries=self.retries,
+        ))
+
+
+current_turn: contextvars.ContextVar[TurnTrace | None] = contextvars.ContextVar('current_turn', default=None)
+
+
+@contextlib.contextmanager
+def trace_turn(entrypoint: str, user_id: str):
+    """Traces the agent turn run inside the block."""
+
+    trace = TurnTrace(entrypoint, user_id)
+    token = current_turn.set(trace)
+    try:
+        yield trace
+    finally:
+        current_turn.reset(token)
+        trace.finish()
+
+
+@contextlib.contextmanager
+def trace_span(kind: str, name: str):
+    """Adds the time spent in the block to the current turn, if any."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if (trace := current_turn.get()) is not None:
+            trace.add_span(kind, name, time.perf_counter() - started)
+
+
+class QueryCount:
+    """
+    Number of queries made inside `count_queries`.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.queries += 1
+
+
+current_query_count: contextvars.ContextVar[QueryCount | None] = contextvars.ContextVar('current_query_count', default=None)
+
+
+@contextlib.contextmanager
+def count_queries():
+    """Counts the queries made inside the block on every connection,
+    including the ones of the tool and checkpoint threads, which run with a
+    copy of the block context."""
+
+    count = QueryCount()
+    token = current_query_count.set(count)
+    try:
+        yield count
+    finally:
+        current_query_count.reset(token)
+
+
+def trace_query(execute, sql, params, many, context):
+    trace = current_turn.get()
+    count = current_query_count.get()
+    if trace is None and count is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if count is not None:
+            count.add()
+        if trace is not None:
+            trace.queries += 1
+            trace.query_seconds += time.perf_counter() - started
+
+
+def install_query_tracing(connection):
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+@receiver(connection_created)
+def trace_new_connection(sender, connection, **kwargs):
+    # Tools and checkpoints run on other threads, each with its connection
+    install_query_tracing(connection)
+
+
+class TurnTraceHandler(BaseCallbackHandler):
+    """
+    Records the model calls, tool runs and retries of the agent on the
+    current turn.
+    """
+
+    # Runs in the thread of the traced call, so the turn is still current
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, tuple[str, str, float]] = {}
+
+    def _start(self, run_id: UUID, kind: str, name: str):
+        self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id: UUID, error: bool = False):
+        if (started := self._started.pop(run_id, None)) is None:
+            return
+        kind, name, started_at = started
+        if (trace := current_turn.get()) is not None:
+            trace.add_span(kind, name, time.perf_counter() - started_at)
+        if error:
+            errors.inc(kind=kind, name=name)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, 'llm', (kwargs.get('metadata') or {}).get('ls_model_name', 'chat_model'))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+        if (trace := current_turn.get()) is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None) or {}
+                trace.input_tokens += usage.get('input_tokens', 0)
+                trace.output_tokens += usage.get('output_tokens', 0)
+                trace.cached_tokens += usage.get('input_token_details', {}).get('cache_read', 0)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs: Any):
+        self._start(run_id, 'tool', (serialized or {}).get('name', 'tool'))
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, error=True)
+
+    def on_retry(self, retry_state, *, run_id: UUID, **kwargs: Any):
+        retries.inc(name=kwargs.get('name', 'runnable'))
+        if (trace := current_turn.get()) is not None:
+            trace.retries += 1
+
@@ -10,5 +10,6 @@ router.register(r'categories', views.CategoryViewSet)
 router.register(r'transactions', views.TransactionViewSet)
 
 urlpatterns = [
+    path('transactions/import', views.TransactionImportView.as_view(), name='transaction-import'),
     path('', include(router.urls)),
 ]
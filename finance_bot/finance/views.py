@@ -1,6 +1,12 @@
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 from drf_spectacular.utils import extend_schema
 from finance_bot.finance import models, serializers
+from finance_bot.finance.imports import StatementError, TransactionImporter
 
 
 @extend_schema(tags=['Categories'])
@@ -13,3 +19,27 @@ class CategoryViewSet(ModelViewSet):
 class TransactionViewSet(ModelViewSet):
     queryset = models.Transaction.objects.all()
     serializer_class = serializers.TransactionSerializer
+
+
+@extend_schema(
+    tags=['Transactions'],
+    request=serializers.TransactionImportSerializer,
+    responses=serializers.ImportResultSerializer,
+)
+class TransactionImportView(APIView):
+    """Imports the transactions of a CSV or OFX bank statement."""
+
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        serializer = serializers.TransactionImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        file = serializer.validated_data['file']
+        importer = TransactionImporter(serializer.validated_data['user'].pk)
+        try:
+            result = importer.import_file(file, file.name, serializer.validated_data.get('format'))
+        except StatementError as e:
+            raise ValidationError({'file': [str(e)]})
+
+        return Response(serializers.ImportResultSerializer(result.as_dict()).data, status=status.HTTP_201_CREATED)
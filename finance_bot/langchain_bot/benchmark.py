@@ -0,0 +1,434 @@
+import json
+import re
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.utils import timezone
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from telebot import types
+
+from finance_bot.finance.agent import USER_CONTEXT_TEMPLATE, FinanceAgent, chat_model_factories
+from finance_bot.finance.models import Category, Transaction
+from finance_bot.finance.seed import FinanceDataGenerator, chunked, insert_transactions
+from finance_bot.finance.tracing import count_queries, install_query_tracing
+from finance_bot.langchain_bot.models import AgentSettings, AgentSettingsToUser
+from finance_bot.telegram_bot.models import TelegramUserSettings
+from finance_bot.users.models import User
+
+
+SCRIPTED_MODEL = "scripted"
+
+USER_CONTEXT_PATTERN = re.compile(
+    re.escape(USER_CONTEXT_TEMPLATE)
+    .replace(r"\{user_name\}", "(?P<user_name>.*)")
+    .replace(r"\{user_id\}", "(?P<user_id>.*)")
+    .replace(r"\{today\}", "(?P<today>.*)")
+)
+
+
+@dataclass
+class ScriptedTurn:
+    """
+    What the scripted model does for a user message.
+
+    String tool arguments are formatted with the user context message, so
+    "{user_id}" becomes the id of the user talking to the agent.
+    """
+
+    message: str
+    reply: str
+    tool_calls: List[tuple[str, Dict[str, Any]]] = field(default_factory=list)
+
+
+BENCHMARK_TURNS = [
+    ScriptedTurn("oi", "Olá! Como posso ajudar com suas finanças?"),
+    ScriptedTurn(
+        "quais são minhas categorias?",
+        "Estas são as suas categorias.",
+        [("SearchUserCategoriesTool", {"user": "{user_id}"})],
+    ),
+    ScriptedTurn(
+        "quanto gastei por mês?",
+        "Este é o total dos seus gastos por mês.",
+        [("SummarizeTransactionsTool", {"user_id": "{user_id}", "period": "month"})],
+    ),
+    ScriptedTurn(
+        "últimas compras no mercado",
+        "Estas são as suas últimas compras no mercado.",
+        [("SearchTransactionsTool", {"user_id": "{user_id}", "category": "mercado", "limit": 10})],
+    ),
+    ScriptedTurn(
+        "quanto gastei com mercado, transporte e lazer?",
+        "Estes são os seus gastos com mercado, transporte e lazer.",
+        [
+            ("SummarizeTransactionsTool", {"user_id": "{user_id}", "category": category, "period": "month"})
+            for category in ("mercado", "transporte", "lazer")
+        ],
+    ),
+    ScriptedTurn(
+        "gastei 50 no mercado, 12 de uber e 30 na farmácia",
+        "Prontinho! Registrei as três despesas.",
+        [("RecordExpensesTool", {
+            "user": "{user_id}",
+            "entries": [
+                {"category_name": "mercado", "amount": 50.0},
+                {"category_name": "transporte", "amount": 12.0, "description": "Uber"},
+                {"category_name": "saúde", "amount": 30.0, "description": "Farmácia"},
+            ],
+        })],
+    ),
+]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic chat model answering from a list of scripted turns.
+
+    The tool calls of a turn are made on the first call after the user
+    message, and the reply is sent once their results are back. Every call
+    reports `input_tokens` so the usage metrics have something to count.
+    """
+
+    turns: List[ScriptedTurn]
+    input_tokens: int = 1000
+
+    @property
+    def _llm_type(self) -> str:
+        return SCRIPTED_MODEL
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _get_turn(self, message: str) -> ScriptedTurn:
+        for turn in self.turns:
+            if turn.message == message:
+                return turn
+        return ScriptedTurn(message, "Ok.")
+
+    def _get_context(self, messages: List[BaseMessage]) -> Dict[str, str]:
+        # The run config doesn't reach the model in async runs on Python
+        # 3.10, so the user comes from the context message instead.
+        for message in reversed(messages):
+            if isinstance(message, SystemMessage) and (match := USER_CONTEXT_PATTERN.fullmatch(message.content)):
+                return match.groupdict()
+        return {}
+
+    def _next_message(self, messages: List[BaseMessage]) -> AIMessage:
+        context = self._get_context(messages)
+        last_human = max(index for index, message in enumerate(messages) if isinstance(message, HumanMessage))
+        turn = self._get_turn(messages[last_human].content)
+        usage = {'input_tokens': self.input_tokens, 'output_tokens': 10, 'total_tokens': self.input_tokens + 10}
+
+        if turn.tool_calls and not any(isinstance(message, ToolMessage) for message in messages[last_human:]):
+            return AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        'name': name,
+                        'args': {
+                            key: value.format_map(context) if isinstance(value, str) else value
+                            for key, value in args.items()
+                        },
+                        'id': f"call_{len(messages)}_{index}",
+                    }
+                    for index, (name, args) in enumerate(turn.tool_calls)
+                ],
+                usage_metadata=usage,
+            )
+
+        return AIMessage(content=turn.reply, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message = self._next_message(messages)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _get_chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+                    for index, call in enumerate(message.tool_calls)
+                ],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+
+        words = message.content.split(" ")
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=message.usage_metadata if last else None,
+            ))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        yield from self._get_chunks(self._next_message(messages))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk in self._get_chunks(self._next_message(messages)):
+            yield chunk
+
+
+chat_model_factories[SCRIPTED_MODEL] = lambda agent_configuration: ScriptedChatModel(turns=BENCHMARK_TURNS)
+
+
+def seed_benchmark_data(users: int, transactions: int, seed: int = 0) -> List[User]:
+    """Creates `users` users talking to the scripted model, each with about
+    `transactions` transactions over the last year."""
+
+    generator = FinanceDataGenerator(months=12, seed=seed)
+
+    agent_settings = AgentSettings.objects.filter(is_default=True).first()
+    scripted_settings = AgentSettings(prompt=agent_settings.prompt if agent_settings else "", model=SCRIPTED_MODEL)
+    scripted_settings.save()
+
+    created_users = generator.create_users(users, start=0)
+    categories = generator.create_categories(created_users)
+
+    for user in created_users:
+        AgentSettingsToUser.objects.create(user=user, agent_settings=scripted_settings)
+        TelegramUserSettings.objects.create(user=user, telegram_id=str(user.pk), rate_limit_enabled=False)
+
+        user_categories = [category for category in categories if category.user == str(user.pk)]
+        for chunk in chunked(generator.generate_transactions(user, user_categories, transactions), 10000):
+            insert_transactions(chunk)
+
+    return created_users
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile."""
+
+    ordered = sorted(values)
+    rank = max(int(round(percent / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    queries: List[int] = field(default_factory=list)
+    allocations: List[int] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'p50_ms': percentile(self.latencies, 50) * 1000,
+            'p95_ms': percentile(self.latencies, 95) * 1000,
+            'p99_ms': percentile(self.latencies, 99) * 1000,
+            'queries': sum(self.queries) / len(self.queries),
+            'peak_kib': max(self.allocations) / 1024,
+        }
+
+
+@dataclass
+class Scenario:
+    """
+    A benchmarked operation. `prepare` runs before each iteration, outside
+    of the measurements, and returns what `run` gets.
+    """
+
+    name: str
+    run: Callable[[Any], Any]
+    prepare: Callable[[int], Any] = lambda iteration: iteration
+
+
+def run_scenario(scenario: Scenario, iterations: int, warmup: int = 1) -> BenchmarkResult:
+    """Runs a scenario, measuring the latency, the queries made on every
+    connection and the peak of memory allocated per iteration."""
+
+    result = BenchmarkResult(scenario.name)
+    # Connections opened from now on are traced by `trace_new_connection`
+    install_query_tracing(connection)
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    try:
+        for iteration in range(warmup + iterations):
+            value = scenario.prepare(iteration)
+
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+            with count_queries() as queries:
+                start = time.perf_counter()
+                scenario.run(value)
+                elapsed = time.perf_counter() - start
+
+            if iteration >= warmup:
+                result.latencies.append(elapsed)
+                result.queries.append(queries.queries)
+                result.allocations.append(tracemalloc.get_traced_memory()[1] - memory_before)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    return result
+
+
+def get_tool_scenarios(users: List[User]) -> List[Scenario]:
+    """One scenario per agent tool, cycling through the seeded users."""
+
+    def user_id(iteration: int) -> str:
+        return str(users[iteration % len(users)].pk)
+
+    def category_id(iteration: int) -> int:
+        return Category.objects.filter(user=user_id(iteration), normalized_name="MERCADO").values_list('id', flat=True)[0]
+
+    def new_category(iteration: int, name: str) -> str:
+        Category.objects.create(user=user_id(iteration), name=name)
+        return name
+
+    def new_transaction(iteration: int) -> int:
+        return Transaction.objects.create(
+            user=user_id(iteration),
+            category_id=category_id(iteration),
+            amount=10,
+            date=timezone.now(),
+        ).pk
+
+    arguments = {
+        'CreateCategoryTool': lambda i: {"user": user_id(i), "category_name": f"Categoria {i}"},
+        'CreateTransactionTool': lambda i: {
+            "user": user_id(i),
+            "category": category_id(i),
+            "amount": 50.0,
+            "date": "2025-01-15",
+        },
+        'RecordExpenseTool': lambda i: {"user": user_id(i), "category_name": "mercado", "amount": 50.0},
+        'RecordExpensesTool': lambda i: {
+            "user": user_id(i),
+            "entries": [
+                {"category_name": "mercado", "amount": 50.0},
+                {"category_name": "transporte", "amount": 12.5, "date": "2025-01-15"},
+                {"category_name": f"Nova {i}", "amount": 30.0},
+            ],
+            "create_categories": True,
+        },
+        'SearchCategoryByNameTool': lambda i: {"user": user_id(i), "category_name": "merc"},
+        'SearchUserCategoriesTool': lambda i: {"user": user_id(i)},
+        'SearchTransactionsTool': lambda i: {"user_id": user_id(i), "category": "mercado", "limit": 20},
+        'SummarizeTransactionsTool': lambda i: {"user_id": user_id(i), "period": "month"},
+        'UpdateTransactionTool': lambda i: {"user_id": user_id(i), "transaction": new_transaction(i), "amount": 42},
+        'DeleteTransactionTool': lambda i: {"user_id": user_id(i), "transaction_id": str(new_transaction(i))},
+        'CreateTransactionsTool': lambda i: {
+            "user": user_id(i),
+            "transactions": [{"category": category_id(i), "amount": 10.0 + n} for n in range(10)],
+        },
+        'UpdateTransactionsTool': lambda i: {
+            "user_id": user_id(i),
+            "transactions": [{"transaction": new_transaction(i), "amount": 42.0} for _ in range(10)],
+        },
+        'DeleteTransactionsTool': lambda i: {
+            "user_id": user_id(i),
+            "transaction_ids": [new_transaction(i) for _ in range(10)],
+        },
+        'DeleteCategoryTool': lambda i: {"user_id": user_id(i), "category_name": new_category(i, f"Apagar {i}")},
+        'UpdateCategoryTool': lambda i: {
+            "user_id": user_id(i),
+            "category_name": new_category(i, f"Renomear {i}"),
+            "new_name": f"Renomeada {i}",
+        },
+    }
+
+    return [
+        Scenario(f"tool:{tool.name}", tool.invoke, arguments[tool.name])
+        for tool in FinanceAgent.agent_tools
+        if tool.name in arguments
+    ]
+
+
+def get_agent_scenario(users: List[User]) -> Scenario:
+    agent = FinanceAgent()
+
+    def prepare(iteration: int) -> Dict[str, str]:
+        return {
+            'user_id': str(users[iteration % len(users)].pk),
+            'message': BENCHMARK_TURNS[iteration % len(BENCHMARK_TURNS)].message,
+        }
+
+    return Scenario("agent:invoke", agent.invoke, prepare)
+
+
+# Answered by the intent parser, without the model
+INTENT_MESSAGES = [
+    "gastei 25,90 no mercado ontem",
+    "quanto gastei esse mês?",
+    "quanto gastei com mercado na semana passada?",
+]
+
+
+def get_intent_scenario(users: List[User]) -> Scenario:
+    agent = FinanceAgent()
+
+    def prepare(iteration: int) -> Dict[str, str]:
+        return {
+            'user_id': str(users[iteration % len(users)].pk),
+            'message': INTENT_MESSAGES[iteration % len(INTENT_MESSAGES)],
+        }
+
+    return Scenario("agent:intents", agent.invoke, prepare)
+
+
+def get_telegram_scenario(users: List[User]) -> Scenario:
+    from finance_bot.telegram_bot.bot import get_response
+
+    def prepare(iteration: int) -> types.Message:
+        user = users[iteration % len(users)]
+        return types.Message.de_json({
+            'message_id': iteration,
+            'date': 0,
+            'chat': {'id': user.pk, 'type': 'private'},
+            'from': {'id': user.pk, 'is_bot': False, 'first_name': user.first_name},
+            'text': BENCHMARK_TURNS[iteration % len(BENCHMARK_TURNS)].message,
+        })
+
+    return Scenario("telegram:handler", get_response, prepare)
+
+
+def get_consumer_scenario(users: List[User]) -> Scenario:
+    from finance_bot.langchain_bot.consumers import ChatConsumer
+
+    async def chat(value: tuple[User, str]):
+        user, message = value
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat")
+        communicator.scope['user'] = user
+        await communicator.connect()
+        try:
+            await communicator.send_to(text_data=json.dumps({'message': message}))
+            while json.loads(await communicator.receive_from(timeout=30))['type'] != 'message':
+                pass
+        finally:
+            await communicator.disconnect()
+
+    def prepare(iteration: int) -> tuple[User, str]:
+        return users[iteration % len(users)], BENCHMARK_TURNS[iteration % len(BENCHMARK_TURNS)].message
+
+    return Scenario("consumer:chat", async_to_sync(chat), prepare)
+
+
+SCENARIO_GROUPS = {
+    'agent': lambda users: [get_agent_scenario(users), get_intent_scenario(users)],
+    'tools': get_tool_scenarios,
+    'telegram': lambda users: [get_telegram_scenario(users)],
+    'consumer': lambda users: [get_consumer_scenario(users)],
+}
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    lines = [f"{'scenario':<36}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>10}"]
+    for result in results:
+        summary = result.summary()
+        lines.append(
+            f"{result.name:<36}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+            f"{summary['queries']:>10.1f}{summary['peak_kib']:>10.1f}"
+        )
+    return "\n".join(lines)
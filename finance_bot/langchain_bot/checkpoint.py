@@ -0,0 +1,331 @@
+import random
+from datetime import timedelta
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from finance_bot.database import scoped_connection
+from finance_bot.langchain_bot.models import AgentCheckpoint, AgentCheckpointWrite
+
+
+class DjangoCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpoint saver backed by the Django ORM.
+
+    Only the newest `max_checkpoints` of each thread are kept, None keeps
+    all of them. Older ones are deleted every `retention_interval` steps of
+    the thread instead of on every write, so the stored state per
+    conversation is bounded by their sum. Every process that uses the same
+    database shares the conversation state.
+    """
+
+    def __init__(self, max_checkpoints: int | None = 10, retention_interval: int = 10, **kwargs):
+        super().__init__(**kwargs)
+        if max_checkpoints is not None and max_checkpoints < 1:
+            raise ValueError("max_checkpoints must be at least 1, or None to keep every checkpoint.")
+        if retention_interval < 1:
+            raise ValueError("retention_interval must be at least 1.")
+
+        self.max_checkpoints = max_checkpoints
+        self.retention_interval = retention_interval
+
+    def _thread_config(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint_id,
+            }
+        }
+
+    def _load_writes(self, saved: AgentCheckpoint, **filters) -> list:
+        return list(AgentCheckpointWrite.objects.filter(
+            thread_id=saved.thread_id,
+            checkpoint_ns=saved.checkpoint_ns,
+            **filters,
+        ).order_by('task_path', 'task_id', 'idx'))
+
+    def _to_tuple(self, saved: AgentCheckpoint) -> CheckpointTuple:
+        writes = self._load_writes(saved, checkpoint_id=saved.checkpoint_id)
+
+        sends = []
+        if saved.parent_checkpoint_id:
+            sends = self._load_writes(saved, checkpoint_id=saved.parent_checkpoint_id, channel=TASKS)
+
+        checkpoint = self.serde.loads_typed((saved.checkpoint_type, bytes(saved.checkpoint)))
+
+        return CheckpointTuple(
+            config=self._thread_config(saved.thread_id, saved.checkpoint_ns, saved.checkpoint_id),
+            checkpoint={
+                **checkpoint,
+                "pending_sends": [self.serde.loads_typed((w.value_type, bytes(w.value))) for w in sends],
+            },
+            metadata=self.serde.loads_typed((saved.metadata_type, bytes(saved.metadata))),
+            parent_config=(
+                self._thread_config(saved.thread_id, saved.checkpoint_ns, saved.parent_checkpoint_id)
+                if saved.parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (w.task_id, w.channel, self.serde.loads_typed((w.value_type, bytes(w.value))))
+                for w in writes
+            ],
+        )
+
+    @scoped_connection()
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        query = AgentCheckpoint.objects.filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.filter(checkpoint_id=checkpoint_id)
+
+        saved = query.order_by('-checkpoint_id').first()
+        if saved is None:
+            return None
+
+        return self._to_tuple(saved)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = AgentCheckpoint.objects.all()
+
+        if config:
+            query = query.filter(thread_id=config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                query = query.filter(checkpoint_ns=checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.filter(checkpoint_id=checkpoint_id)
+
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            query = query.filter(checkpoint_id__lt=before_checkpoint_id)
+
+        for saved in query.order_by('thread_id', 'checkpoint_ns', '-checkpoint_id'):
+            checkpoint_tuple = self._to_tuple(saved)
+
+            if filter and not all(
+                value == checkpoint_tuple.metadata.get(key)
+                for key, value in filter.items()
+            ):
+                continue
+
+            if limit is not None and limit <= 0:
+                break
+            elif limit is not None:
+                limit -= 1
+
+            yield checkpoint_tuple
+
+    @scoped_connection()
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        saved_checkpoint = checkpoint.copy()
+        saved_checkpoint.pop("pending_sends", None)
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(saved_checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        AgentCheckpoint.objects.bulk_create(
+            [AgentCheckpoint(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+                checkpoint_type=checkpoint_type,
+                checkpoint=checkpoint_data,
+                metadata_type=metadata_type,
+                metadata=metadata_data,
+            )],
+            update_conflicts=True,
+            unique_fields=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+            update_fields=['parent_checkpoint_id', 'checkpoint_type', 'checkpoint', 'metadata_type', 'metadata'],
+        )
+        if self.max_checkpoints is not None and metadata.get("step", 0) % self.retention_interval == 0:
+            self._apply_retention(thread_id, checkpoint_ns)
+
+        return self._thread_config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    @scoped_connection()
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        new_writes = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_data = self.serde.dumps_typed(value)
+            new_writes.append(AgentCheckpointWrite(
+                thread_id=thread_id,
+                checkpoint_ns=checkpoint_ns,
+                checkpoint_id=checkpoint_id,
+                task_id=task_id,
+                task_path=task_path,
+                idx=WRITES_IDX_MAP.get(channel, idx),
+                channel=channel,
+                value_type=value_type,
+                value=value_data,
+            ))
+
+        # Special writes (errors, interrupts) replace the previous value,
+        # regular writes are only stored once.
+        if all(write.idx >= 0 for write in new_writes):
+            AgentCheckpointWrite.objects.bulk_create(new_writes, ignore_conflicts=True)
+            return
+
+        AgentCheckpointWrite.objects.bulk_create(
+            new_writes,
+            update_conflicts=True,
+            unique_fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'],
+            update_fields=['task_path', 'channel', 'value_type', 'value'],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await sync_to_async(self.get_tuple)(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        checkpoint_tuples = await sync_to_async(lambda: list(
+            self.list(config, filter=filter, before=before, limit=limit)
+        ))()
+        for checkpoint_tuple in checkpoint_tuples:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await sync_to_async(self.put)(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await sync_to_async(self.put_writes)(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()
+        return f"{next_v:032}.{next_h:016}"
+
+    def _apply_retention(self, thread_id: str, checkpoint_ns: str):
+        # Checkpoint ids are time ordered, so everything older than the
+        # oldest checkpoint we want to keep can go.
+        oldest_kept_id = (AgentCheckpoint.objects
+            .filter(thread_id=thread_id, checkpoint_ns=checkpoint_ns)
+            .order_by('-checkpoint_id')
+            .values_list('checkpoint_id', flat=True)[self.max_checkpoints - 1:self.max_checkpoints]
+            .first())
+
+        if oldest_kept_id is None:
+            return
+
+        filters = {
+            'thread_id': thread_id,
+            'checkpoint_ns': checkpoint_ns,
+            'checkpoint_id__lt': oldest_kept_id,
+        }
+        AgentCheckpoint.objects.filter(**filters).delete()
+        AgentCheckpointWrite.objects.filter(**filters).delete()
+
+
+def prune_checkpoints(ttl: timedelta, max_per_thread: int | None = None) -> tuple[int, int]:
+    """Deletes checkpoints older than `ttl` or, when `max_per_thread` is
+    given, beyond the newest `max_per_thread` of their thread, and writes
+    left without a checkpoint.
+
+    Returns:
+        tuple[int, int]: The number of deleted checkpoints and writes.
+    """
+
+    deleted_checkpoints, _ = AgentCheckpoint.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+
+    if max_per_thread is not None:
+        over_limit = (AgentCheckpoint.objects
+            .annotate(position=Window(
+                RowNumber(),
+                partition_by=[F('thread_id'), F('checkpoint_ns')],
+                order_by=F('checkpoint_id').desc(),
+            ))
+            .filter(position__gt=max_per_thread)
+            .values_list('pk', flat=True))
+        deleted, _ = AgentCheckpoint.objects.filter(pk__in=list(over_limit)).delete()
+        deleted_checkpoints += deleted
+
+    checkpoint_exists = AgentCheckpoint.objects.filter(
+        thread_id=OuterRef('thread_id'),
+        checkpoint_ns=OuterRef('checkpoint_ns'),
+        checkpoint_id=OuterRef('checkpoint_id'),
+    )
+    deleted_writes, _ = AgentCheckpointWrite.objects.filter(~Exists(checkpoint_exists)).delete()
+
+    return deleted_checkpoints, deleted_writes
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """Returns the checkpointer configured by `AGENT_CHECKPOINTER`."""
+
+    if settings.AGENT_CHECKPOINTER == 'memory':
+        return MemorySaver()
+
+    if settings.AGENT_CHECKPOINTER == 'database':
+        return DjangoCheckpointSaver(
+            max_checkpoints=settings.AGENT_CHECKPOINT_MAX_PER_THREAD or None,
+            retention_interval=settings.AGENT_CHECKPOINT_RETENTION_INTERVAL,
+        )
+
+    raise ValueError(f"Unknown agent checkpointer '{settings.AGENT_CHECKPOINTER}'.")
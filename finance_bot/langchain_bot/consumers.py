@@ -1,58 +1,82 @@
 import json
 import logging
 
-from channels.generic.websocket import WebsocketConsumer
+from channels.db import aclose_old_connections
+from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 
 from finance_bot.finance.agent import FinanceAgent
+from finance_bot.ratelimit import rate_limiter
 
 
 logger = logging.getLogger(__name__)
 
 
-class ChatConsumer(WebsocketConsumer):
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Streams the agent run to the chat page.
+
+    Besides the final `message` frame, partial `token` frames and `tool`
+    progress frames are sent while the agent is running.
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.agent = None
 
-    def connect(self):
+    async def connect(self):
         try:
             logger.info(f"User {self.scope['user']} connected")
             self.agent = FinanceAgent()
-            self.accept()
+            await self.accept()
         except Exception as e:
             logger.error(f"Error connecting user {self.scope['user']}: {e}")
-            self.close(code=1011)  # Internal error
+            await self.close(code=1011)  # Internal error
             raise
 
-    def disconnect(self, close_code):
+    async def disconnect(self, close_code):
         # Clean up any resources if needed
         self.agent = None
 
-    def receive(self, text_data):
+    async def receive(self, text_data):
         if not self.agent:
-            self.send(text_data=json.dumps({
+            await self.send(text_data=json.dumps({
+                "type": "message",
                 "message": "Agent not initialized. Please reconnect."
             }))
             return
 
+        message = None
+
         try:
             text_data_json = json.loads(text_data)
             message = text_data_json["message"]
 
-            response = self.agent.invoke({
+            if await rate_limiter.aexceeded(f"chat:{self.scope['user'].id}", settings.RATE_LIMIT):
+                await self.send(text_data=json.dumps({
+                    "type": "message",
+                    "message": "You have reached the message limit. Please try again later."
+                }))
+                return
+
+            async for event in self.agent.astream({
                 'user_id': str(self.scope['user'].id),
                 'message': message
-            })
+            }):
+                await self.send(text_data=json.dumps(event))
 
-            self.send(text_data=json.dumps({"message": response}))
-            
         except json.JSONDecodeError:
-            self.send(text_data=json.dumps({
+            await self.send(text_data=json.dumps({
+                "type": "message",
                 "message": "Invalid JSON format in message"
             }))
         except Exception as e:
             logger.error(f"Error processing message {message} from user {self.scope['user']}: {e}")
-            self.send(text_data=json.dumps({
+            await self.send(text_data=json.dumps({
+                "type": "message",
                 "message": "There was an error processing your request"
             }))
+        finally:
+            # Returns a pooled connection between messages, persistent ones
+            # are only closed once they outlive CONN_MAX_AGE
+            await aclose_old_connections()
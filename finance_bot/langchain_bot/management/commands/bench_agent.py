@@ -0,0 +1,60 @@
+import logging
+
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from finance_bot.langchain_bot.benchmark import (
+    SCENARIO_GROUPS,
+    format_results,
+    run_scenario,
+    seed_benchmark_data,
+)
+from finance_bot.users.interactions import get_interaction_writer
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the agent, its tools, the Telegram handler and the chat consumer with a scripted model"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help='Number of seeded users')
+        parser.add_argument('--transactions', type=int, default=1000, help='Transactions seeded per user')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured runs per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Runs per scenario before measuring')
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=sorted(SCENARIO_GROUPS),
+            help='Scenario group to run, can be repeated. Runs all of them by default',
+        )
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('BenchAgent')
+
+        # The benchmark writes to a throwaway test database and keeps its
+        # cache local, so no real data or shared counters are touched.
+        if connection.vendor == 'sqlite':
+            # The in-memory test database locks whole tables, which fails
+            # the writes the agent makes from other threads.
+            connection.settings_dict['TEST']['NAME'] = 'benchmark.sqlite'
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                RATE_LIMIT=10 ** 9,
+            ):
+                users = seed_benchmark_data(options['users'], options['transactions'])
+                logger.info(f"Seeded {len(users)} users with {options['transactions']} transactions each")
+
+                results = []
+                for group in options['scenario'] or SCENARIO_GROUPS:
+                    for scenario in SCENARIO_GROUPS[group](users):
+                        logger.info(f"Running {scenario.name}")
+                        results.append(run_scenario(scenario, options['iterations'], options['warmup']))
+
+                get_interaction_writer().stop()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(format_results(results))
+        self.stdout.write(self.style.SUCCESS("Benchmark finished."))
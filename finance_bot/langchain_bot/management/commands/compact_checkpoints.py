@@ -0,0 +1,41 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from finance_bot.langchain_bot.checkpoint import prune_checkpoints
+
+
+class Command(BaseCommand):
+    help = "Deletes expired agent checkpoints and their orphaned writes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ttl-days',
+            type=int,
+            default=settings.AGENT_CHECKPOINT_TTL_DAYS,
+            help='Checkpoints older than this number of days are deleted',
+        )
+        parser.add_argument(
+            '--max-per-thread',
+            type=int,
+            default=settings.AGENT_CHECKPOINT_MAX_PER_THREAD,
+            help='Checkpoints kept per conversation thread, 0 keeps all of them',
+        )
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger('CompactCheckpoints')
+
+        if options['max_per_thread'] < 0:
+            raise CommandError("--max-per-thread can't be negative.")
+
+        deleted_checkpoints, deleted_writes = prune_checkpoints(
+            timedelta(days=options['ttl_days']),
+            max_per_thread=options['max_per_thread'] or None,
+        )
+
+        logger.info("Deleted %d checkpoints and %d writes", deleted_checkpoints, deleted_writes)
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted_checkpoints} checkpoints and {deleted_writes} writes."
+        ))
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-18 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('langchain_bot', '0005_alter_agentsettings_model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=150)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=150)),
+                ('parent_checkpoint_id', models.CharField(blank=True, max_length=150, null=True)),
+                ('checkpoint_type', models.CharField(max_length=50)),
+                ('checkpoint', models.BinaryField()),
+                ('metadata_type', models.CharField(max_length=50)),
+                ('metadata', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Agent checkpoints',
+                'indexes': [models.Index(fields=['created_at'], name='langchain_b_created_bee72d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('thread_id', 'checkpoint_ns', 'checkpoint_id'), name='unique_agent_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgentCheckpointWrite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('thread_id', models.CharField(max_length=150)),
+                ('checkpoint_ns', models.CharField(blank=True, default='', max_length=255)),
+                ('checkpoint_id', models.CharField(max_length=150)),
+                ('task_id', models.CharField(max_length=150)),
+                ('task_path', models.CharField(blank=True, default='', max_length=255)),
+                ('idx', models.IntegerField()),
+                ('channel', models.CharField(max_length=255)),
+                ('value_type', models.CharField(max_length=50)),
+                ('value', models.BinaryField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'), name='unique_agent_checkpoint_write')],
+            },
+        ),
+    ]
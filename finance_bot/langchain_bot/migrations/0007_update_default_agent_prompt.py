@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 03:50
+
+import hashlib
+
+from django.db import migrations
+
+
+# SHA-256 of every conf/prompt.txt that 0004 may have seeded before the
+# prompt became the same for every user. Prompts edited by hand since
+# then match none of them and are left alone.
+SEEDED_PROMPT_HASHES = {
+    'ba96438f4674e1631347c77ce3c93757c5a7720bba9e83eddc519d3bd03ccecb',
+    'ba89e54aebe89353c8e0040439dc8d61ad416e6bd4c63970a4d78473a5919042',
+    '7600970000995655f13722c0c9d0fe9206d02419b87d0a837c67f52f1672b40e',
+    '45ccd71c623cae55c9904a63d58a6e24434e226e13b2a31f2f847867ace05209',
+    'd2d088d3dc3735fd3115acc7b467e2b31eaf50e0d0e723706ea430c4662d20b8',
+    '0c14f9f4a7f7a39d1cfd9623df50e9b9c5629840edcd55b8bcd12bfabd21b808',
+}
+
+
+def update_default_agent_prompt(apps, schema_editor):
+    model = apps.get_model('langchain_bot', 'AgentSettings')
+    with open('conf/prompt.txt', 'r', encoding='utf-8') as prompt_buf:
+        prompt = prompt_buf.read()
+
+    for agent_settings in model.objects.filter(is_default=True):
+        if hashlib.sha256(agent_settings.prompt.encode('utf-8')).hexdigest() in SEEDED_PROMPT_HASHES:
+            agent_settings.prompt = prompt
+            agent_settings.save(update_fields=['prompt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('langchain_bot', '0006_agentcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(update_default_agent_prompt, migrations.RunPython.noop),
+    ]
@@ -10,11 +10,18 @@ class AgentSettingsManager(models.Manager):
             raise ValueError("Can't have more than one default agent settings")
         super().create(*args, **kwargs)
 
+    def _filter_by_user(self, user: User):
+        # The user settings sort before the default ones, so both are
+        # resolved in a single query.
+        return (self
+            .filter(models.Q(agentsettingstouser__user=user) | models.Q(is_default=True))
+            .order_by('is_default', 'pk'))
+
     def find_by_user(self, user: User):
-        user_settings = self.filter(agentsettingstouser__user=user)
-        if user_settings.exists():
-            return user_settings.first()
-        return self.filter(is_default=True).first()
+        return self._filter_by_user(user).first()
+
+    async def afind_by_user(self, user: User):
+        return await self._filter_by_user(user).afirst()
 
 
 class AgentSettings(models.Model):
@@ -35,3 +42,58 @@ class AgentSettings(models.Model):
 class AgentSettingsToUser(models.Model):
     user = models.ForeignKey(User, on_delete=models.DO_NOTHING)
     agent_settings = models.ForeignKey(AgentSettings, on_delete=models.CASCADE)
+
+
+class AgentCheckpoint(models.Model):
+    """
+    Conversation state saved by the agent checkpointer.
+    """
+
+    thread_id = models.CharField(max_length=150)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default="")
+    checkpoint_id = models.CharField(max_length=150)
+    parent_checkpoint_id = models.CharField(max_length=150, null=True, blank=True)
+    checkpoint_type = models.CharField(max_length=50)
+    checkpoint = models.BinaryField()
+    metadata_type = models.CharField(max_length=50)
+    metadata = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Agent checkpoints'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+                name='unique_agent_checkpoint',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.thread_id} - {self.checkpoint_id}"
+
+
+class AgentCheckpointWrite(models.Model):
+    """
+    Pending writes of a task for a given checkpoint.
+    """
+
+    thread_id = models.CharField(max_length=150)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default="")
+    checkpoint_id = models.CharField(max_length=150)
+    task_id = models.CharField(max_length=150)
+    task_path = models.CharField(max_length=255, blank=True, default="")
+    idx = models.IntegerField()
+    channel = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=50)
+    value = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'],
+                name='unique_agent_checkpoint_write',
+            ),
+        ]
@@ -1,3 +1,438 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+
+from finance_bot.finance.agent import (
+    USER_CONTEXT_TEMPLATE,
+    AgentCache,
+    FinanceAgent,
+    agent_cache,
+    aget_agent_configuration,
+    get_agent_configuration,
+)
+from finance_bot.finance.models import Category, Transaction
+from finance_bot.finance.tools import SummarizeTransactionsTool
+from finance_bot.langchain_bot.checkpoint import DjangoCheckpointSaver, prune_checkpoints
+from finance_bot.langchain_bot.consumers import ChatConsumer
+from finance_bot.langchain_bot.models import AgentCheckpoint, AgentCheckpointWrite, AgentSettings
+from finance_bot.langchain_bot.benchmark import (
+    BENCHMARK_TURNS,
+    Scenario,
+    ScriptedChatModel,
+    get_tool_scenarios,
+    run_scenario,
+    seed_benchmark_data,
+)
+from finance_bot.users.models import User
+
+
+class ScriptedChatModelTestCase(TestCase):
+
+    def setUp(self):
+        self.model = ScriptedChatModel(turns=BENCHMARK_TURNS)
+        self.turn = BENCHMARK_TURNS[2]
+        self.messages = [
+            HumanMessage(content=self.turn.message),
+            SystemMessage(content=USER_CONTEXT_TEMPLATE.format(user_name="Ana", user_id=7, today="2025-01-01")),
+        ]
+
+    def test_calls_the_turn_tools_for_the_context_user(self):
+        message = self.model.invoke(self.messages)
+
+        self.assertEqual(message.tool_calls[0]['name'], self.turn.tool_calls[0][0])
+        self.assertEqual(message.tool_calls[0]['args']['user_id'], "7")
+
+    def test_replies_after_the_tool_results(self):
+        tool_call = self.model.invoke(self.messages)
+        messages = self.messages + [tool_call, ToolMessage(content="ok", tool_call_id=tool_call.tool_calls[0]['id'])]
+
+        self.assertEqual(self.model.invoke(messages).content, self.turn.reply)
+
+
+class ToolBenchmarkTestCase(TestCase):
+    """Runs every tool scenario and keeps the read tools to their query budget."""
+
+    query_budgets = {
+        'tool:SearchCategoryByNameTool': 0,
+        'tool:SearchUserCategoriesTool': 0,
+        'tool:SearchTransactionsTool': 1,
+        # The summary, then this month's totals for the category limits
+        'tool:SummarizeTransactionsTool': 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.users = seed_benchmark_data(users=2, transactions=20)
+
+    def test_tool_scenarios(self):
+        for scenario in get_tool_scenarios(self.users):
+            with self.subTest(scenario=scenario.name):
+                result = run_scenario(scenario, iterations=2, warmup=1)
+
+                self.assertEqual(len(result.latencies), 2)
+                if scenario.name in self.query_budgets:
+                    self.assertLessEqual(max(result.queries), self.query_budgets[scenario.name])
+
+
+class BenchmarkQueryCountTestCase(TransactionTestCase):
+    """The tools read from executor threads, which need the seeded data
+    committed to see it."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_benchmark_data(users=1, transactions=20)[0]
+
+        patcher = mock.patch.object(FinanceAgent, 'memory', MemorySaver())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        agent_cache.clear()
+        self.addCleanup(agent_cache.clear)
+
+    def test_counts_the_queries_of_the_tool_threads(self):
+        tool_queries = []
+        run = SummarizeTransactionsTool._run
+
+        def run_tool(tool, *args, **kwargs):
+            # The connection of the tool thread
+            with CaptureQueriesContext(connection) as queries:
+                output = run(tool, *args, **kwargs)
+            tool_queries.append((threading.get_ident(), len(queries)))
+            return output
+
+        scenario = Scenario(
+            "agent:summary",
+            FinanceAgent().invoke,
+            lambda iteration: {'user_id': str(self.user.pk), 'message': "quanto gastei por mês?"},
+        )
+        with mock.patch.object(SummarizeTransactionsTool, '_run', autospec=True, side_effect=run_tool), \
+                CaptureQueriesContext(connection) as this_thread:
+            result = run_scenario(scenario, iterations=1, warmup=0)
+
+        (tool_thread, queries), = tool_queries
+        self.assertNotEqual(tool_thread, threading.get_ident())
+        self.assertGreater(queries, 0)
+        self.assertGreaterEqual(result.queries[0], len(this_thread) + queries)
+
+
+class IntentTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_benchmark_data(users=1, transactions=20)[0]
+        self.agent = FinanceAgent()
+
+    def test_answers_formulaic_messages_without_the_model(self):
+        args = {'user_id': str(self.user.pk), 'message': "gastei 25,90 no mercado"}
+        with mock.patch.object(ScriptedChatModel, '_generate') as generate:
+            response = self.agent.invoke(args)
+
+        generate.assert_not_called()
+        self.assertTrue(response.startswith("Anotado: R$ 25,90 em Mercado hoje."))
+        self.assertTrue(Transaction.objects.filter(user=str(self.user.pk), amount=25.90).exists())
+
+        agent_config = self.agent._get_agent_configuration(str(self.user.pk))
+        state = self.agent._get_agent(agent_config).get_state(self.agent._get_invoke_config(str(self.user.pk), agent_config))
+        self.assertEqual([message.content for message in state.values['messages']], [args['message'], response])
+
+
+class ParallelToolsTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_benchmark_data(users=1, transactions=20)[0]
+        self.agent = FinanceAgent()
+        self.args = {'user_id': str(self.user.pk), 'message': "quanto gastei com mercado, transporte e lazer?"}
+
+        # Checkpoints written from the graph threads lock the in-memory test database
+        patcher = mock.patch.object(FinanceAgent, 'memory', MemorySaver())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        agent_cache.clear()
+        self.addCleanup(agent_cache.clear)
+
+    def summarize(self, user_id, category=None, **kwargs):
+        time.sleep(0.2)
+        return f"{category} {threading.get_ident()}"
+
+    def get_tool_results(self) -> list[str]:
+        agent_config = self.agent._get_agent_configuration(self.args['user_id'])
+        state = self.agent._get_agent(agent_config).get_state(self.agent._get_invoke_config(self.args['user_id'], agent_config))
+        return [message.content for message in state.values['messages'] if isinstance(message, ToolMessage)]
+
+    def test_runs_the_tool_calls_of_a_step_at_once(self):
+        for invoke in (self.agent.invoke, async_to_sync(self.agent.ainvoke)):
+            with self.subTest(invoke=invoke), mock.patch.object(SummarizeTransactionsTool, '_run', side_effect=self.summarize):
+                started = time.perf_counter()
+                invoke(self.args)
+
+                self.assertLess(time.perf_counter() - started, 0.5)
+                results = self.get_tool_results()[-3:]
+                self.assertEqual([result.split()[0] for result in results], ["mercado", "transporte", "lazer"])
+                self.assertEqual(len({result.split()[1] for result in results}), 3)
+
+    @override_settings(AGENT_TOOL_CONCURRENCY=1)
+    def test_limits_the_tools_run_at_once(self):
+        with mock.patch.object(SummarizeTransactionsTool, '_run', side_effect=self.summarize):
+            started = time.perf_counter()
+            self.agent.invoke(self.args)
+
+        self.assertGreaterEqual(time.perf_counter() - started, 0.6)
+
+
+class AgentCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        agent_cache.clear()
+        self.addCleanup(agent_cache.clear)
+
+    def test_evicts_the_least_recently_used_agent(self):
+        agents = AgentCache(max_size=2)
+        agents.set((1, "gpt", "a"), "first")
+        agents.set((2, "gpt", "a"), "second")
+        agents.get((1, "gpt", "a"))
+        agents.set((3, "gpt", "a"), "third")
+
+        self.assertEqual(len(agents), 2)
+        self.assertIsNone(agents.get((2, "gpt", "a")))
+        self.assertEqual(agents.get((1, "gpt", "a")), "first")
+
+        agents.invalidate(1)
+        self.assertIsNone(agents.get((1, "gpt", "a")))
+        self.assertEqual(agents.get((3, "gpt", "a")), "third")
+
+    def test_reuses_the_agent_until_its_settings_change(self):
+        user = seed_benchmark_data(users=1, transactions=0)[0]
+        agent = FinanceAgent()
+        agent_config = get_agent_configuration(user.pk)
+
+        compiled = agent._get_agent(agent_config)
+        self.assertIs(agent._get_agent(agent_config), compiled)
+
+        agent_settings = AgentSettings.objects.get(pk=agent_config['agent_settings_id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            agent_settings.prompt += "\nSeja breve."
+            agent_settings.save()
+
+        self.assertEqual(len(agent_cache), 0)
+        self.assertIsNot(agent._get_agent(get_agent_configuration(user.pk)), compiled)
+
+
+class AgentConfigurationCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="config@example.com", first_name="Ana")
+        self.agent_settings = AgentSettings.objects.get(is_default=True)
+
+    def test_saving_the_agent_settings_invalidates_the_configuration(self):
+        for name, get in (("sync", get_agent_configuration), ("async", async_to_sync(aget_agent_configuration))):
+            with self.subTest(name):
+                get(self.user.pk)
+                with self.assertNumQueries(0):
+                    get(self.user.pk)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.agent_settings.model = f"model-{name}"
+                    self.agent_settings.save()
+
+                self.assertEqual(get(self.user.pk)['model'], f"model-{name}")
+
+    def test_saving_the_user_invalidates_only_their_configuration(self):
+        other = User.objects.create_user(email="other@example.com")
+        get_agent_configuration(self.user.pk)
+        get_agent_configuration(other.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Bia"
+            self.user.save()
+
+        self.assertEqual(get_agent_configuration(self.user.pk)['user_name'], "Bia")
+        with self.assertNumQueries(0):
+            get_agent_configuration(other.pk)
+
+
+class DefaultPromptMigrationTestCase(TestCase):
+
+    def setUp(self):
+        self.migration = importlib.import_module('finance_bot.langchain_bot.migrations.0007_update_default_agent_prompt')
+        self.agent_settings = AgentSettings.objects.get(is_default=True)
+        with open('conf/prompt.txt', 'r', encoding='utf-8') as prompt_buf:
+            self.prompt = prompt_buf.read()
+
+    def migrate(self, prompt: str):
+        AgentSettings.objects.filter(pk=self.agent_settings.pk).update(prompt=prompt)
+        seeded = {hashlib.sha256("O nome do usuário é {user_name}. A data atual é {now}".encode('utf-8')).hexdigest()}
+        with mock.patch.object(self.migration, 'SEEDED_PROMPT_HASHES', seeded):
+            self.migration.update_default_agent_prompt(apps, None)
+        self.agent_settings.refresh_from_db()
+
+    def test_replaces_the_seeded_prompt(self):
+        self.migrate("O nome do usuário é {user_name}. A data atual é {now}")
+
+        self.assertEqual(self.agent_settings.prompt, self.prompt)
+        self.assertNotIn("{now}", self.agent_settings.prompt)
+
+    def test_keeps_edited_prompts(self):
+        self.migrate("Responda sempre em inglês. A data atual é {now}")
+
+        self.assertEqual(self.agent_settings.prompt, "Responda sempre em inglês. A data atual é {now}")
+
+
+class AsyncToolsTestCase(TransactionTestCase):
+    """Async runs call the sync tools on executor threads, which need the
+    test data committed to read it."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_benchmark_data(users=1, transactions=20)[0]
+        self.agent = FinanceAgent()
+
+        patcher = mock.patch.object(FinanceAgent, 'memory', MemorySaver())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        agent_cache.clear()
+        self.addCleanup(agent_cache.clear)
+
+    def test_ainvoke_runs_the_tools_off_the_event_loop(self):
+        tool_threads = []
+        run_scoped = SummarizeTransactionsTool._run_scoped
+
+        def record_thread(tool, *args, **kwargs):
+            tool_threads.append(threading.get_ident())
+            return run_scoped(tool, *args, **kwargs)
+
+        for category in Category.objects.filter(user=str(self.user.pk), name__in=["Mercado", "Transporte", "Lazer"]):
+            Transaction.objects.create(user=str(self.user.pk), category=category, amount=10, date=timezone.now())
+
+        args = {'user_id': str(self.user.pk), 'message': "quanto gastei com mercado, transporte e lazer?"}
+        with mock.patch.object(SummarizeTransactionsTool, '_run_scoped', autospec=True, side_effect=record_thread):
+            async_to_sync(self.agent.ainvoke)(args)
+
+        self.assertEqual(len(tool_threads), 3)
+        self.assertNotIn(threading.get_ident(), tool_threads)
+
+        agent_config = self.agent._get_agent_configuration(args['user_id'])
+        state = self.agent._get_agent(agent_config).get_state(self.agent._get_invoke_config(args['user_id'], agent_config))
+        results = [message.content for message in state.values['messages'] if isinstance(message, ToolMessage)]
+        self.assertEqual([result.splitlines()[1].split("|")[0] for result in results], ["Mercado", "Transporte", "Lazer"])
+
+
+class ChatConsumerTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = seed_benchmark_data(users=1, transactions=20)[0]
+
+        patcher = mock.patch.object(FinanceAgent, 'memory', MemorySaver())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        agent_cache.clear()
+        self.addCleanup(agent_cache.clear)
+
+    async def chat(self, *messages: str) -> list[list[dict]]:
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), "/ws/chat")
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        replies = []
+        for message in messages:
+            await communicator.send_to(text_data=message)
+            frames = [await communicator.receive_json_from(timeout=5)]
+            while frames[-1]['type'] != 'message':
+                frames.append(await communicator.receive_json_from(timeout=5))
+            replies.append(frames)
+
+        await communicator.disconnect()
+        return replies
+
+    def test_streams_tool_progress_before_the_reply(self):
+        frames, = async_to_sync(self.chat)(json.dumps({'message': "quais são minhas categorias?"}))
+
+        self.assertEqual(frames[-1], {'type': 'message', 'message': "Estas são as suas categorias."})
+        self.assertEqual(
+            [(frame['name'], frame['status']) for frame in frames if frame['type'] == 'tool'],
+            [("SearchUserCategoriesTool", "start"), ("SearchUserCategoriesTool", "end")],
+        )
+
+    @override_settings(RATE_LIMIT=1)
+    def test_rejects_bad_and_rate_limited_messages(self):
+        invalid, first, limited = async_to_sync(self.chat)("oi", json.dumps({'message': "oi"}), json.dumps({'message': "oi"}))
+
+        self.assertEqual(invalid, [{'type': 'message', 'message': "Invalid JSON format in message"}])
+        self.assertEqual(first[-1]['message'], "Olá! Como posso ajudar com suas finanças?")
+        self.assertEqual(limited, [{'type': 'message', 'message': "You have reached the message limit. Please try again later."}])
+
+
+class DjangoCheckpointSaverTestCase(TestCase):
+
+    def put_checkpoints(self, saver: DjangoCheckpointSaver, thread_id: str, steps: range) -> list[dict]:
+        configs = []
+        config = {'configurable': {'thread_id': thread_id, 'checkpoint_ns': ''}}
+        for step in steps:
+            checkpoint = empty_checkpoint()
+            checkpoint['channel_values'] = {'messages': [f"step {step}"]}
+            config = saver.put(config, checkpoint, {'source': 'loop', 'step': step, 'writes': None}, {})
+            configs.append(config)
+        return configs
+
+    def test_round_trip(self):
+        saver = DjangoCheckpointSaver()
+        first, second = self.put_checkpoints(saver, '1', range(2))
+        saver.put_writes(second, [('messages', "pending")], task_id='task')
+
+        latest = saver.get_tuple({'configurable': {'thread_id': '1'}})
+        self.assertEqual(latest.config, second)
+        self.assertEqual(latest.parent_config, first)
+        self.assertEqual(latest.checkpoint['channel_values'], {'messages': ["step 1"]})
+        self.assertEqual(latest.metadata['step'], 1)
+        self.assertEqual(latest.pending_writes, [('task', 'messages', "pending")])
+
+        self.assertEqual(saver.get_tuple(first).checkpoint['channel_values'], {'messages': ["step 0"]})
+        self.assertEqual([item.config for item in saver.list({'configurable': {'thread_id': '1'}})], [second, first])
+        self.assertEqual([item.config for item in saver.list(None, before=second)], [first])
+        self.assertIsNone(saver.get_tuple({'configurable': {'thread_id': '2'}}))
+
+    def test_keeps_the_newest_checkpoints_of_each_thread(self):
+        saver = DjangoCheckpointSaver(max_checkpoints=2, retention_interval=3)
+        configs = self.put_checkpoints(saver, '1', range(5))
+        self.put_checkpoints(saver, '2', range(2))
+
+        # Trimmed at steps 0 and 3, the one after is kept until step 6
+        kept = AgentCheckpoint.objects.filter(thread_id='1').order_by('checkpoint_id').values_list('checkpoint_id', flat=True)
+        self.assertEqual(list(kept), [config['configurable']['checkpoint_id'] for config in configs[2:]])
+        self.assertEqual(AgentCheckpoint.objects.filter(thread_id='2').count(), 2)
+
+        with self.assertRaises(ValueError):
+            DjangoCheckpointSaver(max_checkpoints=0)
+
+    def test_prunes_old_checkpoints_and_their_writes(self):
+        saver = DjangoCheckpointSaver(max_checkpoints=None)
+        configs = self.put_checkpoints(saver, '1', range(4))
+        for config in configs:
+            saver.put_writes(config, [('messages', "pending")], task_id='task')
+
+        self.assertEqual(prune_checkpoints(timedelta(days=1), max_per_thread=1), (3, 3))
+        self.assertEqual(saver.get_tuple({'configurable': {'thread_id': '1'}}).config, configs[-1])
+        self.assertEqual(AgentCheckpointWrite.objects.count(), 1)
+
+        AgentCheckpoint.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(prune_checkpoints(timedelta(days=1)), (1, 1))
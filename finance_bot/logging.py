@@ -13,3 +13,10 @@ def configure_logger():
         format='%(name)s - %(levelname)s - %(asctime)s - %(message)s',
         handlers=[stream_handler]
     )
+
+
+def log_fields(event: str, **fields) -> str:
+    """Formats a log message as `event key=value ...`, so it can be parsed by log collectors."""
+
+    values = [f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}" for key, value in fields.items()]
+    return " ".join([event, *values])
@@ -0,0 +1,155 @@
+import hmac
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Sequence
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    Base of the process metrics rendered in the Prometheus text format.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _get_label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[self._get_label_values(labels)] += amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{format_labels(self.labels, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._sums = defaultdict(float)
+        self._totals = defaultdict(int)
+
+    def observe(self, value: float, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            counts = self._counts[key]
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    counts[index] += 1
+            self._sums[key] += value
+            self._totals[key] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums, totals = dict(self._sums), dict(self._totals)
+
+        lines = []
+        for key in sorted(counts):
+            labels = format_labels(self.labels, key)
+            for bucket, count in zip(self.buckets, counts[key]):
+                bucket_labels = format_labels(self.labels, key, 'le="%s"' % bucket)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            inf_labels = format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {totals[key]}")
+            lines.append(f"{self.name}_sum{labels} {sums[key]}")
+            lines.append(f"{self.name}_count{labels} {totals[key]}")
+        return lines
+
+
+class Gauge(Metric):
+    """Gauge read from `function` when the metrics are rendered.
+
+    With labels, `function` returns the value of each set of label values.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        function: Callable[[], float | Dict[LabelValues, float]],
+        labels: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def samples(self) -> List[str]:
+        if not self.labels:
+            return [f"{self.name} {self.function()}"]
+        return [
+            f"{self.name}{format_labels(self.labels, key)} {value}"
+            for key, value in sorted(self.function().items())
+        ]
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+@require_GET
+def metrics_view(request):
+    """Exposes the metrics of this process in the Prometheus text format.
+
+    The metrics include user ids and database pool internals, so they are
+    only served with the METRICS_TOKEN bearer token and never without one.
+    """
+
+    authorization = request.headers.get('Authorization', '').encode()
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return HttpResponseForbidden()
+
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
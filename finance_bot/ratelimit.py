@@ -0,0 +1,79 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class SlidingWindowRateLimiter:
+    """
+    Sliding window rate limiter on top of the Django cache.
+
+    Keeps one counter per key and window. The previous window counter is
+    weighted by how much of it still overlaps the sliding window, so every
+    check costs the same few cache operations. The counters have to be
+    shared by every process, which the `finance_bot.E002` check requires
+    when there is more than one.
+    """
+
+    def __init__(self, cache_alias: str, window: int):
+        self.cache_alias = cache_alias
+        self.window = window
+
+    def _get_keys(self, key: str) -> tuple[str, str, float]:
+        now = time.time()
+        window_index = int(now // self.window)
+        elapsed = (now % self.window) / self.window
+        return (
+            f"ratelimit:{key}:{window_index}",
+            f"ratelimit:{key}:{window_index - 1}",
+            elapsed,
+        )
+
+    def _is_over(self, current: int, previous: int | None, elapsed: float, limit: int) -> bool:
+        return (previous or 0) * (1 - elapsed) + current > limit
+
+    def exceeded(self, key: str, limit: int) -> bool:
+        """Returns whether `key` is over `limit`, counting the hit when it is not.
+
+        The hit is counted first, so concurrent hits each see a different
+        count and no more than `limit` get through. Rejected hits are taken
+        back out.
+        """
+
+        cache = caches[self.cache_alias]
+        current_key, previous_key, elapsed = self._get_keys(key)
+
+        cache.add(current_key, 0, timeout=self.window * 2)
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Expired between add and incr
+            cache.set(current_key, 1, timeout=self.window * 2)
+            current = 1
+
+        if self._is_over(current, cache.get(previous_key), elapsed, limit):
+            cache.decr(current_key)
+            return True
+
+        return False
+
+    async def aexceeded(self, key: str, limit: int) -> bool:
+        """Asynchronous version of `exceeded`."""
+
+        cache = caches[self.cache_alias]
+        current_key, previous_key, elapsed = self._get_keys(key)
+
+        await cache.aadd(current_key, 0, timeout=self.window * 2)
+        try:
+            current = await cache.aincr(current_key)
+        except ValueError:
+            await cache.aset(current_key, 1, timeout=self.window * 2)
+            current = 1
+
+        if self._is_over(current, await cache.aget(previous_key), elapsed, limit):
+            await cache.adecr(current_key)
+            return True
+
+        return False
+
+rate_limiter = SlidingWindowRateLimiter(settings.RATE_LIMIT_CACHE, settings.RATE_LIMIT_WINDOW)
@@ -12,7 +12,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os
 
+from importlib.util import find_spec
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 from finance_bot.logging import configure_logger
@@ -118,6 +120,51 @@ if os.environ.get("DATABASE_ENGINE", "sqlite3") == "postgresql":
         'PASSWORD': os.environ.get("DATABASE_PASSWORD", "postgres"),
         'HOST': os.environ.get("DATABASE_HOST", "localhost"),
         'PORT': os.environ.get("DATABASE_PORT", "5432"),
+        # Seconds a connection is kept open for reuse, 0 closes it at the end of each request
+        'CONN_MAX_AGE': int(os.environ.get("DATABASE_CONN_MAX_AGE", "60")),
+        # Checks that a reused connection still works before the first query of a request
+        'CONN_HEALTH_CHECKS': get_env_bool("DATABASE_CONN_HEALTH_CHECKS", True),
+        'OPTIONS': {},
+    }
+
+    # Connection pool of psycopg 3, requires the `psycopg[pool]` package.
+    # Connections go back to the pool when closed, so they aren't kept open
+    # per thread.
+    if get_env_bool("DATABASE_POOL"):
+        if find_spec("psycopg") is None or find_spec("psycopg_pool") is None:
+            raise ImproperlyConfigured("DATABASE_POOL requires psycopg 3 with the pool extra, install `psycopg[pool]`.")
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+            'max_size': int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10")),
+            'timeout': int(os.environ.get("DATABASE_POOL_TIMEOUT", "30")),
+        }
+
+    # PgBouncer in transaction mode may run each transaction on a different
+    # server connection, where the cursors of the previous one don't exist.
+    if get_env_bool("DATABASE_PGBOUNCER"):
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Set REDIS_URL to share the cache between processes
+
+# Number of processes serving the bot, e.g. 2 for the daphne server and the
+# telegram_bot command of entrypoint.sh. With more than one, the system
+# checks require a cache shared between them.
+APP_PROCESSES = int(os.environ.get("APP_PROCESSES", "1"))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+if os.environ.get("REDIS_URL"):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get("REDIS_URL"),
     }
 
 
@@ -201,3 +248,94 @@ CHANNEL_LAYERS = {
         "BACKEND": "channels.layers.InMemoryChannelLayer",
     },
 }
+
+
+# Rate limit
+
+# Cache used to count the messages, which has to be shared by every process
+# when APP_PROCESSES is more than one
+RATE_LIMIT_CACHE = os.environ.get("RATE_LIMIT_CACHE", "default")
+
+# Size of the sliding window, in seconds
+RATE_LIMIT_WINDOW = int(os.environ.get("RATE_LIMIT_WINDOW", "3600"))
+
+# Messages allowed per window in the web chat, Telegram uses the user settings
+RATE_LIMIT = int(os.environ.get("RATE_LIMIT", "100"))
+
+
+# Interactions
+
+# Interactions saved per batch
+INTERACTION_BATCH_SIZE = int(os.environ.get("INTERACTION_BATCH_SIZE", "50"))
+
+# Seconds an interaction waits for its batch to fill before it is saved
+INTERACTION_FLUSH_INTERVAL = float(os.environ.get("INTERACTION_FLUSH_INTERVAL", "2"))
+
+
+# Telegram
+
+# Secret Telegram sends in the webhook requests, the webhook is disabled when empty
+TELEGRAM_WEBHOOK_SECRET = os.environ.get("TELEGRAM_WEBHOOK_SECRET", "")
+
+# Number of threads processing Telegram updates
+TELEGRAM_WORKERS = int(os.environ.get("TELEGRAM_WORKERS", "4"))
+
+# Updates waiting per worker before new ones are rejected
+TELEGRAM_WORKER_QUEUE_SIZE = int(os.environ.get("TELEGRAM_WORKER_QUEUE_SIZE", "50"))
+
+# Seconds the webhook waits for a free queue slot before answering 503
+TELEGRAM_WEBHOOK_QUEUE_TIMEOUT = float(os.environ.get("TELEGRAM_WEBHOOK_QUEUE_TIMEOUT", "1"))
+
+# Seconds the user, settings and agent settings of a Telegram user are cached for
+TELEGRAM_CONTEXT_CACHE_TIMEOUT = int(os.environ.get("TELEGRAM_CONTEXT_CACHE_TIMEOUT", "60"))
+
+
+# Agent
+
+# Max number of compiled agents kept in memory per process
+AGENT_CACHE_MAX_SIZE = int(os.environ.get("AGENT_CACHE_MAX_SIZE", "16"))
+
+# Max number of users with a rendered prompt kept in memory per agent
+AGENT_PROMPT_CACHE_MAX_SIZE = int(os.environ.get("AGENT_PROMPT_CACHE_MAX_SIZE", "256"))
+
+# Seconds the agent settings resolved for a user are cached for
+AGENT_CONFIGURATION_CACHE_TIMEOUT = int(os.environ.get("AGENT_CONFIGURATION_CACHE_TIMEOUT", "300"))
+
+# Answer formulaic messages, like "gastei 50 no mercado", without the model
+AGENT_INTENT_PARSER = get_env_bool("AGENT_INTENT_PARSER", True)
+
+# Max number of tool calls of an agent step run at once, the max_concurrency
+# of the run config. It sizes the thread pool of sync runs, async runs start
+# every call of the step on the event loop executor
+AGENT_TOOL_CONCURRENCY = int(os.environ.get("AGENT_TOOL_CONCURRENCY", "4"))
+
+# Approximate token budget of a single tool result
+TOOL_RESULT_MAX_TOKENS = int(os.environ.get("TOOL_RESULT_MAX_TOKENS", "400"))
+
+# Seconds a user category index is cached for
+CATEGORY_CACHE_TIMEOUT = int(os.environ.get("CATEGORY_CACHE_TIMEOUT", "300"))
+
+# Where the conversation state is kept, either "database" or "memory"
+AGENT_CHECKPOINTER = os.environ.get("AGENT_CHECKPOINTER", "database")
+
+# Number of checkpoints kept per conversation thread, 0 keeps all of them
+AGENT_CHECKPOINT_MAX_PER_THREAD = int(os.environ.get("AGENT_CHECKPOINT_MAX_PER_THREAD", "10"))
+
+# Steps of a conversation thread between deletions of its old checkpoints
+AGENT_CHECKPOINT_RETENTION_INTERVAL = int(os.environ.get("AGENT_CHECKPOINT_RETENTION_INTERVAL", "10"))
+
+# Checkpoints older than this are deleted by `compact_checkpoints`
+AGENT_CHECKPOINT_TTL_DAYS = int(os.environ.get("AGENT_CHECKPOINT_TTL_DAYS", "30"))
+
+# Import
+
+# Statement rows read and written at a time by the transaction import
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "5000"))
+
+# Largest statement file accepted from Telegram, which doesn't let bots download more than 20MB
+IMPORT_MAX_FILE_SIZE = int(os.environ.get("IMPORT_MAX_FILE_SIZE", str(20 * 1024 * 1024)))
+
+# Metrics
+
+# Bearer token required to read /metrics, the endpoint is disabled when empty
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
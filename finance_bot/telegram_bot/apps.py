@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TelegramBotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance_bot.telegram_bot'
+
+    def ready(self):
+        # Connects the user context invalidation signals
+        from finance_bot.telegram_bot import context  # noqa: F401
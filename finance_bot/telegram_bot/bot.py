@@ -0,0 +1,127 @@
+import atexit
+import functools
+import io
+import os
+import telebot
+
+from django.conf import settings
+
+from finance_bot.finance.agent import FinanceAgent
+from finance_bot.finance.imports import StatementError, TransactionImporter
+from finance_bot.ratelimit import rate_limiter
+from finance_bot.telegram_bot.context import TelegramUserContext, get_user_context
+from finance_bot.telegram_bot.dispatcher import UpdateDispatcher
+from finance_bot.users.interactions import get_interaction_writer
+from finance_bot.telegram_bot.handlers import (
+    finish_registration,
+    start_registration,
+)
+
+
+TELEGRAM_API_KEY = os.environ.get("TELEGRAM_API_KEY")
+
+agent = FinanceAgent()
+
+
+def rate_limit_exceeded(context: TelegramUserContext) -> bool:
+    user_settings = context.user_settings
+    if user_settings is None or not user_settings.rate_limit_enabled:
+        return False
+
+    return rate_limiter.exceeded(f"telegram:{context.telegram_id}", user_settings.rate_limit)
+
+
+def get_response(message) -> str:
+    """Returns the reply to a Telegram message."""
+
+    user_telegram_id = str(message.from_user.id)
+    context = get_user_context(user_telegram_id)
+
+    if rate_limit_exceeded(context):
+        return "Você atingiu o limit de mensagens permitidas. Tente novamente mais tarde."
+
+    if message.text == '/cadastro':
+        return start_registration(user_telegram_id)
+
+    if not context.is_registered:
+        return finish_registration(user_telegram_id, message.text)
+
+    response = agent.invoke({
+        'user_id': str(context.user_id),
+        'message': message.text,
+        'agent_configuration': context.agent_configuration,
+    })
+
+    get_interaction_writer().save(context.user_id, "telegram", message.text, response)
+    return response
+
+
+def handle_message(message):
+    get_bot().send_message(message.chat.id, get_response(message))
+
+
+def get_document_response(message) -> str:
+    """Imports the bank statement sent as a document and returns the summary."""
+
+    user_telegram_id = str(message.from_user.id)
+    context = get_user_context(user_telegram_id)
+
+    if rate_limit_exceeded(context):
+        return "Você atingiu o limit de mensagens permitidas. Tente novamente mais tarde."
+
+    if not context.is_registered:
+        return "Você precisa se cadastrar antes de importar um extrato. Envie */cadastro* para começar."
+
+    document = message.document
+    if document.file_size and document.file_size > settings.IMPORT_MAX_FILE_SIZE:
+        return "O arquivo é muito grande. Envie um extrato menor, de um período mais curto."
+
+    bot = get_bot()
+    content = bot.download_file(bot.get_file(document.file_id).file_path)
+
+    try:
+        result = TransactionImporter(context.user_id).import_file(io.BytesIO(content), document.file_name or '')
+    except StatementError:
+        return "Não consegui ler o extrato. Envie o arquivo CSV ou OFX exportado pelo seu banco."
+
+    response = f"Importei {result.imported} transações do extrato."
+    if result.duplicates:
+        response += f" {result.duplicates} já estavam registradas e foram ignoradas."
+    if result.skipped:
+        response += f" {result.skipped} linhas não puderam ser lidas."
+    if result.uncategorized:
+        response += f" {result.uncategorized} ficaram sem categoria, em Outros ou Receitas."
+    return response
+
+
+def handle_document(message):
+    get_bot().send_message(message.chat.id, get_document_response(message))
+
+
+@functools.cache
+def get_bot() -> telebot.TeleBot:
+    # Handlers run in the thread that processes the update, the dispatcher
+    # workers take care of the concurrency.
+    bot = telebot.TeleBot(TELEGRAM_API_KEY, threaded=False)
+    bot.register_message_handler(handle_message, func=lambda msg: True)
+    bot.register_message_handler(handle_document, content_types=['document'])
+    return bot
+
+
+def process_update(update: telebot.types.Update):
+    get_bot().process_new_updates([update])
+
+
+@functools.cache
+def get_dispatcher() -> UpdateDispatcher:
+    # atexit runs the handlers in reverse order, so the writer is created
+    # first to be stopped after the workers that feed it.
+    get_interaction_writer()
+
+    dispatcher = UpdateDispatcher(
+        process_update,
+        workers=settings.TELEGRAM_WORKERS,
+        queue_size=settings.TELEGRAM_WORKER_QUEUE_SIZE,
+    )
+    atexit.register(dispatcher.stop)
+    return dispatcher
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from finance_bot.caching import VersionedCache
+from finance_bot.finance.agent import get_agent_configuration
+from finance_bot.langchain_bot.models import AgentSettings, AgentSettingsToUser
+from finance_bot.telegram_bot.models import TelegramUserSettings
+from finance_bot.users.models import User
+
+
+# Keyed by Telegram id, all dropped by `invalidate_agent_settings`
+user_contexts = VersionedCache("telegram:context")
+
+
+@dataclass
+class TelegramUserContext:
+    """
+    Everything the message handler needs to know about a Telegram user.
+    """
+
+    telegram_id: str
+    user_settings: TelegramUserSettings | None = None
+    agent_configuration: Dict[str, Any] | None = None
+
+    @property
+    def is_registered(self) -> bool:
+        return self.user_settings is not None and self.user_settings.user_id is not None
+
+    @property
+    def user_id(self) -> int | None:
+        return self.user_settings.user_id if self.user_settings else None
+
+
+def load_user_context(telegram_id: str) -> TelegramUserContext:
+    user_settings = (TelegramUserSettings.objects
+        .select_related('user')
+        .filter(telegram_id=telegram_id)
+        .first())
+
+    context = TelegramUserContext(telegram_id=telegram_id, user_settings=user_settings)
+    if context.is_registered:
+        context.agent_configuration = get_agent_configuration(user_settings.user_id)
+
+    return context
+
+
+def get_user_context(telegram_id: str) -> TelegramUserContext:
+    """Returns the user context, loading it only when it isn't cached."""
+
+    telegram_id = str(telegram_id)
+    return user_contexts.get(telegram_id, lambda: load_user_context(telegram_id), settings.TELEGRAM_CONTEXT_CACHE_TIMEOUT)
+
+
+def invalidate_user_contexts(telegram_ids):
+    user_contexts.invalidate(telegram_ids)
+
+
+@receiver(post_save, sender=TelegramUserSettings)
+@receiver(post_delete, sender=TelegramUserSettings)
+def invalidate_telegram_user_settings(sender, instance, **kwargs):
+    invalidate_user_contexts([instance.telegram_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate_user_contexts(TelegramUserSettings.objects.filter(user=instance).values_list('telegram_id', flat=True))
+
+
+@receiver(post_save, sender=AgentSettingsToUser)
+@receiver(post_delete, sender=AgentSettingsToUser)
+def invalidate_agent_settings_to_user(sender, instance, **kwargs):
+    invalidate_user_contexts(TelegramUserSettings.objects.filter(user_id=instance.user_id).values_list('telegram_id', flat=True))
+
+
+@receiver(post_save, sender=AgentSettings)
+@receiver(post_delete, sender=AgentSettings)
+def invalidate_agent_settings(sender, instance, **kwargs):
+    user_contexts.invalidate_all()
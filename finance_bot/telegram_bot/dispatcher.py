@@ -0,0 +1,85 @@
+import logging
+import queue
+import threading
+from typing import Callable
+
+from django.db import close_old_connections
+from telebot import types
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_update_chat_id(update: types.Update) -> int:
+    if update.message is not None:
+        return update.message.chat.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """
+    Processes Telegram updates on a pool of worker threads.
+
+    Updates from the same chat always go to the same worker, so they are
+    handled in order, while different chats are handled concurrently. Every
+    worker has a bounded queue and `submit` raises `queue.Full` once the
+    timeout is reached, letting the caller push back on Telegram.
+    """
+
+    def __init__(self, handler: Callable[[types.Update], None], workers: int, queue_size: int):
+        self.handler = handler
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.threads:
+                return
+            for index, update_queue in enumerate(self.queues):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(update_queue,),
+                    name=f"telegram-worker-{index}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self, timeout: float | None = None):
+        """Stops the workers after the queued updates are processed."""
+
+        with self._lock:
+            threads, self.threads = self.threads, []
+
+        for update_queue in self.queues[:len(threads)]:
+            update_queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, update: types.Update, timeout: float | None = None):
+        """Queues an update, waiting up to `timeout` seconds for a free slot.
+
+        Raises:
+            queue.Full: The chat worker queue is still full after `timeout`.
+        """
+
+        self.start()
+        update_queue = self.queues[hash(get_update_chat_id(update)) % len(self.queues)]
+        update_queue.put(update, timeout=timeout)
+
+    def _work(self, update_queue: queue.Queue):
+        while True:
+            update = update_queue.get()
+            if update is None:
+                break
+
+            # Workers live outside the request cycle, so stale connections
+            # have to be dropped here.
+            close_old_connections()
+            try:
+                self.handler(update)
+            except Exception:
+                logger.exception(f"Error processing update {update.update_id}")
+            finally:
+                close_old_connections()
@@ -1,111 +1,55 @@
 import logging
-import os
-import telebot
+import time
 
+from django.conf import settings
 from django.core.management import BaseCommand
 
-from finance_bot.finance.agent import FinanceAgent
-from finance_bot.telegram_bot.models import TelegramUserSettings
-from finance_bot.users.models import User, UserInteraction
-from finance_bot.telegram_bot.handlers import (
-    finish_registration,
-    is_pending_registration,
-    start_registration,
-)
+from finance_bot.telegram_bot.bot import get_bot, get_dispatcher
 
 
-TELEGRAM_API_KEY = os.environ.get("TELEGRAM_API_KEY")
-
-bot = telebot.TeleBot(TELEGRAM_API_KEY)
-agent = FinanceAgent()
-
-
-def rate_limit_exceeded(user_id: str) -> bool:
-    user_settings = TelegramUserSettings.objects.filter(telegram_id=user_id).first()
-    if not user_settings.rate_limit_enabled:
-        return False
-    
-    message_count = UserInteraction.objects.filter(
-        user=user_settings.user,
-        interaction_type=UserInteraction.InteractionType.MESSAGE,
-        # Assuming you want a time frame validation
-        # created_at__gte=timezone.now() - timedelta(seconds=self.time_frame),
-    ).count()
-    if message_count >= user_settings.rate_limit:
-        return True
-    return False
-
-
-def save_interaction(user_id: str, message: str, response: str):
-    user = User.objects.filter(pk=user_id).first()
-    if not user:
-        return
-
-    user_interaction = UserInteraction.objects.create(
-        user=user,
-        source="telegram",
-        interaction_type=UserInteraction.InteractionType.MESSAGE,
-        interaction_data=message,
-    )
-
-    # This is the answer from the AI
-    UserInteraction.objects.create(
-        user=user,
-        source="telegram",
-        interaction_type=UserInteraction.InteractionType.RESPONSE,
-        interaction_data=response,
-        parent=user_interaction,
-    )
-
-
-@bot.message_handler(func=lambda msg: True)
-def handle_message(message):
-    user_telegram_id = message.from_user.id
+class Command(BaseCommand):
+    help = "Telegram bot"
 
-    if rate_limit_exceeded(user_telegram_id):
-        bot.send_message(
-            message.chat.id,
-            "Você atingiu o limit de mensagens permitidas. Tente novamente mais tarde.",
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--webhook-url',
+            type=str,
+            default=None,
+            help='Registers this URL as the bot webhook instead of polling for messages',
         )
-        return
-
-    if message == '/cadastro':
-        response = start_registration(str(user_telegram_id))
-        bot.send_message(message.chat.id, response)
-        return
-    
-    if is_pending_registration(user_telegram_id):
-        response = finish_registration(str(user_telegram_id), message.text)
-        bot.send_message(message.chat.id, response)
-        return
-
-    user_id = (TelegramUserSettings.objects
-        .filter(telegram_id=user_telegram_id)
-        .first()
-        .user
-        .pk)
-
-    response = agent.invoke({
-        'user_id': str(user_id),
-        'message': message.text,
-    })
-
-    save_interaction(user_id, message.text, response)
-    bot.send_message(message.chat.id, response)
 
+    def handle(self, *args, **options):
+        logger = logging.getLogger("MrBuffet Bot")
+        bot = get_bot()
 
-class Command(BaseCommand):
-    help = "Telegram bot"
+        if options['webhook_url']:
+            bot.set_webhook(url=options['webhook_url'], secret_token=settings.TELEGRAM_WEBHOOK_SECRET)
+            logger.info(f"Webhook set to {options['webhook_url']}")
+            return
 
-    def handle(self, *args, **kwargs):
-        logger = logging.getLogger("MrBuffet Bot")
+        dispatcher = get_dispatcher()
 
         try:
             logger.info("Mr Buffet says hi.")
             logger.info("Listening for messages.")
 
-            bot.infinity_polling()
+            bot.remove_webhook()
+            offset = None
+
+            while True:
+                try:
+                    updates = bot.get_updates(offset=offset, timeout=30, long_polling_timeout=30)
+                except Exception as e:
+                    logger.error(f"Error getting updates: {e}")
+                    time.sleep(3)
+                    continue
+
+                for update in updates:
+                    # Blocks while the chat worker is busy, so the bot stops
+                    # polling instead of queueing without bounds.
+                    dispatcher.submit(update)
+                    offset = update.update_id + 1
         except:
             logger.info("Mr Buffet says bye.")
-            bot.stop_bot()
+            dispatcher.stop()
             exit()
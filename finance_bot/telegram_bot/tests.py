@@ -0,0 +1,147 @@
+import json
+import random
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from telebot import types
+
+from finance_bot.telegram_bot.context import get_user_context
+from finance_bot.telegram_bot.dispatcher import UpdateDispatcher
+from finance_bot.telegram_bot.models import TelegramUserSettings
+from finance_bot.users.models import User
+
+
+class UserContextTestCase(TestCase):
+    """Checks that cached Telegram user contexts follow the rows they were loaded from."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="context@example.com", first_name="Ana")
+        TelegramUserSettings.objects.create(user=self.user, telegram_id="1001")
+
+    def test_context_is_cached(self):
+        get_user_context("1001")
+
+        with self.assertNumQueries(0):
+            context = get_user_context("1001")
+
+        self.assertEqual(context.user_id, self.user.id)
+
+    def test_saving_the_user_invalidates_the_context(self):
+        self.assertEqual(get_user_context("1001").user_settings.user.first_name, "Ana")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Bia"
+            self.user.save()
+
+        self.assertEqual(get_user_context("1001").user_settings.user.first_name, "Bia")
+
+    def test_unregistered_users_are_cached_until_they_register(self):
+        self.assertFalse(get_user_context("2002").is_registered)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other = User.objects.create_user(email="other@example.com")
+            TelegramUserSettings.objects.create(user=other, telegram_id="2002")
+
+        self.assertTrue(get_user_context("2002").is_registered)
+
+
+def make_update(update_id: int, chat_id: int, text: str = "oi") -> dict:
+    return {
+        'update_id': update_id,
+        'message': {'message_id': update_id, 'date': 0, 'chat': {'id': chat_id, 'type': 'private'}, 'text': text},
+    }
+
+
+class UpdateDispatcherTestCase(TestCase):
+
+    def test_processes_the_updates_of_a_chat_in_order(self):
+        handled = []
+        lock = threading.Lock()
+
+        def handle(update):
+            time.sleep(random.random() / 100)
+            with lock:
+                handled.append((update.message.chat.id, update.update_id))
+
+        dispatcher = UpdateDispatcher(handle, workers=4, queue_size=100)
+        for update_id in range(60):
+            dispatcher.submit(types.Update.de_json(make_update(update_id, chat_id=update_id % 3)))
+        dispatcher.stop()
+
+        self.assertEqual(len(handled), 60)
+        for chat_id in range(3):
+            self.assertEqual(
+                [update_id for chat, update_id in handled if chat == chat_id],
+                list(range(chat_id, 60, 3)),
+            )
+
+    def test_keeps_working_after_a_handler_error(self):
+        handled = []
+
+        def handle(update):
+            if update.update_id == 1:
+                raise RuntimeError("boom")
+            handled.append(update.update_id)
+
+        dispatcher = UpdateDispatcher(handle, workers=1, queue_size=10)
+        with self.assertLogs('finance_bot.telegram_bot.dispatcher', 'ERROR'):
+            for update_id in range(3):
+                dispatcher.submit(types.Update.de_json(make_update(update_id, chat_id=1)))
+            dispatcher.stop()
+
+        self.assertEqual(handled, [0, 2])
+
+
+@override_settings(TELEGRAM_WEBHOOK_SECRET="secret", TELEGRAM_WEBHOOK_QUEUE_TIMEOUT=0)
+class WebhookTestCase(TestCase):
+
+    def setUp(self):
+        # Without workers the queue only empties when the test reads it
+        patcher = mock.patch.object(UpdateDispatcher, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.dispatcher = UpdateDispatcher(lambda update: None, workers=1, queue_size=1)
+        patcher = mock.patch('finance_bot.telegram_bot.views.get_dispatcher', return_value=self.dispatcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, update: dict, secret: str | None = "secret"):
+        headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret is not None else {}
+        return self.client.post(
+            reverse('telegram-webhook'),
+            data=json.dumps(update),
+            content_type='application/json',
+            headers=headers,
+        )
+
+    def test_queues_the_update(self):
+        response = self.post(make_update(1, chat_id=10))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.dispatcher.queues[0].get_nowait().update_id, 1)
+
+    def test_rejects_a_wrong_secret(self):
+        for secret in ("wrong", "", None):
+            with self.subTest(secret=secret):
+                self.assertEqual(self.post(make_update(1, chat_id=10), secret=secret).status_code, 403)
+
+        self.assertTrue(self.dispatcher.queues[0].empty())
+
+    @override_settings(TELEGRAM_WEBHOOK_SECRET="")
+    def test_rejects_every_update_without_a_secret(self):
+        self.assertEqual(self.post(make_update(1, chat_id=10), secret="").status_code, 403)
+
+    def test_returns_503_when_the_queue_is_full(self):
+        self.assertEqual(self.post(make_update(1, chat_id=10)).status_code, 200)
+
+        with self.assertLogs('finance_bot.telegram_bot.views', 'WARNING'):
+            response = self.post(make_update(2, chat_id=10))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.dispatcher.queues[0].qsize(), 1)
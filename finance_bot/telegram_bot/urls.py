@@ -0,0 +1,7 @@
+from django.urls import path
+
+from finance_bot.telegram_bot import views
+
+urlpatterns = [
+    path("webhook", views.webhook, name="telegram-webhook"),
+]
@@ -0,0 +1,32 @@
+import logging
+import queue
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from telebot import types
+
+from finance_bot.telegram_bot.bot import get_dispatcher
+
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_POST
+def webhook(request):
+    secret_token = request.headers.get('X-Telegram-Bot-Api-Secret-Token')
+    if not settings.TELEGRAM_WEBHOOK_SECRET or secret_token != settings.TELEGRAM_WEBHOOK_SECRET:
+        return HttpResponseForbidden()
+
+    update = types.Update.de_json(request.body.decode('utf-8'))
+
+    try:
+        get_dispatcher().submit(update, timeout=settings.TELEGRAM_WEBHOOK_QUEUE_TIMEOUT)
+    except queue.Full:
+        # Telegram retries the update later
+        logger.warning(f"Telegram worker queue is full, rejecting update {update.update_id}")
+        return HttpResponse(status=503)
+
+    return HttpResponse()
@@ -19,10 +19,14 @@ from django.urls import path, include
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from finance_bot.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('finance_bot.langchain_bot.urls')),
+    path('telegram/', include('finance_bot.telegram_bot.urls')),
+    path('metrics', metrics_view, name='metrics'),
     # path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     # path('api/schema/swagger', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     # path('finance/', include('finance_bot.finance.urls')),
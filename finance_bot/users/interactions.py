@@ -0,0 +1,126 @@
+import atexit
+import functools
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from finance_bot.users.models import User, UserInteraction
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingInteraction:
+    user_id: int
+    source: str
+    message: str
+    response: str
+
+
+class InteractionWriter:
+    """
+    Saves user interactions in batches from a background thread.
+
+    Interactions are queued by `save` and written with `bulk_create` once
+    `batch_size` of them are waiting or `flush_interval` seconds went by
+    since the first one was queued. `stop` writes whatever is still queued.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._work, name="interaction-writer", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """Stops the writer after the queued interactions are saved."""
+
+        with self._lock:
+            thread, self.thread = self.thread, None
+
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+
+    def save(self, user_id: int, source: str, message: str, response: str):
+        """Queues a user message and the agent response to it."""
+
+        self.start()
+        self.queue.put(PendingInteraction(user_id, source, message, response))
+
+    def _work(self):
+        stopping = False
+        while not stopping:
+            pending = self.queue.get()
+            if pending is None:
+                break
+
+            batch = [pending]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    pending = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+
+            close_old_connections()
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception(f"Error saving {len(batch)} interactions")
+            finally:
+                close_old_connections()
+
+    def write(self, batch: list[PendingInteraction]):
+        user_ids = set(User.objects.filter(pk__in={pending.user_id for pending in batch}).values_list('pk', flat=True))
+        batch = [pending for pending in batch if pending.user_id in user_ids]
+
+        messages = UserInteraction.objects.bulk_create([
+            UserInteraction(
+                user_id=pending.user_id,
+                source=pending.source,
+                interaction_type=UserInteraction.InteractionType.MESSAGE,
+                interaction_data=pending.message,
+            )
+            for pending in batch
+        ])
+
+        # This is the answer from the AI
+        UserInteraction.objects.bulk_create([
+            UserInteraction(
+                user_id=pending.user_id,
+                source=pending.source,
+                interaction_type=UserInteraction.InteractionType.RESPONSE,
+                interaction_data=pending.response,
+                parent=message,
+            )
+            for pending, message in zip(batch, messages)
+        ])
+
+
+@functools.cache
+def get_interaction_writer() -> InteractionWriter:
+    writer = InteractionWriter(
+        batch_size=settings.INTERACTION_BATCH_SIZE,
+        flush_interval=settings.INTERACTION_FLUSH_INTERVAL,
+    )
+    atexit.register(writer.stop)
+    return writer
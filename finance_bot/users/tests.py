@@ -0,0 +1,86 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from finance_bot.users.interactions import InteractionWriter, PendingInteraction
+from finance_bot.users.models import User, UserInteraction
+
+
+class InteractionWriterTestCase(TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.written = threading.Event()
+
+        def write(batch):
+            self.batches.append([pending.message for pending in batch])
+            self.written.set()
+
+        # The writer thread can't see the test transaction, so only the
+        # batching is checked there and `write` is tested on its own.
+        patcher = mock.patch.object(InteractionWriter, 'write', side_effect=write)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save(self, writer: InteractionWriter, *messages: str):
+        for message in messages:
+            writer.save(1, "telegram", message, f"re: {message}")
+
+    def test_writes_full_batches_without_waiting(self):
+        writer = InteractionWriter(batch_size=2, flush_interval=60)
+        self.addCleanup(writer.stop, 1)
+        started = time.monotonic()
+        self.save(writer, "a", "b", "c")
+
+        self.assertTrue(self.written.wait(5))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.batches[0], ["a", "b"])
+
+    def test_writes_after_the_flush_interval(self):
+        writer = InteractionWriter(batch_size=100, flush_interval=0.05)
+        self.addCleanup(writer.stop, 1)
+        self.save(writer, "a")
+
+        self.assertTrue(self.written.wait(5))
+        self.assertEqual(self.batches, [["a"]])
+
+    def test_stop_writes_the_queued_interactions(self):
+        writer = InteractionWriter(batch_size=100, flush_interval=60)
+        self.save(writer, "a", "b", "c")
+        writer.stop(5)
+
+        self.assertEqual(self.batches, [["a", "b", "c"]])
+        self.assertIsNone(writer.thread)
+
+    def test_writer_survives_write_errors(self):
+        InteractionWriter.write.side_effect = [RuntimeError("boom"), None]
+        writer = InteractionWriter(batch_size=1, flush_interval=60)
+
+        with self.assertLogs('finance_bot.users.interactions', 'ERROR'):
+            self.save(writer, "a", "b")
+            writer.stop(5)
+
+        self.assertEqual(InteractionWriter.write.call_count, 2)
+
+
+class InteractionWriteTestCase(TestCase):
+
+    def test_saves_the_messages_and_their_responses(self):
+        user = User.objects.create_user(email="writer@example.com")
+        writer = InteractionWriter(batch_size=10, flush_interval=1)
+
+        with self.assertNumQueries(3):
+            writer.write([
+                PendingInteraction(user.pk, "telegram", "oi", "olá"),
+                PendingInteraction(user.pk + 1, "telegram", "usuário removido", "ignorado"),
+                PendingInteraction(user.pk, "telegram", "tchau", "até logo"),
+            ])
+
+        responses = UserInteraction.objects.filter(interaction_type=UserInteraction.InteractionType.RESPONSE)
+        self.assertEqual(
+            sorted((response.parent.interaction_data, response.interaction_data) for response in responses),
+            [("oi", "olá"), ("tchau", "até logo")],
+        )
+        self.assertEqual(UserInteraction.objects.count(), 4)